@@ -0,0 +1,254 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field
+from typing import Literal
+from campaign import extend_campaign, run_campaign
+from backends import get_backend
+from text_watermarking import *
+from archive import *
+
+
+# API JSON versionnée pour les clients "machine" (pipeline mail, scripts...).
+# Les routes sont synchrones : FastAPI les exécute dans son pool de threads.
+router = APIRouter(prefix="/api/v1", tags=["api v1"], default_response_class=ORJSONResponse)
+
+
+class GenerateRequest(BaseModel):
+    email: str = Field(..., min_length=1, description="Texte de l’email original")
+    nb_variantes: int = Field(..., ge=1, description="Nombre de variantes à générer")
+    textes: bool = Field(True, description="Inclure le texte des variantes dans la réponse")
+
+
+class VariantOut(BaseModel):
+    nom: str
+    id_binaire: str
+    texte: str | None = None
+    hash_email: str
+    word_hash: str
+
+
+class GenerateResponse(BaseModel):
+    original_email_hash: str
+    archive: str
+    archived: bool
+    nb_porteurs: int
+    variantes: list[VariantOut]
+
+
+class ExtendRequest(BaseModel):
+    email: str = Field(..., min_length=1, description="Texte de l’email original de la campagne")
+    nb_variantes: int = Field(..., ge=1, description="Nombre de nouveaux destinataires")
+    archive: str | None = Field(None, description="Campagne à étendre (par défaut : la dernière pour cet email)")
+    textes: bool = Field(True, description="Inclure le texte des nouvelles variantes dans la réponse")
+
+
+class ExtendResponse(BaseModel):
+    archive: str
+    debut: int
+    nb_variantes: int
+    variantes: list[VariantOut]
+
+
+class IdentifyRequest(BaseModel):
+    email: str = Field(..., min_length=1, description="Email suspect (leak)")
+    approche: bool = Field(True, description="Identification approchée si aucune correspondance exacte")
+    top: int = Field(5, ge=1, le=100, description="Nombre de destinataires proches renvoyés")
+
+
+class ProcheOut(BaseModel):
+    employe: str
+    id_binaire: str
+    archive: str
+    distance: int
+    positions: int
+    confiance: float
+
+
+class IdentifyResponse(BaseModel):
+    trouve: bool
+    correspondance: Literal["email", "mots porteurs", "code correcteur", "approchée"] | None = None
+    employe: str | None = None
+    id_binaire: str | None = None
+    archive: str | None = None
+    confiance: float = 0.0
+    proches: list[ProcheOut] = []
+
+
+class AccuseRequest(BaseModel):
+    email: str = Field(..., min_length=1, description="Email suspect, éventuellement composé de plusieurs variantes")
+    top: int = Field(5, ge=1, le=100, description="Nombre minimal de destinataires renvoyés")
+
+
+class AccuseOut(BaseModel):
+    employe: str
+    id_binaire: str
+    score: float
+    accuse: bool
+
+
+class AccuseResponse(BaseModel):
+    archive: str | None = None
+    seuil: float | None = None
+    positions: int = 0
+    coupables_max: int = 0
+    accuses: list[str] = []
+    destinataires: list[AccuseOut] = []
+
+
+class CampagneOut(BaseModel):
+    archive: str
+    nb_variantes: int
+    nb_porteurs: int | None = None
+
+
+class ArchiveLookupResponse(BaseModel):
+    original_email_hash: str
+    campagnes: list[CampagneOut]
+
+
+def _variantes_out(campagne, textes: bool) -> list[dict]:
+    # Format de `VariantOut` ; les textes sont rendus ici, depuis la campagne compacte
+    return [
+        {
+            "nom": record.employe,
+            "id_binaire": record.id_binaire,
+            "texte": record.texte if textes else None,
+            "hash_email": record.email_hash,
+            "word_hash": record.word_hash,
+        }
+        for record in campagne
+    ]
+
+
+@router.post("/generate", response_model=GenerateResponse)
+def api_generate(body: GenerateRequest):
+    """
+    Génère et archive les variantes d’un email (mêmes traitements que /generate).
+    """
+    try:
+        campagne, archived = run_campaign(body.email, body.nb_variantes, differe=True)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+    # Réponse construite directement (dicts + orjson) : pour une grande campagne servie depuis le cache,
+    # instancier puis revalider un modèle Pydantic par variante coûterait plus que tout le reste.
+    # Le format reste celui de `GenerateResponse` (documenté par response_model).
+    return ORJSONResponse({
+        "original_email_hash": campagne.original_email_hash,
+        "archive": get_backend().archiveName(campagne.original_email_hash, len(campagne)),
+        "archived": archived,
+        "nb_porteurs": len(campagne.layout),
+        "variantes": _variantes_out(campagne, body.textes),
+    })
+
+
+@router.post("/extend", response_model=ExtendResponse)
+def api_extend(body: ExtendRequest):
+    """
+    Ajoute des destinataires à une campagne existante (identifiants suivants, même archive).
+    """
+    try:
+        nouvelles, extension = extend_campaign(body.email, body.nb_variantes, body.archive)
+    except LookupError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+    return ORJSONResponse({
+        "archive": extension["archive"],
+        "debut": extension["debut"],
+        "nb_variantes": extension["nb_variantes"],
+        "variantes": _variantes_out(nouvelles, body.textes),
+    })
+
+
+@router.post("/identify", response_model=IdentifyResponse)
+def api_identify(body: IdentifyRequest):
+    """
+    Identifie le destinataire d’un email fuité (correspondance exacte, sinon approchée).
+    """
+    info, certain = logs_identify(body.email)
+    if info is not False:
+        correspondance = "email" if certain else "mots porteurs"
+        return IdentifyResponse(
+            trouve=True,
+            correspondance=correspondance,
+            employe=info["Employe"],
+            id_binaire=info["id binaire"],
+            archive=info["archive"],
+            confiance=CONFIANCE[correspondance],
+        )
+
+    if CODAGE == "hamming":
+        # Décodage des mots porteurs (code correcteur d'erreurs), vérifié auprès des campagnes archivées
+        decode = code_identify(body.email)
+        if decode is not None:
+            return IdentifyResponse(
+                trouve=True,
+                correspondance="code correcteur",
+                employe=decode["Employe"],
+                id_binaire=decode["id binaire"],
+                archive=decode["archive"],
+                confiance=decode["confiance"],
+            )
+
+    proches = fuzzy_identify(body.email, body.top) if body.approche else []
+    if not proches:
+        return IdentifyResponse(trouve=False)
+
+    meilleur = proches[0]
+    return IdentifyResponse(
+        trouve=True,
+        correspondance="approchée",
+        employe=meilleur["Employe"],
+        id_binaire=meilleur["id binaire"],
+        archive=meilleur["archive"],
+        confiance=meilleur["confiance"],
+        proches=[
+            ProcheOut(
+                employe=p["Employe"],
+                id_binaire=p["id binaire"],
+                archive=p["archive"],
+                distance=p["distance"],
+                positions=p["positions"],
+                confiance=p["confiance"],
+            )
+            for p in proches
+        ],
+    )
+
+
+@router.post("/accuse", response_model=AccuseResponse)
+def api_accuse(body: AccuseRequest):
+    """
+    Scores d’accusation (codes de Tardos) de tous les destinataires d’une campagne générée avec
+    CANARY_CODAGE=tardos, pour un email fuité par un ou plusieurs destinataires.
+    """
+    notes = tardos_identify(body.email, body.top)
+    if not notes:
+        return AccuseResponse()
+    return AccuseResponse(
+        archive=notes[0]["archive"],
+        seuil=notes[0]["seuil"],
+        positions=notes[0]["positions"],
+        coupables_max=notes[0]["coupables max"],
+        accuses=[n["Employe"] for n in notes if n["accuse"]],
+        destinataires=[
+            AccuseOut(employe=n["Employe"], id_binaire=n["id binaire"], score=n["score"], accuse=n["accuse"])
+            for n in notes
+        ],
+    )
+
+
+@router.get("/archives/{original_email_hash}", response_model=ArchiveLookupResponse)
+def api_archives(original_email_hash: str):
+    """
+    Liste les campagnes archivées pour un email original (hash SHA-256 de l’email).
+    """
+    campagnes = get_backend().find(original_email_hash)
+    if not campagnes:
+        raise HTTPException(status_code=404, detail="Aucune archive pour cet email.")
+    return ArchiveLookupResponse(
+        original_email_hash=original_email_hash,
+        campagnes=[CampagneOut(**campagne) for campagne in campagnes],
+    )
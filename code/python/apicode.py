@@ -1,12 +1,43 @@
+from contextlib import asynccontextmanager
 from fastapi.templating import Jinja2Templates
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi import FastAPI, Request, Form, File, UploadFile
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, Response
+from api_v1 import router as api_v1_router
+from identify_batch import parse_leaks, to_csv
+from campaign import run_campaign
+from results import PAR_PAGE, PAR_PAGE_MAX, CampaignResults, campaign_summary, iter_ndjson, iter_zip
 from archive import *
+from archive_queue import ARCHIVE_QUEUE
+from parallel import shutdown_pool
+import metrics
+import logging
 import uvicorn
+import json
+import os
 
 from text_watermarking import *
 
-app = FastAPI()
+logging.basicConfig(level=os.environ.get("CANARY_LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s — %(message)s")
+logger = logging.getLogger("canary.api")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Arrêt de l'application : les archives encore dans la file d'écriture sont écrites avant de quitter,
+    # puis le pool de processus de la génération parallèle est fermé
+    await run_in_threadpool(ARCHIVE_QUEUE.close)
+    await run_in_threadpool(shutdown_pool)
+
+
+app = FastAPI(lifespan=lifespan)
+# Compression gzip optionnelle (si le client envoie Accept-Encoding: gzip). Niveau 5 au lieu de 9 :
+# deux à trois fois plus rapide sur les grosses réponses (hash hexadécimaux peu compressibles), taille quasi identique
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+# API JSON versionnée (/api/v1/...)
+app.include_router(api_v1_router)
 
 templates = Jinja2Templates(directory="template")
 
@@ -14,83 +45,214 @@ templates = Jinja2Templates(directory="template")
 async def show_form(request: Request):
     return templates.TemplateResponse("form.html", {"request": request})
 
+def _generate(email: str, nb_variantes: int) -> dict:
+    """
+    Génération + archivage d’une campagne (code bloquant, exécuté hors de la boucle d’événements).
+    Retourne le contexte à passer au template : le résumé de la campagne et sa clé seulement, les
+    variantes sont affichées page par page (`/campagnes/{cle}`) ou téléchargées (NDJSON, ZIP).
+    """
+    try:
+        # Campagne déjà générée (cache) ou déjà archivée : pas de travail inutile (voir `run_campaign`)
+        campagne, log_archive = run_campaign(email, nb_variantes, differe=True)
+    except ValueError as exc:
+        # Erreur si pas assez de mots porteurs
+        return {
+            "email_original": email,
+            "error": f"❌ {exc}"
+        }
+
+    return {
+        "email_original": email,
+        "campagne": campaign_summary(campagne),
+        "log": log_archive
+    }
+
+
 @app.post("/generate", response_class=HTMLResponse)
 async def generate_emails(
     request: Request,
     email: str = Form(...),
     nb_variantes: int = Form(...)
 ):
+    # Génération (CPU) et écriture des archives (I/O) dans le pool de threads : la boucle reste libre
+    contexte = await run_in_threadpool(_generate, email, nb_variantes)
+    return templates.TemplateResponse("form.html", {"request": request, **contexte})
+
+def _results_page(cle: str, email: str | None, page: int, par_page: int) -> tuple[int, dict]:
+    """
+    Une page des variantes d’une campagne (code bloquant). Retourne le code HTTP et le contexte du template.
+    """
+    try:
+        resultats = CampaignResults(cle, email)
+    except LookupError as exc:
+        return 404, {"email_original": email, "erreur": f"❌ {exc}"}
+    except ValueError as exc:
+        return 422, {"email_original": email, "erreur": f"❌ {exc}"}
+
+    par_page = min(max(par_page, 1), PAR_PAGE_MAX)
+    nb_pages = max(-(-resultats.total // par_page), 1)
+    page = min(max(page, 1), nb_pages)
+    debut = (page - 1) * par_page
+    return 200, {
+        "email_original": email,
+        "campagne": {"cle": resultats.cle, "nb_variantes": resultats.total, "nb_porteurs": resultats.nb_porteurs},
+        # Textes rendus à la demande, pour cette page seulement
+        "resultats": [{"nom": record.employe, "texte": record.texte}
+                      for record in resultats.page(debut, debut + par_page)],
+        "pagination": {"page": page, "nb_pages": nb_pages, "par_page": par_page},
+    }
+
+
+@app.api_route("/campagnes/{cle}", methods=["GET", "POST"], response_class=HTMLResponse)
+async def campaign_page(
+        request: Request,
+        cle: str,
+        page: int = 1,
+        par_page: int = PAR_PAGE,
+        email: str | None = Form(None),
+):
+    """
+    Variantes d’une campagne, page par page. La campagne est retrouvée dans le cache par sa clé ; sinon
+    l’email original (champ `email`, POST) permet de la relire dans l’archive et de ne regénérer que la page.
+    """
+    statut, contexte = await run_in_threadpool(_results_page, cle, email, page, par_page)
+    return templates.TemplateResponse("form.html", {"request": request, **contexte}, status_code=statut)
+
+
+@app.api_route("/campagnes/{cle}/export.{format}", methods=["GET", "POST"])
+def campaign_export(cle: str, format: str, email: str | None = Form(None)):
+    """
+    Téléchargement de toutes les variantes d’une campagne, produit au fil de l’eau (mémoire constante) :
+    NDJSON (`export.ndjson`, mêmes lignes que /generate/stream) ou ZIP (`export.zip`, un fichier texte
+    par destinataire).
+    """
+    if format not in ("ndjson", "zip"):
+        return JSONResponse(status_code=404, content={"error": f"Format d’export inconnu : {format} (ndjson ou zip)."})
+    try:
+        resultats = CampaignResults(cle, email)
+    except LookupError as exc:
+        return JSONResponse(status_code=404, content={"error": str(exc)})
+    except ValueError as exc:
+        return JSONResponse(status_code=422, content={"error": str(exc)})
+
+    entetes = {"Content-Disposition": f'attachment; filename="{resultats.cle}.{format}"'}
+    if format == "zip":
+        return StreamingResponse(iter_zip(resultats), media_type="application/zip", headers=entetes)
+    return StreamingResponse(iter_ndjson(resultats), media_type="application/x-ndjson", headers=entetes)
+
+
+@app.post("/generate/stream")
+def generate_emails_stream(
+    email: str = Form(...),
+    nb_variantes: int = Form(...)
+):
+    """
+    Version streaming de /generate pour les grandes listes de destinataires : les variantes sont
+    envoyées au fil de l’eau en NDJSON (un objet JSON par ligne) et archivées de manière incrémentale.
+    La mémoire utilisée reste constante quel que soit le nombre de variantes.
+    """
     INTER_LIST = inter_pair_list(email)
     nb_bits = len(INTER_LIST)
 
-    if verif(INTER_LIST, nb_variantes):
-        IDs_LIST = genBits(nb_variantes, nb_bits)
-        print(IDs_LIST)
-        print(INTER_LIST)
-        creds = watermark_words(IDs_LIST, nb_variantes, INTER_LIST)
-        email_liste_variantes, creds = watermark_emails(email, creds)
+    if not verif(INTER_LIST, nb_variantes):
+        return JSONResponse(status_code=400, content={
+            "error": f"Impossible de générer {nb_variantes} variantes avec seulement {nb_bits} mots porteurs."
+        })
 
-        resultats = [{"nom": nom, "texte": texte} for nom, texte in email_liste_variantes.items()]
+    filename = get_backend().archiveName(hash_email(email), nb_variantes)
+    archived = not get_backend().exists(filename)
+    bases = radices(INTER_LIST)
 
+    def ndjson_lines():
+        with openArchiveWriter(email, nb_variantes) as writer:
+            for employe, id, texte, emailHash, wordHash in iter_variants(email, nb_variantes):
+                writer.add(employe, id, emailHash, wordHash)
+                yield json.dumps({
+                    "nom": employe,
+                    "id_binaire": formatId(id, bases),
+                    "texte": texte,
+                    "hash_email": emailHash,
+                    "word_hash": wordHash
+                }, ensure_ascii=False) + "\n"
 
-        print("\n🚨— Archivage des informations")
-        finalLogs = archive(creds, email)
-        log_archive = addArchive(finalLogs)
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson", headers={
+        "X-Canary-Archive": filename,
+        "X-Canary-Archived": "true" if archived else "false"
+    })
+
+def _identify(email_leak: str) -> dict:
+    """
+    Identification d’un email fuité (lecture de l’index, code bloquant exécuté hors de la boucle d’événements).
+    Retourne le contexte à passer au template.
+    """
+    id_employee, information = logs_identify(email_leak)
+
+    if id_employee != False:
+        # information = True : hash complet, False : mots porteurs uniquement
+        return {
+            "nom": id_employee["Employe"],
+            "id_binaire": id_employee["id binaire"],
+            "hash_email": id_employee["hash email"],
+            "info": information
+        }
+
+    if CODAGE == "hamming":
+        # Décodage des mots porteurs (code correcteur d'erreurs), vérifié auprès des campagnes archivées
+        decode = code_identify(email_leak)
+        if decode is not None:
+            return {
+                "nom": decode["Employe"],
+                "id_binaire": decode["id binaire"],
+                "code": decode
+            }
+
+    # Pas de correspondance exacte : identification approchée (distance de Hamming)
+    proches = fuzzy_identify(email_leak)
+    if proches:
+        return {"proches": proches}
+
+    return {"error": f"❌ Nous n'avons pas réussi à récupérer à qui appartenait cet email."}
 
-        return templates.TemplateResponse("form.html", {
-            "request": request,
-            "email_original": email,
-            "resultats": resultats,
-            "log": log_archive
-        })
-    else:
-        # Erreur si pas assez de mots porteurs
-        return templates.TemplateResponse("form.html", {
-            "request": request,
-            "email_original": email,
-            "error": f"❌ Impossible de générer {nb_variantes} variantes avec seulement {nb_bits} mots porteurs."
-        })
 
 @app.post("/identify", response_class=HTMLResponse)
 async def identify_employee(
         request: Request,
         email_leak: str = Form(...),
 ):
-    id_employee, information = logs_identify(email_leak)
+    contexte = await run_in_threadpool(_identify, email_leak)
+    return templates.TemplateResponse("form.html", {"request": request, **contexte})
 
-    if (id_employee != False) and (information):
-        nom = id_employee["Employe"]
-        id_binaire = id_employee["id binaire"]
-        hash_email = id_employee["hash email"]
-        info = True
-
-        return templates.TemplateResponse("form.html", {
-            "request": request,
-            "nom": nom,
-            "id_binaire": id_binaire,
-            "hash_email": hash_email,
-            "info": info
-        })
 
-    elif ((id_employee != False) and (not information)):
-        nom = id_employee["Employe"]
-        id_binaire = id_employee["id binaire"]
-        hash_email = id_employee["hash email"]
-        info = False
-
-        return templates.TemplateResponse("form.html", {
-            "request": request,
-            "nom": nom,
-            "id_binaire": id_binaire,
-            "hash_email": hash_email,
-            "info": info
-        })
+@app.post("/identify/batch")
+async def identify_batch(
+        files: list[UploadFile] = File(...),
+        format: str = Form("json"),
+):
+    """
+    Identification en lot : chaque fichier envoyé contient un email fuité (texte brut ou .eml)
+    ou plusieurs (mbox). Tous les emails sont recherchés en une seule fois dans l’index.
+    Résultat en JSON (par défaut) ou en CSV (`format=csv`).
+    """
+    emails = {}
+    for upload in files:
+        emails.update(parse_leaks(upload.filename or "email", await upload.read()))
 
-    else:
-        return templates.TemplateResponse("form.html", {
-            "request": request,
-            "error": f"❌ Nous n'avons pas réussi à récupérer à qui appartenait cet email.",
-        })
+    resultats = await run_in_threadpool(batch_identify, emails)
+
+    if format == "csv":
+        return Response(content=to_csv(resultats), media_type="text/csv")
+    return JSONResponse(content=resultats)
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """
+    Métriques au format texte Prometheus : durée de chaque étape (histogrammes), archives parcourues
+    par identification, compteurs de variantes générées, d’archives écrites et d’identifications.
+    """
+    if not metrics.ENABLED:
+        return JSONResponse(status_code=404, content={"error": "Métriques désactivées (CANARY_METRICS=0)."})
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 # 💡 Pour lancer l'app localement avec: uvicorn apicode:app --reload
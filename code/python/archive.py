@@ -1,7 +1,12 @@
 from datetime import datetime
-from pathlib import Path
 from utils import *
-import json
+from backends import get_backend
+from text_watermarking import carrier_layout
+from fingerprint import TardosCode, saveTardos
+from archive_queue import ARCHIVE_QUEUE
+from records import Campaign
+import text_watermarking
+import metrics
 
 
 def initLogs(original_email: str):
@@ -11,6 +16,7 @@ def initLogs(original_email: str):
     Cette fonction crée un dictionnaire contenant :
     - un timestamp ISO de génération,
     - le hash de l’email original,
+    - la disposition des mots porteurs (mot d’origine + synonyme pour chaque position binaire),
     - une liste globale des empreintes (hash email + hash mots porteurs),
     - un espace pour stocker les informations par employé.
 
@@ -31,6 +37,7 @@ def initLogs(original_email: str):
     logs = {
         "timestamp:": f"{timestamp}",
         "original_email_hash": hash_email(original_email),
+        "mots porteurs": carrier_layout(original_email),
         "all variantes": all_variantes,
         "variantes": variantes
         }
@@ -38,12 +45,15 @@ def initLogs(original_email: str):
     return logs, timestamp
 
 
+# Étape "hashing" : l'essentiel du temps est le calcul des deux SHA-256 par variante
+@metrics.timed("hashing")
 def archive(creds: dict, original_email: str) -> dict:
     """
     Construit un dictionnaire de logs complet pour archiver les variantes watermarkées.
 
     La fonction utilise le template créé `initLogs` en ajoutant pour chaque employé :
-    - son identifiant binaire (recalculé en fonction du nombre de mots porteurs),
+    - son identifiant sous forme texte (un chiffre par mot porteur, "0101..." pour des paires de synonymes),
+    - ce même identifiant sous forme d’entier (vecteur de bits compact, utilisé pour la distance de Hamming),
     - le hash SHA-256 de l’email final (variante watermarkée),
     - le hash SHA-256 des mots porteurs (watermark carriers).
 
@@ -61,6 +71,8 @@ def archive(creds: dict, original_email: str) -> dict:
     finalLogs = {}
     init, actual = initLogs(original_email)
     finalLogs.update(init)
+    # Base de chaque position (2 pour une paire de synonymes), pour la forme texte de l'id
+    bases = [len(formes) for formes in finalLogs["mots porteurs"]]
     for employee, [_, _, _] in creds.items():
         # Hash de l'email
         emailHash = format(hash_email(creds[employee][2]))
@@ -71,7 +83,8 @@ def archive(creds: dict, original_email: str) -> dict:
         # Création du dico type par employé
         temp_dict_employee = {
             "Employe": f"{employee}",
-            "id binaire": decimalToBinary(creds[employee][1], len(creds[employee][0])),
+            "id binaire": formatId(creds[employee][1], bases),
+            "id": creds[employee][1],
             "hash email": emailHash,
             "word hash": wordHash
 
@@ -84,44 +97,73 @@ def archive(creds: dict, original_email: str) -> dict:
     return finalLogs
 
 
-def addArchive(finalLogs: dict) -> bool:
+def addArchive(finalLogs: dict | Campaign) -> bool:
     """
-    Sauvegarde les logs de watermarking dans un fichier JSON dans le dossier `logs/`.
+    Sauvegarde les logs de watermarking avec le backend d’archivage configuré (voir `backends.py`).
 
-    Le fichier est nommé automatiquement selon le format :
+    Avec le backend JSON (par défaut), le fichier est écrit dans le dossier `logs/` et nommé
+    automatiquement selon le format :
         watermark_<hash_email_original>_<nb_variantes>.json
+    puis les empreintes sont ajoutées à l’index `logs/index.sqlite` (voir `hash_index.py`).
+    Avec le backend SQLite, la campagne est écrite dans `logs/archives.sqlite`.
 
-    Si un fichier portant déjà le même nom existe, aucun écrasement n’est effectué afin de préserver les archives.
+    Si une campagne portant déjà le même nom existe, aucun écrasement n’est effectué afin de préserver les archives.
+    En codage tardos, les paramètres du code (graine, biais) sont enregistrés à côté (voir `fingerprint.py`).
 
     Args:
-        finalLogs (dict): Dictionnaire final contenant toutes les informations de logs
+        finalLogs (dict | Campaign): Dictionnaire final contenant toutes les informations de logs, ou
+            campagne générée (`records.Campaign`, logs construits le temps de l’écriture)
 
     Returns:
         bool:
-            - True : si le fichier JSON a bien été écrit
-            - False : si un fichier identique existe déjà (pas d’écrasement)
+            - True : si l’archive a bien été écrite
+            - False : si une archive identique existe déjà (pas d’écrasement)
 
     """
+    if isinstance(finalLogs, Campaign):
+        finalLogs = finalLogs.logs()
+    backend = get_backend()
+    _saveCodeParams(backend.archiveName(finalLogs["original_email_hash"], len(finalLogs["variantes"])),
+                    finalLogs.get("mots porteurs"))
+    return backend.save(finalLogs)
 
-    # Aller au dossier parent de "code" → "Canary"
-    base_dir = Path(__file__).resolve().parents[2]  # Canary/
-    data_path = base_dir / "logs"
 
-    # Créer le dossier s'il n'existe pas
-    data_path.mkdir(parents=True, exist_ok=True)
-
-    filename = f"watermark_{finalLogs['original_email_hash']}_{len(finalLogs['variantes'])}.json"
-    # Chercher le prochain index de fichier disponible
-    if (data_path / f"{filename}").exists():
-        print("⚠️ | Le fichier n'a pas été archivé car le watermarking de cet email avec le même nombre de variantes "
-              "existe déjà.")
-        return False
+def queueArchive(campagne: Campaign) -> bool:
+    """
+    Variante différée d’`addArchive` pour les requêtes de l’API : la campagne est déposée dans la file
+    d’écriture partagée (`archive_queue.py`), écrite en arrière-plan par lots (une transaction par lot).
+    La requête n’attend pas l’écriture ; les logs complets ne sont construits que par le thread d’écriture.
 
-    # Écrire les logs dans le fichier suivant
-    file_path = data_path / f"{filename}"
-    with file_path.open("w", encoding="utf-8") as f:
-        json.dump(finalLogs, f, indent=4, ensure_ascii=False)
+    Returns:
+        bool:
+            - True : si la campagne a été mise en file pour être archivée
+            - False : si la même campagne était déjà en file (elle ne sera écrite qu’une fois)
+    """
+    _saveCodeParams(get_backend().archiveName(campagne.original_email_hash, len(campagne)), campagne.layout)
+    _, nouvelle = ARCHIVE_QUEUE.submit(campagne)
+    return nouvelle
 
-    print(f"✅ Logs enregistrés dans {file_path}")
 
-    return True
\ No newline at end of file
+def openArchiveWriter(original_email: str, nb_variantes: int):
+    """
+    Ouvre une écriture incrémentale d’archive avec le backend configuré : les variantes sont
+    ajoutées une par une, sans garder les logs complets en mémoire. Comme pour `addArchive`,
+    rien n’est écrit si la campagne existe déjà (`writer.archived` vaut alors False).
+
+    Utilisation :
+        with openArchiveWriter(email, nb_variantes) as writer:
+            for employe, id, texte, email_hash, word_hash in iter_variants(email, nb_variantes):
+                writer.add(employe, id, email_hash, word_hash)
+    """
+    _, timestamp = initLogs(original_email)
+    layout = carrier_layout(original_email)
+    writer = get_backend().writer(hash_email(original_email), nb_variantes, layout, timestamp)
+    if writer.archived:
+        _saveCodeParams(writer.filename, layout)
+    return writer
+
+
+def _saveCodeParams(archive_name: str, layout: list | None) -> None:
+    # Codage tardos : graine et biais gardés avec la campagne (mots porteurs = premières formes de la disposition)
+    if text_watermarking.CODAGE == "tardos" and layout:
+        saveTardos(archive_name, TardosCode.for_carriers([formes[0] for formes in layout]))
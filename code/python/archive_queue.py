@@ -0,0 +1,122 @@
+from concurrent.futures import Future
+from backends import get_backend
+from records import Campaign
+import metrics
+import threading
+import logging
+import atexit
+
+
+logger = logging.getLogger("canary.archive_queue")
+
+# Nombre maximal de campagnes écrites dans une même transaction
+BATCH_MAX = 64
+
+
+class ArchiveQueue:
+    """
+    File d’écriture des archives en arrière-plan (group commit), partagée par toutes les requêtes.
+
+    Les requêtes déposent leur campagne (`records.Campaign`, `submit`) et repartent aussitôt ; un unique
+    thread d’écriture en construit les logs complets et sauvegarde les campagnes en attente par lots
+    (`backend.save_many` : une seule transaction, donc un seul fsync, par lot). Les campagnes arrivées
+    pendant l’écriture d’un lot forment le lot suivant : sous une rafale de requêtes, les lots
+    grossissent d’eux-mêmes, sans délai d’attente ajouté.
+
+    Une même campagne (même nom d’archive) déposée plusieurs fois avant d’être écrite n’est écrite
+    qu’une fois : la vérification et l’ajout se font sous le même verrou.
+
+    Le thread démarre au premier dépôt ; `close` (arrêt de l’application, voir le lifespan de
+    `apicode.py`, ou fin du processus) écrit tout ce qui reste avant de rendre la main.
+    """
+
+    def __init__(self, batch_max: int = BATCH_MAX):
+        self.batch_max = batch_max
+        self._file = []
+        # Nom d'archive → Future, pour les campagnes en attente ou en cours d'écriture
+        self._en_attente = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._arret = False
+
+    def submit(self, campagne: Campaign) -> tuple[Future, bool]:
+        """
+        Dépose une campagne à archiver.
+
+        Returns:
+            tuple[Future, bool]:
+                - future (Future): Résultat de l’écriture (True si l’archive a été écrite, False si elle existait déjà).
+                - nouvelle (bool): False si la même campagne était déjà en attente (future partagée).
+        """
+        nom = get_backend().archiveName(campagne.original_email_hash, len(campagne))
+        with self._cond:
+            future = self._en_attente.get(nom)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._en_attente[nom] = future
+            self._file.append((nom, campagne, future))
+            if self._thread is None:
+                self._arret = False
+                self._thread = threading.Thread(target=self._boucle, name="canary-archive-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return future, True
+
+    def _boucle(self) -> None:
+        while True:
+            with self._cond:
+                while not self._file and not self._arret:
+                    self._cond.wait()
+                if not self._file:
+                    self._thread = None
+                    return
+                lot = self._file[:self.batch_max]
+                del self._file[:self.batch_max]
+
+            metrics.ARCHIVE_BATCH.observe(len(lot))
+            try:
+                resultats = get_backend().save_many([campagne.logs() for _, campagne, _ in lot])
+            except BaseException as exc:
+                logger.exception("❌ — Échec de l’écriture d’un lot de %s archive(s)", len(lot))
+                resultats = [exc] * len(lot)
+
+            with self._cond:
+                for nom, _, _ in lot:
+                    del self._en_attente[nom]
+                self._cond.notify_all()
+            for (_, _, future), resultat in zip(lot, resultats):
+                if isinstance(resultat, BaseException):
+                    future.set_exception(resultat)
+                else:
+                    future.set_result(resultat)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Attend que toutes les campagnes déposées jusqu’ici soient écrites.
+
+        Returns:
+            bool: False si le délai `timeout` (secondes) a expiré avant.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._en_attente, timeout)
+
+    def close(self) -> None:
+        """
+        Écrit les campagnes restantes puis arrête le thread d’écriture (un prochain dépôt le relance).
+        """
+        with self._cond:
+            thread = self._thread
+            self._arret = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._en_attente)
+
+
+ARCHIVE_QUEUE = ArchiveQueue()
+# Scripts et tests : les campagnes déposées sont écrites avant la fin du processus
+atexit.register(ARCHIVE_QUEUE.close)
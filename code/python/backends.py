@@ -0,0 +1,1017 @@
+from hash_index import (EXTENSION_SUFFIX, SCHEMA_VERSION, archiveRows, connectIndex, createSchema, extensionStart,
+                        findCampaigns, indexCampaign, insertRows, loadArchive, loadCampaigns, loadRecipients,
+                        lookupHashes, lookupMany, rebuildIndex)
+from compact_archive import EXTENSION, CompactArchive, compactLogs, writeCompact
+from abc import ABC, abstractmethod
+from utils import *
+import itertools
+import argparse
+import metrics
+import logging
+import sqlite3
+import json
+import os
+
+
+logger = logging.getLogger("canary.backends")
+
+ARCHIVE_EXISTS = ("⚠️ | Le fichier n'a pas été archivé car le watermarking de cet email avec le même nombre de "
+                  "variantes existe déjà.")
+
+
+def archiveKey(original_email_hash: str, nb_variantes: int) -> str:
+    """
+    Clé d’une campagne : watermark_<hash_email_original>_<nb_variantes>
+    """
+    return f"watermark_{original_email_hash}_{nb_variantes}"
+
+
+def parseArchiveKey(name: str) -> tuple[str, int]:
+    """
+    Inverse d’`archiveKey` : (hash de l’email original, nombre de variantes) d’une clé de campagne
+    ou d’un nom d’archive (extension ignorée).
+
+    Raises:
+        ValueError: Si `name` n’est pas une clé de campagne.
+    """
+    debut, _, nb_variantes = name.split(".")[0].rpartition("_")
+    prefixe, _, original_email_hash = debut.partition("_")
+    if prefixe != "watermark" or not original_email_hash or not nb_variantes.isdigit():
+        raise ValueError(f"Clé de campagne invalide : {name}")
+    return original_email_hash, int(nb_variantes)
+
+
+def _syncDir(path) -> None:
+    # Rend durables les entrées (liens) créées dans un dossier ; sans effet là où un dossier ne s'ouvre pas
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class ArchiveBackend(ABC):
+    """
+    Interface commune des backends d’archivage (classe abstraite : un backend qui n’implémente pas
+    toutes les méthodes abstraites ne peut pas être instancié).
+
+    Un backend sait :
+    - sauvegarder des logs complets (`save`, ou `save_many` pour un lot validé en une seule
+      transaction) ou écrire une archive au fil de l’eau (`writer`), sans jamais écraser une campagne existante,
+    - ajouter des variantes à une campagne existante (`extender`), sans relire ni réécrire les
+      variantes déjà archivées,
+    - ouvrir une connexion SQLite au schéma de `hash_index.py` (`connect`), sur laquelle reposent
+      toutes les recherches (hash exact, lot, campagnes, destinataires).
+    """
+
+    name = ""
+
+    @abstractmethod
+    def archiveName(self, original_email_hash: str, nb_variantes: int) -> str:
+        """
+        Nom de l’archive d’une campagne (`archiveKey` et extension propre au backend).
+        """
+
+    @abstractmethod
+    def exists(self, name: str) -> bool:
+        """
+        True si la campagne `name` est déjà archivée.
+        """
+
+    @abstractmethod
+    def save(self, finalLogs: dict) -> bool:
+        """
+        Sauvegarde des logs complets (format de `archive()`) ; False si la campagne existait déjà.
+        """
+
+    def save_many(self, lot: list[dict]) -> list[bool]:
+        """
+        Sauvegarde un lot de campagnes (file d’écriture `archive_queue.py`) : une seule validation
+        (transaction SQLite) pour tout le lot quand le backend le permet.
+
+        Returns:
+            list[bool]: Pour chaque campagne, True si elle a été écrite, False si elle existait déjà.
+        """
+        return [self.save(finalLogs) for finalLogs in lot]
+
+    @abstractmethod
+    def writer(self, original_email_hash: str, nb_variantes: int, layout: list, timestamp: str):
+        """
+        Ouvre l’écriture incrémentale d’une campagne (`add`, `close`, `abort`, gestionnaire de contexte) ;
+        `archived` vaut False si elle existe déjà.
+        """
+
+    @abstractmethod
+    def extender(self, name: str):
+        """
+        Ouvre l’extension de la campagne `name`. L’objet renvoyé s’utilise comme un `writer`
+        (`add`, `close`, `abort`, gestionnaire de contexte) et expose :
+        - `layout` : disposition des mots porteurs archivée avec la campagne,
+        - `start` : numéro du premier nouveau destinataire, soit le nombre de variantes déjà archivées
+          (les nouvelles variantes reçoivent les numéros start, start + 1, ...).
+
+        Raises:
+            LookupError: Si la campagne n’existe pas.
+        """
+
+    @abstractmethod
+    def connect(self) -> sqlite3.Connection:
+        """
+        Connexion SQLite au schéma de `hash_index.py` (fermée par l’appelant).
+        """
+
+    # --- Recherches (identiques pour tous les backends, sur la connexion du backend) ---
+
+    def _query(self, fonction, *args):
+        conn = self.connect()
+        try:
+            return fonction(*args, conn=conn)
+        finally:
+            conn.close()
+
+    def lookup(self, email_hash: str, wordHash: str) -> tuple[dict | bool, bool]:
+        # Recherche dans l'index : aucune archive parcourue
+        metrics.ARCHIVES_SCANNED.observe(0, "exact")
+        return self._query(lookupHashes, email_hash, wordHash)
+
+    def lookup_many(self, hashes: list[tuple[str, str]]) -> list[tuple[dict | bool, bool]]:
+        return self._query(lookupMany, hashes)
+
+    def campaigns(self) -> list[tuple[str, list[list[str]]]]:
+        return self._query(loadCampaigns)
+
+    def recipients(self, name: str) -> list[tuple[str, str, int]]:
+        return self._query(loadRecipients, name)
+
+    def find(self, original_email_hash: str) -> list[dict]:
+        return self._query(findCampaigns, original_email_hash)
+
+
+class JsonArchiveBackend(ArchiveBackend):
+    """
+    Backend historique : un fichier `logs/watermark_<hash>_<n>.json` par campagne,
+    et l’index SQLite `logs/index.sqlite` pour les recherches.
+    """
+
+    name = "json"
+
+    def archiveName(self, original_email_hash: str, nb_variantes: int) -> str:
+        return f"{archiveKey(original_email_hash, nb_variantes)}.json"
+
+    def exists(self, name: str) -> bool:
+        return (logs_dir() / name).exists()
+
+    def connect(self) -> sqlite3.Connection:
+        return connectIndex()
+
+    def save(self, finalLogs: dict) -> bool:
+        return self.save_many([finalLogs])[0]
+
+    @metrics.timed("archive_write")
+    def save_many(self, lot: list[dict]) -> list[bool]:
+        """
+        Chaque archive est écrite dans un fichier temporaire (`utils.tempPath`, synchronisé sur le
+        disque), puis toutes sont liées à leur nom définitif (`utils.publishFile`, jamais d’écrasement)
+        et indexées dans une seule transaction : une archive publiée est toujours complète, et seules
+        les archives effectivement publiées sont indexées.
+        """
+        data_path = logs_dir()
+
+        # Créer le dossier s'il n'existe pas
+        data_path.mkdir(parents=True, exist_ok=True)
+
+        resultats = [False] * len(lot)
+        temporaires = {}
+        try:
+            for k, finalLogs in enumerate(lot):
+                filename = self.archiveName(finalLogs['original_email_hash'], len(finalLogs['variantes']))
+                if (data_path / filename).exists():
+                    logger.warning(ARCHIVE_EXISTS)
+                    continue
+                tmp_path = tempPath(data_path / filename)
+                temporaires[k] = (filename, tmp_path)
+                with tmp_path.open("x", encoding="utf-8") as f:
+                    json.dump(finalLogs, f, indent=4, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            if temporaires:
+                # Ouverture de l'index avant la publication : s'il doit être (re)construit, les nouvelles
+                # archives ne doivent pas être indexées deux fois
+                conn = connectIndex()
+                try:
+                    # Une seule transaction d'index pour tout le lot
+                    conn.execute("BEGIN IMMEDIATE")
+                    for k, (filename, tmp_path) in temporaires.items():
+                        if not publishFile(tmp_path, data_path / filename):
+                            logger.warning(ARCHIVE_EXISTS)
+                            continue
+                        logger.info("✅ Logs enregistrés dans %s", data_path / filename)
+
+                        # Mise à jour de l'index des empreintes
+                        finalLogs = lot[k]
+                        indexCampaign(filename, finalLogs["original_email_hash"], finalLogs.get("mots porteurs"),
+                                      conn, finalLogs.get("timestamp:"))
+                        insertRows(archiveRows(filename, finalLogs), conn)
+                        resultats[k] = True
+                    conn.execute("COMMIT")
+                finally:
+                    conn.close()
+                # Un seul fsync du dossier pour les noms de tout le lot
+                _syncDir(data_path)
+        finally:
+            for _, tmp_path in temporaires.values():
+                tmp_path.unlink(missing_ok=True)
+
+        metrics.ARCHIVES_WRITTEN.inc(sum(resultats), self.name)
+        return resultats
+
+    def writer(self, original_email_hash: str, nb_variantes: int, layout: list, timestamp: str):
+        return JsonArchiveWriter(self.archiveName(original_email_hash, nb_variantes), original_email_hash, layout,
+                                 timestamp)
+
+    def extender(self, name: str):
+        return JsonArchiveExtender(name)
+
+
+class JsonArchiveWriter:
+    """
+    Écriture incrémentale d’une archive JSON : les variantes sont ajoutées une par une au fichier
+    (et à l’index), sans garder les logs complets en mémoire.
+
+    Le fichier est écrit dans un fichier temporaire propre à ce writer (`utils.tempPath`) puis lié à
+    son nom définitif à la fermeture (`utils.publishFile`), pour ne jamais laisser une archive
+    incomplète dans `logs/` ni écraser celle d’une écriture simultanée. Le format final est identique
+    à celui d’`addArchive`. Rien n’est écrit si une archive du même nom existe déjà (`archived` vaut
+    alors False).
+    """
+
+    BATCH_SIZE = 1000
+
+    def __init__(self, filename: str, original_email_hash: str, layout: list, timestamp: str):
+        data_path = logs_dir()
+        data_path.mkdir(parents=True, exist_ok=True)
+
+        self.original_email_hash = original_email_hash
+        self.filename = filename
+        self.file_path = data_path / self.filename
+        self.archived = not self.file_path.exists()
+        self._first = True
+        self._layout = layout
+        self._bases = [len(formes) for formes in layout]
+        self._timestamp = timestamp
+
+        if not self.archived:
+            logger.warning(ARCHIVE_EXISTS)
+            return
+
+        self._part_path = tempPath(self.file_path)
+        # Lignes d'index (une ligne JSON par variante) : relues à la fermeture pour "all variantes" et l'index
+        self._rows_path = tempPath(data_path / f"{self.filename}.rows")
+        self._file = self._part_path.open("x", encoding="utf-8")
+        self._rows = self._rows_path.open("x+", encoding="utf-8")
+
+        self._file.write("{\n")
+        self._file.write(f'    "timestamp:": {json.dumps(timestamp)},\n')
+        self._file.write(f'    "original_email_hash": {json.dumps(self.original_email_hash)},\n')
+        layout = json.dumps(self._layout, indent=4, ensure_ascii=False).replace("\n", "\n    ")
+        self._file.write(f'    "mots porteurs": {layout},\n')
+        self._file.write('    "variantes": {')
+
+    def add(self, employee: str, id: int, emailHash: str, wordHash: str) -> None:
+        """
+        Ajoute une variante à l’archive (et la met en attente d’indexation).
+        L’id binaire n’est mis sous forme de texte qu’ici, pour le fichier JSON et l’index.
+        """
+        if not self.archived:
+            return
+
+        id_binaire = formatId(id, self._bases)
+        temp_dict_employee = {
+            "Employe": f"{employee}",
+            "id binaire": id_binaire,
+            "id": id,
+            "hash email": emailHash,
+            "word hash": wordHash
+        }
+        entry = json.dumps(temp_dict_employee, indent=4, ensure_ascii=False).replace("\n", "\n        ")
+        self._file.write(f'{"" if self._first else ","}\n        {json.dumps(employee, ensure_ascii=False)}: {entry}')
+        self._first = False
+
+        self._rows.write(json.dumps([employee, id_binaire, id, emailHash, wordHash], ensure_ascii=False) + "\n")
+
+    def _iter_rows(self):
+        self._rows.seek(0)
+        for line in self._rows:
+            yield (self.filename, *json.loads(line))
+
+    @metrics.timed("archive_write")
+    def close(self) -> bool:
+        """
+        Termine l’archive (liste `all variantes`), la publie sous son nom `.json` et l’indexe.
+
+        L’index n’est verrouillé que pendant la publication : plusieurs archives peuvent être écrites
+        en même temps.
+
+        Returns:
+            bool: True si l’archive a été écrite, False si elle existait déjà.
+        """
+        if not self.archived or self._file.closed:
+            return self.archived
+
+        try:
+            self._file.write("\n    },\n" if not self._first else "},\n")
+            self._file.write('    "all variantes": [')
+            first = True
+            for row in self._iter_rows():
+                self._file.write(f'{"" if first else ","}\n        {json.dumps(row[4])},\n        {json.dumps(row[5])}')
+                first = False
+            self._file.write("\n    ]\n}" if not first else "]\n}")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+            # Ouverture de l'index avant la publication : s'il doit être (re)construit, l'archive
+            # ne doit pas être indexée deux fois
+            conn = connectIndex()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                if not publishFile(self._part_path, self.file_path):
+                    # Une archive identique a été écrite entre-temps : on ne l'écrase pas
+                    conn.execute("ROLLBACK")
+                    logger.warning(ARCHIVE_EXISTS)
+                    self.archived = False
+                    return False
+                lignes = self._iter_rows()
+                while lot := list(itertools.islice(lignes, self.BATCH_SIZE)):
+                    insertRows(lot, conn)
+                indexCampaign(self.filename, self.original_email_hash, self._layout, conn, self._timestamp)
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+        finally:
+            self._file.close()
+            self._rows.close()
+            self._part_path.unlink(missing_ok=True)
+            self._rows_path.unlink(missing_ok=True)
+
+        logger.info("✅ Logs enregistrés dans %s", self.file_path)
+        metrics.ARCHIVES_WRITTEN.inc(1, JsonArchiveBackend.name)
+        return True
+
+    def abort(self) -> None:
+        """
+        Abandonne l’écriture : supprime les fichiers temporaires, rien n’est indexé.
+        """
+        if not self.archived or self._file.closed:
+            return
+        self._file.close()
+        self._rows.close()
+        self._part_path.unlink(missing_ok=True)
+        self._rows_path.unlink(missing_ok=True)
+        self.archived = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class JsonArchiveExtender:
+    """
+    Extension d’une archive JSON : les nouvelles variantes sont ajoutées à la fin du fichier
+    `<archive>.ext.jsonl` (une ligne JSON par variante, relue avec l’archive par `loadArchive`)
+    et dans l’index, dans une seule transaction. L’archive elle-même n’est ni relue ni réécrite :
+    le coût ne dépend que du nombre de nouvelles variantes.
+    """
+
+    BATCH_SIZE = 1000
+
+    def __init__(self, filename: str):
+        chemin = logs_dir() / filename
+        if not chemin.exists():
+            raise LookupError(f"Aucune campagne archivée sous le nom {filename}.")
+
+        self.filename = filename
+        self.archived = True
+        self._rows = []
+        self._conn = connectIndex()
+        try:
+            # Verrou d'écriture sur l'index : les identifiants attribués ne peuvent pas se chevaucher
+            self._conn.execute("BEGIN IMMEDIATE")
+            self.layout, self.start = extensionStart(filename, self._conn)
+        except BaseException:
+            self._conn.rollback()
+            self._conn.close()
+            raise
+        self._bases = [len(formes) for formes in self.layout or []]
+        self._path = chemin.with_name(chemin.name + EXTENSION_SUFFIX)
+        self._file = self._path.open("a", encoding="utf-8")
+        self._taille_initiale = self._file.tell()
+
+    def add(self, employee: str, id: int, emailHash: str, wordHash: str) -> None:
+        if not self.archived:
+            return
+        id_binaire = formatId(id, self._bases)
+        info = {"Employe": employee, "id binaire": id_binaire, "id": id, "hash email": emailHash, "word hash": wordHash}
+        self._file.write(json.dumps(info, ensure_ascii=False) + "\n")
+        self._rows.append((self.filename, employee, id_binaire, id, emailHash, wordHash))
+        if len(self._rows) >= self.BATCH_SIZE:
+            self._flush_index()
+
+    def _flush_index(self) -> None:
+        insertRows(self._rows, self._conn)
+        self._rows = []
+
+    @metrics.timed("archive_write")
+    def close(self) -> bool:
+        if not self.archived or self._file.closed:
+            return self.archived
+        if self._rows:
+            self._flush_index()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._conn.commit()
+        self._conn.close()
+        logger.info("✅ Campagne %s étendue (à partir de l’id %s)", self.filename, self.start)
+        metrics.ARCHIVES_WRITTEN.inc(1, JsonArchiveBackend.name)
+        return True
+
+    def abort(self) -> None:
+        """
+        Abandonne l’extension : le fichier d’extension retrouve sa taille initiale, rien n’est indexé.
+        """
+        if not self.archived or self._file.closed:
+            return
+        self._file.truncate(self._taille_initiale)
+        self._file.close()
+        if self._taille_initiale == 0:
+            os.remove(self._path)
+        self._conn.rollback()
+        self._conn.close()
+        self.archived = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class SQLiteArchiveBackend(ArchiveBackend):
+    """
+    Backend SQLite : toutes les campagnes dans une seule base `logs/archives.sqlite`
+    (même schéma que l’index : tables `campagnes` et `variantes`, colonnes de hash indexées).
+
+    - journal WAL : les lectures (identification) ne bloquent pas les écritures,
+    - une seule transaction par campagne, variantes insérées par lots (`executemany`),
+    - la clé primaire de `campagnes` garantit qu’une campagne n’est jamais écrite deux fois,
+      sans course entre la vérification et l’écriture.
+    """
+
+    name = "sqlite"
+    FILENAME = "archives.sqlite"
+
+    def __init__(self, path=None):
+        self.path = path or logs_dir() / self.FILENAME
+
+    def archiveName(self, original_email_hash: str, nb_variantes: int) -> str:
+        return archiveKey(original_email_hash, nb_variantes)
+
+    def connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # isolation_level=None : transactions explicites (BEGIN / COMMIT)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        createSchema(conn)
+        return conn
+
+    def exists(self, name: str) -> bool:
+        conn = self.connect()
+        try:
+            return conn.execute("SELECT 1 FROM campagnes WHERE archive = ?", (name,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def save(self, finalLogs: dict, name: str | None = None) -> bool:
+        name = name or self.archiveName(finalLogs["original_email_hash"], len(finalLogs["variantes"]))
+        writer = SQLiteArchiveWriter(self, name, finalLogs["original_email_hash"], finalLogs.get("mots porteurs"),
+                                     finalLogs.get("timestamp:"))
+        if not writer.archived:
+            return False
+        try:
+            writer.add_rows(archiveRows(name, finalLogs))
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.close()
+
+    @metrics.timed("archive_write")
+    def save_many(self, lot: list[dict]) -> list[bool]:
+        conn = self.connect()
+        resultats = []
+        try:
+            # Une seule transaction (un seul fsync) pour tout le lot ; la clé primaire de `campagnes`
+            # écarte les campagnes déjà archivées
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for finalLogs in lot:
+                    name = self.archiveName(finalLogs["original_email_hash"], len(finalLogs["variantes"]))
+                    layout = finalLogs.get("mots porteurs")
+                    curseur = conn.execute(
+                        "INSERT OR IGNORE INTO campagnes (archive, original_email_hash, timestamp, mots_porteurs) "
+                        "VALUES (?, ?, ?, ?)",
+                        (name, finalLogs["original_email_hash"], finalLogs.get("timestamp:"),
+                         json.dumps(layout, ensure_ascii=False) if layout is not None else None),
+                    )
+                    if curseur.rowcount == 0:
+                        logger.warning(ARCHIVE_EXISTS)
+                        resultats.append(False)
+                        continue
+                    insertRows(archiveRows(name, finalLogs), conn)
+                    resultats.append(True)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+        metrics.ARCHIVES_WRITTEN.inc(sum(resultats), self.name)
+        return resultats
+
+    def writer(self, original_email_hash: str, nb_variantes: int, layout: list, timestamp: str):
+        return SQLiteArchiveWriter(self, self.archiveName(original_email_hash, nb_variantes), original_email_hash,
+                                   layout, timestamp)
+
+    def extender(self, name: str):
+        return SQLiteArchiveExtender(self, name)
+
+
+class SQLiteArchiveWriter:
+    """
+    Écriture d’une campagne dans le backend SQLite, dans une seule transaction :
+    la campagne est réservée dès l’ouverture (clé primaire), les variantes sont insérées par lots
+    et tout est validé à la fermeture (ou annulé par `abort`).
+    """
+
+    BATCH_SIZE = 5000
+
+    def __init__(self, backend: SQLiteArchiveBackend, name: str, original_email_hash: str, layout: list | None,
+                 timestamp: str | None):
+        self.filename = name
+        self._bases = [len(formes) for formes in layout or []]
+        self._rows = []
+        self._conn = backend.connect()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "INSERT INTO campagnes (archive, original_email_hash, timestamp, mots_porteurs) VALUES (?, ?, ?, ?)",
+                (name, original_email_hash, timestamp,
+                 json.dumps(layout, ensure_ascii=False) if layout is not None else None),
+            )
+            self.archived = True
+        except sqlite3.IntegrityError:
+            self._conn.execute("ROLLBACK")
+            self._conn.close()
+            self.archived = False
+            logger.warning(ARCHIVE_EXISTS)
+
+    def add(self, employee: str, id: int, emailHash: str, wordHash: str) -> None:
+        if not self.archived:
+            return
+        self._rows.append((self.filename, employee, formatId(id, self._bases), id, emailHash, wordHash))
+        if len(self._rows) >= self.BATCH_SIZE:
+            self._flush()
+
+    def add_rows(self, rows: list[tuple]) -> None:
+        self._rows.extend(rows)
+        self._flush()
+
+    def _flush(self) -> None:
+        insertRows(self._rows, self._conn)
+        self._rows = []
+
+    @metrics.timed("archive_write")
+    def close(self) -> bool:
+        if not self.archived or self._conn is None:
+            return self.archived
+        if self._rows:
+            self._flush()
+        self._conn.execute("COMMIT")
+        self._conn.close()
+        self._conn = None
+        logger.info("✅ Campagne %s enregistrée dans la base SQLite", self.filename)
+        metrics.ARCHIVES_WRITTEN.inc(1, SQLiteArchiveBackend.name)
+        return True
+
+    def abort(self) -> None:
+        if not self.archived or self._conn is None:
+            return
+        self._conn.execute("ROLLBACK")
+        self._conn.close()
+        self._conn = None
+        self.archived = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+# Index des empreintes des archives compactes (voir `CompactArchiveBackend.connect`)
+COMPACT_INDEX_FILENAME = "index_compact.sqlite"
+
+
+class CompactArchiveBackend(ArchiveBackend):
+    """
+    Backend compact : un fichier binaire `logs/watermark_<hash>_<n>.canary` par campagne
+    (voir `compact_archive.py`) : digests SHA-256 bruts dans des tables triées de largeur fixe,
+    métadonnées compressées ; les archives ouvertes sont gardées en cache. Une campagne étendue
+    est composée de l’archive initiale et de segments `watermark_<hash>_<n>+<premier id>.canary`.
+
+    Les recherches par hash passent par un index SQLite (`logs/index_compact.sqlite`, schéma de
+    `hash_index.py`) tenu à jour depuis les fichiers `.canary` : son coût ne dépend pas du nombre
+    d’archives. Les fichiers restent la référence : l’index est complété (ou reconstruit) dès que le
+    dossier change, et peut être supprimé sans perte.
+    """
+
+    name = "compact"
+
+    def __init__(self):
+        self._ouvertes = {}
+        self._version = None
+        # Version du dossier lors de la dernière synchronisation de l'index
+        self._indexe = None
+
+    def archiveName(self, original_email_hash: str, nb_variantes: int) -> str:
+        return f"{archiveKey(original_email_hash, nb_variantes)}{EXTENSION}"
+
+    def exists(self, name: str) -> bool:
+        return (logs_dir() / name).exists()
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Ouvre l’index SQLite des archives compactes, synchronisé avec les fichiers `.canary` présents.
+        """
+        dossier = logs_dir()
+        dossier.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(dossier / COMPACT_INDEX_FILENAME, check_same_thread=False)
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                with conn:
+                    conn.execute("DROP TABLE IF EXISTS variantes")
+                    conn.execute("DROP TABLE IF EXISTS campagnes")
+                    conn.execute("DROP TABLE IF EXISTS segments")
+                    createSchema(conn)
+                    conn.execute("CREATE TABLE segments (fichier TEXT PRIMARY KEY)")
+                    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                self._indexe = None
+            version = dossier.stat().st_mtime_ns
+            if version != self._indexe:
+                self._synchroniser(conn)
+                self._indexe = version
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _synchroniser(self, conn: sqlite3.Connection) -> None:
+        # Indexe les segments écrits depuis la dernière synchronisation (par ce processus ou un autre) ;
+        # si un segment a disparu, l'index est reconstruit
+        archives = {archive.path.name: archive for archive in self.archives()}
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            indexes = {fichier for (fichier,) in conn.execute("SELECT fichier FROM segments")}
+            if not indexes <= archives.keys():
+                conn.execute("DELETE FROM variantes")
+                conn.execute("DELETE FROM segments")
+                indexes = set()
+            for fichier in sorted(archives.keys() - indexes):
+                archive = archives[fichier]
+                insertRows(
+                    [(archive.name, employe, id_binaire, id, email, word) for (employe, id_binaire, id), email, word
+                     in zip(archive.recipients, archive.emails.hexdigests(), archive.words.hexdigests())],
+                    conn,
+                )
+                conn.execute("INSERT INTO segments (fichier) VALUES (?)", (fichier,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @metrics.timed("archive_write")
+    def save(self, finalLogs: dict, name: str | None = None) -> bool:
+        name = name or self.archiveName(finalLogs["original_email_hash"], len(finalLogs["variantes"]))
+        meta, rows = compactLogs(finalLogs)
+        if not writeCompact(logs_dir() / name, meta, rows):
+            logger.warning(ARCHIVE_EXISTS)
+            return False
+        logger.info("✅ Logs enregistrés dans %s", logs_dir() / name)
+        metrics.ARCHIVES_WRITTEN.inc(1, self.name)
+        return True
+
+    def writer(self, original_email_hash: str, nb_variantes: int, layout: list, timestamp: str):
+        return CompactArchiveWriter(self, self.archiveName(original_email_hash, nb_variantes), original_email_hash,
+                                    layout, timestamp)
+
+    def extender(self, name: str):
+        return CompactArchiveExtender(self, name)
+
+    def archives(self) -> list[CompactArchive]:
+        """
+        Archives compactes présentes dans `logs/`, ouvertes (mmap) une seule fois. Les fichiers ne sont
+        jamais modifiés après écriture : la liste n’est relue que si le dossier a changé.
+        """
+        dossier = logs_dir()
+        try:
+            version = dossier.stat().st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if version == self._version:
+            return list(self._ouvertes.values())
+
+        ouvertes = {}
+        for fichier in sorted(dossier.glob(f"watermark_*{EXTENSION}")):
+            ouvertes[fichier.name] = self._ouvertes.pop(fichier.name, None) or CompactArchive(fichier)
+        # Archives supprimées depuis la dernière lecture
+        for archive in self._ouvertes.values():
+            archive.close()
+        self._ouvertes = ouvertes
+        self._version = version
+        return list(ouvertes.values())
+
+    def campaigns(self) -> list[tuple[str, list[list[str]]]]:
+        # Une campagne étendue a plusieurs segments (même nom, même disposition)
+        campagnes = {}
+        for archive in self.archives():
+            if archive.meta.get("mots porteurs") is not None:
+                campagnes.setdefault(archive.name, archive.meta["mots porteurs"])
+        return list(campagnes.items())
+
+    def segments(self, name: str) -> list[CompactArchive]:
+        """
+        Fichiers d’une campagne (archive initiale puis extensions), dans l’ordre des identifiants.
+        """
+        return sorted((archive for archive in self.archives() if archive.name == name), key=lambda a: a.debut)
+
+    def recipients(self, name: str) -> list[tuple[str, str, int]]:
+        return [tuple(destinataire) for archive in self.segments(name) for destinataire in archive.recipients]
+
+    def find(self, original_email_hash: str) -> list[dict]:
+        prefixe = f"watermark_{original_email_hash}_"
+        campagnes = {}
+        for archive in self.archives():
+            if not archive.name.startswith(prefixe):
+                continue
+            campagne = campagnes.setdefault(archive.name, {"archive": archive.name, "nb_variantes": 0, "nb_porteurs": None})
+            campagne["nb_variantes"] += archive.size
+            if archive.meta.get("mots porteurs") is not None:
+                campagne["nb_porteurs"] = len(archive.meta["mots porteurs"])
+        return list(campagnes.values())
+
+
+class CompactArchiveWriter:
+    """
+    Écriture d’une archive compacte : les variantes sont accumulées (hash + id, sans le texte) puis le
+    fichier est écrit en une fois à la fermeture, les tables devant être triées.
+    """
+
+    def __init__(self, backend: CompactArchiveBackend, name: str, original_email_hash: str, layout: list | None,
+                 timestamp: str | None):
+        self.filename = name
+        self._backend = backend
+        self._meta = {"timestamp:": timestamp, "original_email_hash": original_email_hash, "mots porteurs": layout}
+        self._bases = [len(formes) for formes in layout or []]
+        self._rows = []
+        self._closed = False
+        self.archived = not backend.exists(name)
+        if not self.archived:
+            logger.warning(ARCHIVE_EXISTS)
+
+    def add(self, employee: str, id: int, emailHash: str, wordHash: str) -> None:
+        if not self.archived:
+            return
+        self._rows.append((employee, formatId(id, self._bases), id, emailHash, wordHash))
+
+    @metrics.timed("archive_write")
+    def close(self) -> bool:
+        if not self.archived or self._closed:
+            return self.archived
+        self._closed = True
+        chemin = logs_dir() / self.filename
+        if not writeCompact(chemin, self._meta, self._rows):
+            logger.warning(ARCHIVE_EXISTS)
+            self.archived = False
+            return False
+        logger.info("✅ Logs enregistrés dans %s", chemin)
+        metrics.ARCHIVES_WRITTEN.inc(1, CompactArchiveBackend.name)
+        return True
+
+    def abort(self) -> None:
+        self._rows = []
+        self._closed = True
+        self.archived = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class SQLiteArchiveExtender(SQLiteArchiveWriter):
+    """
+    Extension d’une campagne du backend SQLite : insertion des seules nouvelles variantes, dans une
+    transaction BEGIN IMMEDIATE (les identifiants libres sont lus sous le verrou d’écriture).
+    """
+
+    def __init__(self, backend: SQLiteArchiveBackend, name: str):
+        self.filename = name
+        self._rows = []
+        self._conn = backend.connect()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.layout, self.start = extensionStart(name, self._conn)
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            self._conn.close()
+            raise
+        self._bases = [len(formes) for formes in self.layout or []]
+        self.archived = True
+
+
+class CompactArchiveExtender(CompactArchiveWriter):
+    """
+    Extension d’une campagne compacte : les nouvelles variantes sont écrites dans un segment
+    `watermark_<hash>_<n>+<premier id>.canary` rattaché à la campagne ; les fichiers existants ne
+    sont pas réécrits. Deux extensions simultanées visant le même segment : seule la première est
+    écrite (`archived` vaut False pour l’autre).
+    """
+
+    def __init__(self, backend: CompactArchiveBackend, name: str):
+        segments = backend.segments(name)
+        if not segments or segments[0].debut != 0:
+            raise LookupError(f"Aucune campagne archivée sous le nom {name}.")
+        base = segments[0]
+        self.layout = base.meta.get("mots porteurs")
+        self.start = sum(segment.size for segment in segments)
+        segment = f"{name[:-len(EXTENSION)]}+{self.start}{EXTENSION}"
+        super().__init__(backend, segment, base.meta["original_email_hash"], self.layout, base.meta.get("timestamp:"))
+        self.name = name
+
+
+BACKENDS = {
+    JsonArchiveBackend.name: JsonArchiveBackend,
+    SQLiteArchiveBackend.name: SQLiteArchiveBackend,
+    CompactArchiveBackend.name: CompactArchiveBackend,
+}
+
+_backend = None
+
+
+def get_backend() -> ArchiveBackend:
+    """
+    Retourne le backend d’archivage configuré par la variable d’environnement
+    CANARY_ARCHIVE_BACKEND ("json" par défaut, "sqlite" ou "compact").
+    """
+    global _backend
+    if _backend is None:
+        nom = os.environ.get("CANARY_ARCHIVE_BACKEND", JsonArchiveBackend.name)
+        if nom not in BACKENDS:
+            raise ValueError(f"Backend d’archivage inconnu : {nom} (choix : {', '.join(BACKENDS)})")
+        _backend = BACKENDS[nom]()
+    return _backend
+
+
+def set_backend(backend: ArchiveBackend | None) -> None:
+    """
+    Remplace le backend d’archivage utilisé (None : revient à la configuration par défaut).
+    """
+    global _backend
+    _backend = backend
+
+
+def migrateJsonArchives(backend: SQLiteArchiveBackend | None = None) -> tuple[int, int]:
+    """
+    Importe les archives JSON existantes (`logs/watermark_*.json`) dans le backend SQLite.
+    Les campagnes déjà présentes dans la base sont ignorées.
+
+    Returns:
+        tuple[int, int]: (nombre de campagnes importées, nombre de campagnes ignorées)
+    """
+    backend = backend or SQLiteArchiveBackend()
+    importees, ignorees = 0, 0
+    for fichier in sorted(logs_dir().glob("watermark_*.json")):
+        contenu = loadArchive(fichier)
+        if backend.save(contenu, name=fichier.stem):
+            importees += 1
+        else:
+            ignorees += 1
+    return importees, ignorees
+
+
+def compactJsonArchives(supprimer: bool = False) -> tuple[int, int, int, int]:
+    """
+    Convertit les archives JSON existantes (`logs/watermark_*.json`) au format compact (`.canary`).
+    Chaque archive convertie est relue et comparée à l’originale avant une éventuelle suppression
+    du fichier JSON ; l’index `logs/index.sqlite` est alors reconstruit.
+
+    Args:
+        supprimer (bool): Supprimer les fichiers JSON une fois convertis. Uniquement avec le backend
+            compact actif (CANARY_ARCHIVE_BACKEND=compact) : sinon les campagnes supprimées ne seraient
+            plus retrouvées.
+
+    Returns:
+        tuple[int, int, int, int]: (archives converties, archives déjà converties,
+            taille totale des fichiers JSON, taille totale des fichiers compacts) — tailles en octets.
+
+    Raises:
+        ValueError: Si `supprimer` est demandé alors que le backend actif n’est pas le backend compact.
+    """
+    if supprimer and get_backend().name != CompactArchiveBackend.name:
+        raise ValueError(
+            f"Suppression des archives JSON refusée : le backend actif est « {get_backend().name} », les "
+            f"campagnes ne seraient plus retrouvées. Relancer avec CANARY_ARCHIVE_BACKEND=compact."
+        )
+    backend = CompactArchiveBackend()
+    converties, ignorees, taille_json, taille_compacte = 0, 0, 0, 0
+    for fichier in sorted(logs_dir().glob("watermark_*.json")):
+        contenu = loadArchive(fichier)
+        cible = logs_dir() / f"{fichier.stem}{EXTENSION}"
+        convertie = backend.save(contenu, name=cible.name)
+        if convertie:
+            converties += 1
+        else:
+            ignorees += 1
+
+        with CompactArchive(cible) as compacte:
+            relu = compacte.toLogs()
+        _, lignes = compactLogs(contenu)
+        if compactLogs(relu)[1] != lignes or relu["original_email_hash"] != contenu["original_email_hash"]:
+            if convertie:
+                raise ValueError(f"L’archive compacte {cible.name} ne correspond pas à {fichier.name}.")
+            # Archive JSON étendue après une première compaction : on ne touche à rien
+            logger.warning("⚠️ %s ne correspond plus à %s : fichier JSON conservé.", cible.name, fichier.name)
+            continue
+
+        extension = fichier.with_name(fichier.name + EXTENSION_SUFFIX)
+        taille_json += fichier.stat().st_size + (extension.stat().st_size if extension.exists() else 0)
+        taille_compacte += cible.stat().st_size
+        if supprimer:
+            os.remove(fichier)
+            if extension.exists():
+                os.remove(extension)
+
+    if supprimer:
+        rebuildIndex()
+    return converties, ignorees, taille_json, taille_compacte
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backends d’archivage Canary.")
+    parser.add_argument("commande", choices=["migrate", "compact"],
+                        help="migrate : importe les archives JSON de logs/ dans logs/archives.sqlite ; "
+                             "compact : convertit les archives JSON de logs/ au format compact (.canary)")
+    parser.add_argument("--supprimer", action="store_true",
+                        help="compact : supprime les fichiers JSON une fois convertis et vérifiés "
+                             "(uniquement avec CANARY_ARCHIVE_BACKEND=compact)")
+    args = parser.parse_args()
+
+    if args.commande == "migrate":
+        importees, ignorees = migrateJsonArchives()
+        print(f"✅ Migration terminée : {importees} campagne(s) importée(s), {ignorees} déjà présente(s).")
+    elif args.commande == "compact":
+        try:
+            converties, ignorees, taille_json, taille_compacte = compactJsonArchives(args.supprimer)
+        except ValueError as e:
+            parser.exit(1, f"❌ {e}\n")
+        print(f"✅ Compaction terminée : {converties} archive(s) convertie(s), {ignorees} déjà présente(s).")
+        if taille_compacte:
+            print(f"   {taille_json} octets (JSON) → {taille_compacte} octets (compact), "
+                  f"÷{taille_json / taille_compacte:.1f}")
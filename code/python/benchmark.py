@@ -0,0 +1,271 @@
+"""
+Benchmark de la chaîne complète génération → archivage → identification.
+
+Les mesures sont faites sur des données synthétiques (lexique et emails générés, graine fixe)
+dans un dossier d'archives temporaire : le dossier `logs/` du projet n'est jamais modifié.
+
+Chaque étape est mesurée à plusieurs échelles :
+- nombre de mots porteurs dans l'email (inter_pair_list, EmailTemplate),
+- nombre de variantes (genBits, watermark_words, watermark_emails, archive, addArchive),
+- nombre d'archives déjà présentes (logs_identify, fuzzy_identify).
+
+Les résultats sont écrits en JSON (avec le commit git courant) pour comparer deux versions :
+    python benchmark.py                       # échelles complètes (jusqu'à 100 000 variantes)
+    python benchmark.py --quick               # échelles réduites (quelques secondes)
+    python benchmark.py --backend sqlite --output bench_sqlite.json
+"""
+from pathlib import Path
+from utils import *
+from lexicon import Lexicon
+from backends import get_backend, set_backend
+import text_watermarking
+from text_watermarking import *
+from archive import *
+import argparse
+import platform
+import subprocess
+import tempfile
+import random
+import string
+import time
+import json
+import os
+import sys
+
+
+SEED = 2026
+
+# Échelles mesurées (complètes / --quick)
+SCALES = {
+    "porteurs": [8, 32, 128, 512],
+    "variantes": [10, 100, 1_000, 10_000, 100_000],
+    "archives": [1, 10, 100, 1_000, 10_000],
+}
+QUICK_SCALES = {
+    "porteurs": [8, 32, 128],
+    "variantes": [10, 100, 1_000],
+    "archives": [1, 10, 100],
+}
+
+# Nombre de mots "neutres" (non porteurs) par mot porteur dans l'email synthétique
+REMPLISSAGE = 6
+# Nombre de variantes par archive lors du remplissage pour l'échelle "archives"
+VARIANTES_PAR_ARCHIVE = 50
+
+
+def _mot(rng: random.Random, longueur: int) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(longueur))
+
+
+def synthetic_lexicon(nb_paires: int, seed: int = SEED) -> Lexicon:
+    """
+    Construit un lexique synthétique de `nb_paires` paires (mot, synonyme) distinctes.
+    """
+    rng = random.Random(seed)
+    mots = set()
+    while len(mots) < 2 * nb_paires:
+        mots.add("p" + _mot(rng, 7))
+    mots = sorted(mots)
+    rng.shuffle(mots)
+    paires = list(zip(mots[::2], mots[1::2]))
+    return Lexicon(paires, source="synthetique", version=f"synthetique-{nb_paires}-{seed}")
+
+
+def synthetic_email(lexique: Lexicon, nb_porteurs: int, seed: int = SEED) -> str:
+    """
+    Construit un email synthétique contenant exactement `nb_porteurs` mots porteurs du lexique,
+    séparés par des mots neutres et un peu de ponctuation.
+    """
+    rng = random.Random(seed)
+    porteurs = rng.sample(sorted(lexique.carriers), nb_porteurs)
+    phrases = []
+    for porteur in porteurs:
+        # Les mots neutres commencent par "n" : ils ne peuvent pas être des mots porteurs ("p...")
+        mots = ["n" + _mot(rng, rng.randint(2, 8)) for _ in range(REMPLISSAGE)]
+        mots.insert(rng.randrange(len(mots) + 1), porteur)
+        phrases.append(" ".join(mots).capitalize() + rng.choice([".", ",", " !", " ?", ";"]))
+    return "Bonjour,\n\n" + "\n".join(phrases) + "\n\nCordialement"
+
+
+def _chrono(fonction, *args, repetitions: int = 1):
+    """
+    Exécute `fonction(*args)` `repetitions` fois et retourne (meilleur temps en secondes, dernier résultat).
+    """
+    meilleur = float("inf")
+    resultat = None
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        resultat = fonction(*args)
+        meilleur = min(meilleur, time.perf_counter() - debut)
+    return meilleur, resultat
+
+
+def _repetitions(taille: int) -> int:
+    # Plusieurs mesures pour les petites tailles (bruit), une seule pour les grandes
+    return 5 if taille <= 1_000 else 1
+
+
+class Benchmark:
+    """
+    Exécute les mesures et accumule les résultats ({"etape", "echelle", "taille", "secondes", ...}).
+    """
+
+    def __init__(self, scales: dict, logs_path: Path):
+        self.scales = scales
+        self.logs_path = logs_path
+        self.resultats = []
+
+    def _ajout(self, etape: str, echelle: str, taille: int, secondes: float, **extra) -> None:
+        ligne = {"etape": etape, "echelle": echelle, "taille": taille, "secondes": round(secondes, 6), **extra}
+        self.resultats.append(ligne)
+        print(f"  {etape:<18} {echelle:<10} {taille:>8}  {secondes * 1000:>10.2f} ms", flush=True)
+
+    def _reset_archives(self, nom: str) -> None:
+        """
+        Repart d'un dossier d'archives vide (nouveau sous-dossier + nouveau backend).
+        """
+        dossier = self.logs_path / nom
+        dossier.mkdir(parents=True, exist_ok=True)
+        os.environ["CANARY_LOGS_DIR"] = str(dossier)
+        set_backend(None)
+
+    def porteurs(self) -> None:
+        """
+        Découpage de l'email en fonction du nombre de mots porteurs.
+        """
+        for nb in self.scales["porteurs"]:
+            email = synthetic_email(text_watermarking.LEXICON, nb)
+            rep = _repetitions(nb)
+            self._ajout("inter_pair_list", "porteurs", nb, _chrono(inter_pair_list, email, repetitions=rep)[0])
+            self._ajout("EmailTemplate", "porteurs", nb, _chrono(EmailTemplate, email, repetitions=rep)[0])
+            self._ajout("carrier_layout", "porteurs", nb, _chrono(carrier_layout, email, repetitions=rep)[0])
+
+    def variantes(self) -> None:
+        """
+        Génération et archivage en fonction du nombre de variantes.
+        """
+        nb_bits = max(self.scales["variantes"]).bit_length()
+        email = synthetic_email(text_watermarking.LEXICON, nb_bits)
+        INTER_LIST = inter_pair_list(email)
+
+        for n in self.scales["variantes"]:
+            rep = _repetitions(n)
+            secondes, IDs_LIST = _chrono(genBits, n, nb_bits, repetitions=rep)
+            self._ajout("genBits", "variantes", n, secondes)
+            secondes, creds = _chrono(watermark_words, IDs_LIST, n, INTER_LIST, repetitions=rep)
+            self._ajout("watermark_words", "variantes", n, secondes)
+            # watermark_emails complète `creds` : on repart d'une copie à chaque mesure
+            secondes, (_, creds) = _chrono(lambda: watermark_emails(email, {k: list(v) for k, v in creds.items()}),
+                                           repetitions=rep)
+            self._ajout("watermark_emails", "variantes", n, secondes)
+            secondes, finalLogs = _chrono(archive, creds, email, repetitions=rep)
+            self._ajout("archive", "variantes", n, secondes)
+
+            self._reset_archives(f"variantes_{n}")
+            secondes, archived = _chrono(addArchive, finalLogs)
+            self._ajout("addArchive", "variantes", n, secondes, archived=archived)
+
+            # Identification dans une archive de n variantes (dernier destinataire)
+            fuite = watermark_emails(email, {"x": list(creds[f"Employé {n}"][:2])})[0]["x"]
+            secondes, (info, _) = _chrono(logs_identify, fuite, repetitions=5)
+            self._ajout("logs_identify", "variantes", n, secondes, trouve=info is not False)
+
+    def archives(self) -> None:
+        """
+        Identification (exacte et approchée) en fonction du nombre d'archives existantes.
+        """
+        self._reset_archives("archives")
+        backend = get_backend()
+        nb_bits = VARIANTES_PAR_ARCHIVE.bit_length()
+        existantes = 0
+        for cible in self.scales["archives"]:
+            # Ajoute des campagnes (emails différents) jusqu'à atteindre `cible` archives
+            debut = time.perf_counter()
+            while existantes < cible:
+                email = synthetic_email(text_watermarking.LEXICON, nb_bits, seed=SEED + existantes)
+                INTER_LIST = inter_pair_list(email)
+                creds = watermark_words(genBits(VARIANTES_PAR_ARCHIVE, nb_bits), VARIANTES_PAR_ARCHIVE, INTER_LIST)
+                variantes, creds = watermark_emails(email, creds)
+                backend.save(archive(creds, email))
+                existantes += 1
+            self._ajout("remplissage", "archives", cible, time.perf_counter() - debut)
+
+            # La fuite provient de la dernière campagne archivée
+            fuite = variantes[f"Employé {VARIANTES_PAR_ARCHIVE}"]
+            secondes, (info, _) = _chrono(logs_identify, fuite, repetitions=5)
+            self._ajout("logs_identify", "archives", cible, secondes, trouve=info is not False)
+
+            # Leak tronqué : seule la première moitié de l'email est conservée
+            tronque = fuite[: len(fuite) // 2]
+            secondes, proches = _chrono(fuzzy_identify, tronque, repetitions=_repetitions(cible))
+            self._ajout("fuzzy_identify", "archives", cible, secondes, trouve=bool(proches))
+
+            secondes, (info, _) = _chrono(logs_identify, "Email inconnu, aucune archive.", repetitions=5)
+            self._ajout("logs_identify_miss", "archives", cible, secondes)
+
+
+def git_commit() -> str | None:
+    """
+    Retourne le commit git courant (None hors dépôt git).
+    """
+    try:
+        sortie = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent, check=True)
+        return sortie.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark génération → archivage → identification.")
+    parser.add_argument("--quick", action="store_true", help="Échelles réduites (vérification rapide)")
+    parser.add_argument("--backend", choices=["json", "sqlite", "compact"], default=None,
+                        help="Backend d'archivage (par défaut : CANARY_ARCHIVE_BACKEND ou json)")
+    parser.add_argument("--etapes", default="porteurs,variantes,archives",
+                        help="Groupes de mesures à exécuter, séparés par des virgules")
+    parser.add_argument("--output", "-o", default=None,
+                        help="Fichier JSON de résultats (par défaut : benchmark_<commit>.json)")
+    args = parser.parse_args(argv)
+
+    scales = QUICK_SCALES if args.quick else SCALES
+    if args.backend:
+        os.environ["CANARY_ARCHIVE_BACKEND"] = args.backend
+
+    # Lexique synthétique assez grand pour la plus grande échelle de mots porteurs
+    lexique_original = text_watermarking.LEXICON
+    text_watermarking.LEXICON = synthetic_lexicon(max(scales["porteurs"]) * 4)
+    logs_original = os.environ.get("CANARY_LOGS_DIR")
+    commit = git_commit()
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="canary_bench_") as tmp:
+            bench = Benchmark(scales, Path(tmp))
+            for etape in args.etapes.split(","):
+                print(f"▶️ | {etape}")
+                getattr(bench, etape.strip())()
+    finally:
+        text_watermarking.LEXICON = lexique_original
+        if logs_original is None:
+            os.environ.pop("CANARY_LOGS_DIR", None)
+        else:
+            os.environ["CANARY_LOGS_DIR"] = logs_original
+        set_backend(None)
+
+    rapport = {
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plateforme": platform.platform(),
+        "backend": os.environ.get("CANARY_ARCHIVE_BACKEND", "json"),
+        "quick": args.quick,
+        "echelles": scales,
+        "resultats": bench.resultats,
+    }
+    sortie = Path(args.output or f"benchmark_{commit or 'local'}.json")
+    sortie.write_text(json.dumps(rapport, indent=4, ensure_ascii=False), encoding="utf-8")
+    print(f"✅ | Résultats écrits dans {sortie}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
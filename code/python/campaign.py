@@ -0,0 +1,222 @@
+from collections import OrderedDict
+from parallel import CHUNK_SIZE, WORKERS, generate_parallel, iter_variants_parallel
+from text_watermarking import *
+from archive import *
+from backends import ARCHIVE_EXISTS, parseArchiveKey
+from records import Campaign
+import text_watermarking
+import threading
+import logging
+import os
+
+
+logger = logging.getLogger("canary.campaign")
+
+# Taille maximale (Mo) du cache des campagnes générées (variable d'environnement CANARY_CACHE_MB, 0 = désactivé)
+CACHE_MB = float(os.environ.get("CANARY_CACHE_MB", "128"))
+
+
+class GenerationCache:
+    """
+    Cache LRU des campagnes générées, borné en taille (octets estimés) plutôt qu’en nombre d’entrées :
+    une campagne de 100 000 variantes pèse bien plus qu’une campagne de 10.
+
+    Clé : (hash de l’email original, nombre de variantes, version du lexique). La génération étant
+    déterministe pour une clé donnée, une entrée peut être resservie telle quelle. Utilisable depuis
+    plusieurs threads (pool de threads de FastAPI).
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.taille = 0
+        self._entrees = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cle):
+        with self._lock:
+            entree = self._entrees.get(cle)
+            if entree is None:
+                return None
+            self._entrees.move_to_end(cle)
+            return entree[0]
+
+    def put(self, cle, valeur, taille: int) -> None:
+        if taille > self.max_bytes:
+            # Trop gros pour le cache : on ne l'insère pas (il viderait tout le reste)
+            return
+        with self._lock:
+            ancienne = self._entrees.pop(cle, None)
+            if ancienne is not None:
+                self.taille -= ancienne[1]
+            self._entrees[cle] = (valeur, taille)
+            self.taille += taille
+            # Éviction des entrées les moins récemment utilisées
+            while self.taille > self.max_bytes:
+                _, (_, taille_evincee) = self._entrees.popitem(last=False)
+                self.taille -= taille_evincee
+
+    def discard(self, cle) -> None:
+        """
+        Retire une entrée (campagne modifiée depuis sa mise en cache : extension).
+        """
+        with self._lock:
+            ancienne = self._entrees.pop(cle, None)
+            if ancienne is not None:
+                self.taille -= ancienne[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entrees.clear()
+            self.taille = 0
+
+    def __len__(self) -> int:
+        return len(self._entrees)
+
+
+GENERATION_CACHE = GenerationCache(int(CACHE_MB * 1024 * 1024))
+
+
+def campaign_key(email: str, nb_variantes: int) -> tuple[str, int, str]:
+    return hash_email(email), nb_variantes, text_watermarking.LEXICON.version
+
+
+def generate_campaign(email: str, nb_variantes: int) -> Campaign:
+    """
+    Génère les variantes d’une campagne (sans les sauvegarder).
+
+    Utilise la génération parallèle si `CANARY_WORKERS` > 1, sinon `iter_variants` (résultats identiques).
+    Chaque variante est hashée puis oubliée : la campagne ne garde que l’identifiant et les digests de
+    chaque destinataire (`records.Campaign`), les textes sont reconstruits à la demande.
+
+    Args:
+        email (str): Texte de l’email original (non watermarké).
+        nb_variantes (int): Nombre de variantes à générer.
+
+    Returns:
+        Campaign: Campagne prête à être sauvegardée avec `addArchive`.
+
+    Raises:
+        ValueError: Si l’email ne contient pas assez de mots porteurs pour `nb_variantes`.
+    """
+    INTER_LIST = inter_pair_list(email)
+    nb_bits = len(INTER_LIST)
+    if not verif(INTER_LIST, nb_variantes):
+        raise ValueError(f"Impossible de générer {nb_variantes} variantes avec seulement {nb_bits} mots porteurs.")
+
+    if WORKERS > 1:
+        # Génération répartie sur plusieurs processus (CANARY_WORKERS / CANARY_CHUNK_SIZE)
+        return generate_parallel(email, nb_variantes, WORKERS, CHUNK_SIZE)
+
+    logger.debug("Mots porteurs : %s", INTER_LIST)
+    campagne = Campaign(email)
+    for _, id, _, emailHash, wordHash in iter_variants(email, nb_variantes):
+        campagne.add(id, emailHash, wordHash)
+    return campagne
+
+
+def run_campaign(email: str, nb_variantes: int, differe: bool = False) -> tuple[Campaign, bool]:
+    """
+    Génère et archive une campagne en évitant tout travail inutile :
+    - campagne déjà en cache (même email, même nombre de variantes, même lexique) : résultat resservi
+      immédiatement, rien n’est regénéré ni réécrit ;
+    - archive déjà existante : les variantes sont regénérées (pour être affichées) mais l’archivage
+      est sauté ;
+    - sinon : génération (`generate_campaign`) puis archivage (`addArchive`, ou `queueArchive` si
+      `differe` : l’archive est écrite en arrière-plan avec celles des autres requêtes).
+
+    Returns:
+        tuple[Campaign, bool]:
+            - campagne (Campaign): Campagne générée (textes des variantes rendus à la demande).
+            - archived (bool): True si l’archive vient d’être écrite (ou mise en file), False si elle existait déjà.
+
+    Raises:
+        ValueError: Si l’email ne contient pas assez de mots porteurs pour `nb_variantes`.
+    """
+    cle = campaign_key(email, nb_variantes)
+    en_cache = GENERATION_CACHE.get(cle)
+    if en_cache is not None:
+        logger.info("♻️ Campagne servie depuis le cache (%s variantes)", nb_variantes)
+        return en_cache, False
+
+    existe = get_backend().exists(get_backend().archiveName(cle[0], nb_variantes))
+    campagne = generate_campaign(email, nb_variantes)
+    if existe:
+        logger.warning(ARCHIVE_EXISTS)
+        archived = False
+    else:
+        logger.info("🚨— Archivage des informations")
+        archived = queueArchive(campagne) if differe else addArchive(campagne)
+
+    GENERATION_CACHE.put(cle, campagne, campagne.taille())
+    return campagne, archived
+
+
+def extend_campaign(email: str, nb_nouvelles: int, archive_name: str | None = None) -> tuple[Campaign, dict]:
+    """
+    Étend une campagne existante à de nouveaux destinataires, sans regénérer les anciens.
+
+    La campagne (la plus récente pour cet email, ou `archive_name`) est ouverte en extension par le
+    backend d’archivage, qui fournit le premier identifiant libre : seules les variantes
+    [début, début + nb_nouvelles) sont générées, hashées puis ajoutées à la même archive et au
+    même index. Le travail ne dépend que de `nb_nouvelles`, pas de la taille de la campagne (sauf en
+    codage tardos : les mots de code des destinataires archivés sont recalculés pour vérifier qu’aucun
+    nouveau destinataire ne reçoit le même).
+
+    Args:
+        email (str): Texte de l’email original (non watermarké), identique à celui de la campagne.
+        nb_nouvelles (int): Nombre de nouveaux destinataires.
+        archive_name (str | None): Campagne à étendre (par défaut : la dernière campagne de cet email).
+
+    Returns:
+        tuple[Campaign, dict]:
+            - nouvelles (Campaign): Les seuls nouveaux destinataires (`start` = premier id attribué).
+            - extension (dict): {"archive": ..., "debut": premier id attribué, "nb_variantes": total après extension}
+
+    Raises:
+        LookupError: Si aucune campagne n’existe pour cet email.
+        ValueError: Si la disposition des mots porteurs a changé (autre dictionnaire), si la capacité
+            de l’email est dépassée, ou si un mot de code tardos est déjà attribué.
+    """
+    if nb_nouvelles < 1:
+        raise ValueError("Le nombre de nouvelles variantes doit être supérieur ou égal à 1.")
+
+    backend = get_backend()
+    # Campagne éventuellement encore dans la file d'écriture
+    ARCHIVE_QUEUE.flush()
+    if archive_name is None:
+        campagnes = backend.find(hash_email(email))
+        if not campagnes:
+            raise LookupError("Aucune campagne archivée pour cet email : générez-la avant de l’étendre.")
+        archive_name = campagnes[-1]["archive"]
+
+    with backend.extender(archive_name) as extender:
+        debut = extender.start
+        nouvelles = Campaign(email, start=debut)
+        if extender.layout != nouvelles.layout:
+            raise ValueError("Les mots porteurs de l’email ne correspondent pas à ceux de la campagne archivée.")
+        fin = debut + nb_nouvelles
+        capacite = capacity(inter_pair_list(email))
+        if capacite < fin:
+            raise ValueError(
+                f"Impossible d’étendre la campagne à {fin} variantes : capacité de l’email limitée à {capacite}."
+            )
+
+        # Codage tardos : les nouveaux mots de code doivent aussi différer de ceux des destinataires archivés
+        distincts = distinct_checker(inter_pair_list(email), debut)
+
+        if WORKERS > 1:
+            generees = iter_variants_parallel(email, fin, WORKERS, CHUNK_SIZE, start=debut, textes=False)
+        else:
+            generees = iter_variants(email, fin, debut)
+        for numero, (employe, id, _, emailHash, wordHash) in enumerate(generees, debut):
+            if distincts is not None:
+                distincts(numero, id)
+            extender.add(employe, id, emailHash, wordHash)
+            nouvelles.add(id, emailHash, wordHash)
+
+    if not extender.archived:
+        raise ValueError("La campagne a été étendue en même temps par une autre requête : réessayez.")
+    # La campagne en cache (/generate) ne contient pas les nouveaux destinataires
+    original_email_hash, nb_variantes = parseArchiveKey(archive_name)
+    GENERATION_CACHE.discard((original_email_hash, nb_variantes, text_watermarking.LEXICON.version))
+    return nouvelles, {"archive": archive_name, "debut": debut, "nb_variantes": fin}
@@ -0,0 +1,224 @@
+from utils import *
+import bisect
+import struct
+import mmap
+import json
+import zlib
+import os
+
+
+# Format compact d'une archive (`watermark_<hash>_<n>.canary`) :
+#
+#   en-tête     "<4sHHIII" : magic b"CNRY", version, réservé, nb variantes, taille méta, taille destinataires
+#   méta        JSON compressé (zlib) : timestamp, hash de l'email original, disposition des mots porteurs
+#   destinataires  JSON compressé (zlib) : [[employé, id binaire, id], ...] dans l'ordre de la campagne
+#   emails      nb variantes × digest SHA-256 brut (32 octets), dans l'ordre des destinataires
+#   mots        idem pour les hash des mots porteurs
+#   ordre emails   nb variantes × n° de destinataire (uint32), triés par digest d'email
+#   ordre mots     idem, triés par digest des mots porteurs
+#
+# Toutes les tables ont une largeur fixe : une recherche est une dichotomie directement sur le
+# fichier projeté en mémoire (mmap), sans charger ni décoder l'archive.
+MAGIC = b"CNRY"
+VERSION = 1
+EXTENSION = ".canary"
+HEADER = struct.Struct("<4sHHIII")
+INDEX = struct.Struct("<I")
+DIGEST_SIZE = 32
+
+
+def _ordre(digests: list[bytes]) -> bytes:
+    ordre = sorted(range(len(digests)), key=digests.__getitem__)
+    return struct.pack(f"<{len(ordre)}I", *ordre)
+
+
+def encodeCompact(meta: dict, rows: list[tuple]) -> bytes:
+    """
+    Sérialise une campagne au format compact.
+
+    Args:
+        meta (dict): {"timestamp:": ..., "original_email_hash": ..., "mots porteurs": [...] | None}
+        rows (list[tuple]): (employé, id binaire, id, hash email, word hash) par destinataire, hash en hexadécimal.
+
+    Returns:
+        bytes: Contenu du fichier `.canary`.
+    """
+    meta_bytes = zlib.compress(json.dumps(meta, ensure_ascii=False).encode("utf-8"), 9)
+    destinataires = zlib.compress(
+        json.dumps([[employe, id_binaire, id] for employe, id_binaire, id, _, _ in rows],
+                   ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        9,
+    )
+    emails = [bytes.fromhex(row[3]) for row in rows]
+    mots = [bytes.fromhex(row[4]) for row in rows]
+    header = HEADER.pack(MAGIC, VERSION, 0, len(rows), len(meta_bytes), len(destinataires))
+    return b"".join([header, meta_bytes, destinataires, *emails, *mots, _ordre(emails), _ordre(mots)])
+
+
+def writeCompact(path, meta: dict, rows: list[tuple]) -> bool:
+    """
+    Écrit une archive compacte sans jamais écraser un fichier existant : le contenu est écrit dans
+    un fichier temporaire puis lié au nom final (`os.link` échoue si le fichier existe déjà).
+
+    Returns:
+        bool: True si l’archive a été écrite, False si elle existait déjà.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = tempPath(path)
+    try:
+        with tmp_path.open("xb") as f:
+            f.write(encodeCompact(meta, rows))
+            f.flush()
+            os.fsync(f.fileno())
+        return publishFile(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+class _Digests:
+    """
+    Table de digests (dans l’ordre des destinataires) et son ordre de tri : la vue "séquence"
+    (i-ème plus petit digest) permet d’utiliser `bisect` directement sur le mmap.
+    """
+
+    __slots__ = ("buffer", "offset", "order_offset", "size")
+
+    def __init__(self, buffer, offset: int, order_offset: int, size: int):
+        self.buffer = buffer
+        self.offset = offset
+        self.order_offset = order_offset
+        self.size = size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, i: int) -> bytes:
+        return self.digest(INDEX.unpack_from(self.buffer, self.order_offset + i * INDEX.size)[0])
+
+    def digest(self, index: int) -> bytes:
+        """
+        Digest du destinataire n° `index`.
+        """
+        debut = self.offset + index * DIGEST_SIZE
+        return self.buffer[debut:debut + DIGEST_SIZE]
+
+    def find(self, digest: bytes) -> int | None:
+        """
+        Retourne le n° du destinataire dont le digest vaut `digest` (None si absent).
+        """
+        i = bisect.bisect_left(self, digest)
+        if i < self.size and self[i] == digest:
+            return INDEX.unpack_from(self.buffer, self.order_offset + i * INDEX.size)[0]
+        return None
+
+    def hexdigests(self) -> list[str]:
+        return [self.digest(i).hex() for i in range(self.size)]
+
+
+class CompactArchive:
+    """
+    Lecture d’une archive compacte projetée en mémoire. Seul l’en-tête est lu à l’ouverture :
+    les métadonnées et la liste des destinataires ne sont décompressées qu’à la première utilisation.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        # Segment d'extension "watermark_<hash>_<n>+<premier id>.canary" : rattaché à la campagne initiale
+        nom, _, debut = self.path.name[:-len(EXTENSION)].partition("+")
+        self.name = nom + EXTENSION
+        self.debut = int(debut or 0)
+        with self.path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.size, meta_len, recip_len = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"{self.path} n’est pas une archive compacte Canary (version {VERSION}).")
+
+        self._meta_offset = HEADER.size
+        self._recip_offset = self._meta_offset + meta_len
+        emails_offset = self._recip_offset + recip_len
+        words_offset = emails_offset + self.size * DIGEST_SIZE
+        orders_offset = words_offset + self.size * DIGEST_SIZE
+        self.emails = _Digests(self._mm, emails_offset, orders_offset, self.size)
+        self.words = _Digests(self._mm, words_offset, orders_offset + self.size * INDEX.size, self.size)
+        self._meta = None
+        self._recipients = None
+
+    @property
+    def meta(self) -> dict:
+        if self._meta is None:
+            self._meta = json.loads(zlib.decompress(self._mm[self._meta_offset:self._recip_offset]))
+        return self._meta
+
+    @property
+    def recipients(self) -> list[list]:
+        """
+        Destinataires de la campagne : [[employé, id binaire, id], ...]
+        """
+        if self._recipients is None:
+            fin = self.emails.offset
+            self._recipients = json.loads(zlib.decompress(self._mm[self._recip_offset:fin]))
+        return self._recipients
+
+    def info(self, index: int) -> dict:
+        """
+        Informations d’un destinataire, au format de `hash_index.lookupHashes`.
+        """
+        employe, id_binaire, _ = self.recipients[index]
+        return {
+            "Employe": employe,
+            "id binaire": id_binaire,
+            "hash email": self.emails.digest(index).hex(),
+            "word hash": self.words.digest(index).hex(),
+            "archive": self.name,
+        }
+
+    def toLogs(self) -> dict:
+        """
+        Reconstruit les logs complets (format de `archive()` / des fichiers JSON).
+        """
+        emails = self.emails.hexdigests()
+        words = self.words.hexdigests()
+
+        logs = dict(self.meta)
+        logs["all variantes"] = [h for paire in zip(emails, words) for h in paire]
+        logs["variantes"] = {
+            employe: {
+                "Employe": employe,
+                "id binaire": id_binaire,
+                "id": id,
+                "hash email": emails[i],
+                "word hash": words[i],
+            }
+            for i, (employe, id_binaire, id) in enumerate(self.recipients)
+        }
+        return logs
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def compactLogs(finalLogs: dict) -> tuple[dict, list[tuple]]:
+    """
+    Découpe des logs complets (format JSON) en (méta, lignes) pour `encodeCompact` / `writeCompact`.
+    Les archives antérieures sans "id" entier le recalculent depuis l’id binaire.
+    """
+    meta = {
+        "timestamp:": finalLogs.get("timestamp:"),
+        "original_email_hash": finalLogs["original_email_hash"],
+        "mots porteurs": finalLogs.get("mots porteurs"),
+    }
+    rows = [
+        (info["Employe"], info["id binaire"], info["id"] if "id" in info else int(info["id binaire"] or "0", 2),
+         info["hash email"], info["word hash"])
+        for info in finalLogs["variantes"].values()
+    ]
+    return meta, rows
@@ -0,0 +1,120 @@
+from itertools import product
+
+
+# Code de Hamming étendu (SECDED) sur n positions binaires, utilisé par le codage "hamming"
+# (CANARY_CODAGE=hamming, voir `text_watermarking.py`) :
+#
+#   position 0           bit de parité globale
+#   positions 1 .. n-1   code de Hamming : bits de contrôle aux puissances de 2 (1, 2, 4, 8...),
+#                        bits de données aux autres positions (bit de poids fort en premier)
+#
+# Le syndrome (XOR des numéros des positions à 1) désigne directement la position d’une erreur
+# unique ; la parité globale distingue une erreur simple (corrigée) d’une erreur double (détectée).
+# Distance minimale 4 : 1 erreur corrigée, ou jusqu’à 3 positions manquantes (effacements) comblées,
+# ou 1 erreur + 1 effacement.
+MAX_EFFACEMENTS = 3
+
+
+def dataPositions(n: int) -> list[int]:
+    """
+    Positions des bits de données dans un mot de code de n bits.
+    """
+    return [j for j in range(3, n) if j & (j - 1)]
+
+
+def dataBits(n: int) -> int:
+    """
+    Nombre de bits d’information portés par n positions binaires (0 si n < 4).
+    """
+    return len(dataPositions(n))
+
+
+def hammingCapacity(n: int) -> int:
+    """
+    Nombre d’identifiants distincts codables sur n positions binaires.
+    """
+    return 1 << dataBits(n)
+
+
+def hammingEncode(data: int, n: int) -> list[int]:
+    """
+    Mot de code (liste de n bits, position 0 en premier) de l’identifiant `data`.
+
+    Raises:
+        ValueError: Si `data` ne tient pas dans les bits d’information disponibles.
+    """
+    positions = dataPositions(n)
+    if not 0 <= data < 1 << len(positions):
+        raise ValueError(f"Identifiant {data} trop grand pour un code de Hamming sur {n} positions.")
+
+    bits = [0] * n
+    syndrome = 0
+    for k, j in enumerate(positions):
+        if (data >> (len(positions) - 1 - k)) & 1:
+            bits[j] = 1
+            syndrome ^= j
+    # Bits de contrôle : annulent le syndrome
+    p = 1
+    while p < n:
+        bits[p] = (syndrome >> (p.bit_length() - 1)) & 1
+        p <<= 1
+    if n:
+        bits[0] = sum(bits[1:]) & 1
+    return bits
+
+
+def _syndrome(bits: list[int]) -> tuple[int, int]:
+    syndrome = 0
+    for j in range(1, len(bits)):
+        if bits[j]:
+            syndrome ^= j
+    return syndrome, sum(bits) & 1
+
+
+def _data(bits: list[int]) -> int:
+    data = 0
+    for j in dataPositions(len(bits)):
+        data = (data << 1) | bits[j]
+    return data
+
+
+def hammingDecode(bits: list[int | None]) -> tuple[int, int] | None:
+    """
+    Décodage par syndrome d’un mot de code lu (éventuellement altéré).
+
+    Args:
+        bits (list[int | None]): Bits lus, None pour une position manquante (effacement).
+
+    Returns:
+        tuple[int, int] | None: (identifiant, nombre de positions corrigées), ou None si le mot
+            n’est pas décodable (erreur double, trop d’effacements, ou plusieurs solutions possibles).
+    """
+    effacements = [j for j, bit in enumerate(bits) if bit is None]
+    if len(effacements) > MAX_EFFACEMENTS or len(bits) < 4:
+        return None
+
+    solutions = {}
+    for valeurs in product((0, 1), repeat=len(effacements)):
+        mot = list(bits)
+        for j, valeur in zip(effacements, valeurs):
+            mot[j] = valeur
+        syndrome, parite = _syndrome(mot)
+        if syndrome == 0 and parite == 0:
+            corrections = 0
+        elif parite == 1 and syndrome < len(mot):
+            # Erreur simple à la position désignée par le syndrome (0 : bit de parité globale)
+            mot[syndrome] ^= 1
+            corrections = 1
+        else:
+            # Erreur double (ou syndrome hors du mot) : détectée, non corrigeable
+            continue
+        data = _data(mot)
+        solutions[data] = min(corrections, solutions.get(data, corrections))
+
+    if not solutions:
+        return None
+    meilleure = min(solutions.values())
+    candidats = [data for data, corrections in solutions.items() if corrections == meilleure]
+    if len(candidats) > 1:
+        return None
+    return candidats[0], meilleure
@@ -0,0 +1,221 @@
+from statistics import NormalDist
+from utils import *
+import numpy as np
+import secrets
+import hmac
+import json
+import os
+
+
+# Codes de traçage de Tardos (codage "tardos", CANARY_CODAGE=tardos, voir `text_watermarking.py`) :
+# chaque position binaire j a un biais secret p_j (loi de l'arc sinus), et chaque destinataire reçoit
+# des bits tirés au hasard avec P(bit = 1) = p_j. Si plusieurs destinataires mélangent leurs variantes
+# (collusion), l'email fuité garde leurs bits là où ils sont d'accord : le score d'accusation
+# (`accuse`) de chaque coupable augmente, celui d'un innocent reste centré sur 0.
+
+# Nombre de coupables contre lequel le code est dimensionné (borne basse des biais)
+COLLUDERS = int(os.environ.get("CANARY_TARDOS_C", "2"))
+# Probabilité d'accuser au moins un innocent (seuil d'accusation)
+EPSILON = float(os.environ.get("CANARY_TARDOS_EPSILON", "1e-3"))
+# Nombre de destinataires tirés ensemble (même générateur aléatoire) : id d'un destinataire reproductible
+BLOCK = 1024
+# Constante de longueur du code : m = TARDOS_K × c² × ln(N / ε) positions pour N destinataires. π²/2 est
+# la constante du score symétrique (Škorić et al.) ; 100 est celle, très prudente, du code d'origine de Tardos
+TARDOS_K = float(os.environ.get("CANARY_TARDOS_K", math.pi ** 2 / 2))
+
+KEY_FILENAME = "tardos.key"
+# Paramètres d'une campagne (graine, biais) en JSON, à côté de ses archives : "watermark_<hash>_<n>.tardos"
+# (pas de suffixe .json : le fichier ne doit pas être pris pour une archive)
+TARDOS_SUFFIX = ".tardos"
+
+# Bits des 256 valeurs d'un octet (bit de poids fort en premier), pour le calcul des scores octet par octet
+_OCTETS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).astype(np.float64)
+
+
+def _key() -> bytes:
+    """
+    Clé secrète du déploiement (`logs/tardos.key`, créée au premier appel) : les biais et les mots de code
+    ne doivent pas pouvoir être recalculés par les destinataires.
+    """
+    chemin = logs_dir() / KEY_FILENAME
+    try:
+        return chemin.read_bytes()
+    except FileNotFoundError:
+        pass
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        # Création exclusive : deux processus qui créent la clé en même temps gardent la même
+        fd = os.open(chemin, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+    except FileExistsError:
+        pass
+    return chemin.read_bytes()
+
+
+def tardosLength(nb_destinataires: int, c: int = COLLUDERS, epsilon: float = EPSILON) -> int:
+    """
+    Nombre de positions binaires (mots porteurs) nécessaire pour `nb_destinataires` destinataires :
+    m = TARDOS_K × c² × ln(N / ε). En dessous, les coupables d’une collusion de c destinataires peuvent
+    rester sous le seuil d’accusation (`tardosResistance`).
+    """
+    return math.ceil(TARDOS_K * c ** 2 * math.log(max(nb_destinataires, 1) / epsilon))
+
+
+def tardosCapacity(nb_positions: int, c: int = COLLUDERS, epsilon: float = EPSILON) -> int:
+    """
+    Nombre maximal de destinataires pour un code de `nb_positions` positions (inverse de `tardosLength`) :
+    N = ε × exp(m / (TARDOS_K × c²)), borné par 2^m. 0 si l’email est trop court pour un seul destinataire.
+    """
+    exposant = nb_positions / (TARDOS_K * c ** 2) + math.log(epsilon)
+    if exposant >= nb_positions * math.log(2):
+        return 2 ** nb_positions
+    return math.floor(math.exp(min(exposant, 709)))
+
+
+def tardosResistance(nb_positions: int, nb_destinataires: int) -> int:
+    """
+    Nombre de coupables (au plus `COLLUDERS`) contre lequel un code de `nb_positions` positions protège
+    `nb_destinataires` destinataires : plus grand c tel que `tardosLength(N, c)` <= m. 1 : seule une fuite
+    par un destinataire unique est attribuée de façon fiable ; 0 : code trop court même pour cela.
+    """
+    c = COLLUDERS
+    while c > 0 and tardosLength(nb_destinataires, c) > nb_positions:
+        c -= 1
+    return c
+
+
+def tardosBiases(nb_positions: int, seed: int, c: int = COLLUDERS) -> np.ndarray:
+    """
+    Biais de chaque position : p = sin²(r), r uniforme sur [t', π/2 - t'] avec t' = arcsin(√t), t = 1 / (300c).
+    """
+    t = np.arcsin(np.sqrt(1 / (300 * c)))
+    rng = np.random.default_rng([seed, 0])
+    return np.sin(rng.uniform(t, np.pi / 2 - t, nb_positions)) ** 2
+
+
+class TardosCode:
+    """
+    Code de Tardos d’une liste de mots porteurs : graine (dérivée de la clé secrète et des mots porteurs)
+    et biais des positions binaires.
+
+    Le mot de code du destinataire n° i est tiré dans son bloc de `BLOCK` destinataires : il ne dépend
+    que de la graine et de i (génération par morceaux, en parallèle, ou extension d’une campagne).
+    Appelé avec un numéro, l’objet renvoie l’identifiant porté (bits du mot de code, position 0 = bit de poids fort).
+
+    Attributes:
+        seed (int): Graine des tirages.
+        biases (np.ndarray): Biais p_j de chaque position.
+    """
+
+    __slots__ = ("seed", "biases", "_bloc")
+
+    def __init__(self, seed: int, biases):
+        self.seed = seed
+        self.biases = np.asarray(biases, dtype=np.float64)
+        self._bloc = (None, None)
+
+    @classmethod
+    def for_carriers(cls, INTER_LIST: list[str]) -> "TardosCode":
+        digest = hmac.new(_key(), "\x1f".join(INTER_LIST).encode("utf-8"), "sha256").digest()
+        seed = int.from_bytes(digest[:8], "big")
+        return cls(seed, tardosBiases(len(INTER_LIST), seed))
+
+    def codewords(self, bloc: int) -> list[int]:
+        """
+        Identifiants des destinataires [bloc × BLOCK, (bloc + 1) × BLOCK).
+        """
+        rng = np.random.default_rng([self.seed, 1, bloc])
+        bits = rng.random((BLOCK, len(self.biases))) < self.biases
+        # Bits de poids fort complétés à gauche jusqu'à un nombre entier d'octets
+        marge = -len(self.biases) % 8
+        octets = np.packbits(np.pad(bits, ((0, 0), (marge, 0))), axis=1)
+        return [int.from_bytes(ligne.tobytes(), "big") for ligne in octets]
+
+    def __call__(self, numero: int) -> int:
+        bloc, ids = self._bloc
+        if bloc != numero // BLOCK:
+            bloc = numero // BLOCK
+            ids = self.codewords(bloc)
+            self._bloc = (bloc, ids)
+        return ids[numero % BLOCK]
+
+    def to_dict(self) -> dict:
+        return {"seed": self.seed, "c": COLLUDERS, "biais": self.biases.tolist()}
+
+
+def tardosPath(archive_name: str):
+    # Même fichier pour tous les backends (watermark_<hash>_<n>.json, .canary ou sans extension)
+    return logs_dir() / f"{archive_name.split('.')[0]}{TARDOS_SUFFIX}"
+
+
+def saveTardos(archive_name: str, code: TardosCode) -> None:
+    """
+    Enregistre les paramètres du code d’une campagne (rien n’est fait s’ils existent déjà).
+    """
+    chemin = tardosPath(archive_name)
+    if chemin.exists():
+        return
+    # Fichier temporaire propre à cet appel, publié sans jamais écraser un fichier déjà publié
+    tmp_path = tempPath(chemin)
+    try:
+        with tmp_path.open("x", encoding="utf-8") as f:
+            json.dump(code.to_dict(), f)
+        publishFile(tmp_path, chemin)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def loadTardos(archive_name: str) -> TardosCode | None:
+    """
+    Paramètres du code d’une campagne, None si la campagne n’a pas été générée en codage tardos.
+    """
+    try:
+        with tardosPath(archive_name).open("r", encoding="utf-8") as f:
+            params = json.load(f)
+    except FileNotFoundError:
+        return None
+    return TardosCode(params["seed"], params["biais"])
+
+
+def accuse(ids: list[int], chiffres: list[int | None], biases) -> tuple[np.ndarray, int]:
+    """
+    Scores d’accusation symétriques (Škorić et al.) de tous les destinataires pour un email fuité.
+
+    Pour chaque position observée (bit lu y, biais p) : +√((1-p)/p) si le destinataire a le bit 1 là où
+    y = 1, -√(p/(1-p)) s’il a 0 ; symétriquement pour y = 0. Le score est donc X·w + constante, où X est
+    la matrice des bits des destinataires : il est calculé sur les ids eux-mêmes, octet par octet
+    (table des 256 sommes possibles de chaque octet, un seul produit matriciel), sans construire X.
+
+    Args:
+        ids (list[int]): Identifiants archivés des destinataires (bits du mot de code).
+        chiffres (list[int | None]): Bits lus dans l’email (`decode_digits`), None si la position n’est pas observée.
+        biases: Biais de chaque position.
+
+    Returns:
+        tuple[np.ndarray, int]: Score de chaque destinataire (même ordre que `ids`), nombre de positions observées.
+    """
+    p = np.asarray(biases, dtype=np.float64)
+    observe = np.array([chiffre is not None for chiffre in chiffres])
+    y = np.array([chiffre or 0 for chiffre in chiffres])
+    g1 = np.sqrt((1 - p) / p)
+    g0 = np.sqrt(p / (1 - p))
+    # y = 1 : g1 si bit 1, -g0 si bit 0 ; y = 0 : g0 si bit 0, -g1 si bit 1
+    w = np.where(observe, (g0 + g1) * np.where(y == 1, 1, -1), 0.0)
+    constante = float(np.sum(np.where(observe, np.where(y == 1, -g0, g0), 0.0)))
+
+    nb_octets = (len(p) + 7) // 8
+    poids = np.concatenate([np.zeros(nb_octets * 8 - len(p)), w]).reshape(nb_octets, 8)
+    table = poids @ _OCTETS.T
+    octets = np.frombuffer(b"".join(id_.to_bytes(nb_octets, "big") for id_ in ids), dtype=np.uint8)
+    octets = octets.reshape(len(ids), nb_octets)
+    scores = table[np.arange(nb_octets), octets].sum(axis=1) + constante
+    return scores, int(observe.sum())
+
+
+def threshold(nb_destinataires: int, nb_positions: int) -> float:
+    """
+    Seuil d’accusation : le score d’un innocent est de moyenne 0 et de variance égale au nombre de positions
+    observées ; le seuil borne à `EPSILON` la probabilité d’accuser au moins un des innocents.
+    """
+    return NormalDist().inv_cdf(1 - EPSILON / max(nb_destinataires, 1)) * nb_positions ** 0.5
@@ -0,0 +1,412 @@
+from contextlib import contextmanager
+from utils import *
+import argparse
+import logging
+import sqlite3
+import json
+
+
+logger = logging.getLogger("canary.index")
+
+INDEX_FILENAME = "index.sqlite"
+# À incrémenter à chaque changement de schéma : l'index est alors reconstruit depuis les archives
+SCHEMA_VERSION = 3
+# Variantes ajoutées à une archive JSON après coup (extension de campagne) : une ligne JSON par variante,
+# dans un fichier "<archive>.ext.jsonl" à côté de l'archive (jamais réécrite)
+EXTENSION_SUFFIX = ".ext.jsonl"
+# Plus grand entier SQLite (64 bits signés) : un id plus grand (plus de 63 positions binaires, codage tardos
+# ou hamming sur un long email) est stocké en BLOB, octets de poids fort en premier
+MAX_SQL_INT = 2**63 - 1
+
+
+def createSchema(conn: sqlite3.Connection) -> None:
+    """
+    Crée (si besoin) les tables `variantes` et `campagnes`.
+
+    Ce schéma est partagé par l’index des archives JSON et par le backend d’archivage SQLite
+    (`backends.py`) : toutes les fonctions de recherche ci-dessous acceptent une connexion
+    vers l’une ou l’autre base.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS variantes (
+            archive TEXT NOT NULL,
+            employe TEXT NOT NULL,
+            id_binaire TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            hash_email TEXT NOT NULL,
+            word_hash TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_variantes_hash_email ON variantes(hash_email)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_variantes_word_hash ON variantes(word_hash)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_variantes_archive ON variantes(archive)")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS campagnes (
+            archive TEXT PRIMARY KEY,
+            original_email_hash TEXT NOT NULL,
+            timestamp TEXT,
+            mots_porteurs TEXT
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_campagnes_original ON campagnes(original_email_hash)")
+
+
+def loadArchive(path) -> dict:
+    """
+    Charge une archive JSON, avec les variantes ajoutées par extension de campagne (`<archive>.ext.jsonl`).
+    """
+    path = Path(path)
+    with path.open("r", encoding="utf-8") as f:
+        contenu = json.load(f)
+    extension = path.with_name(path.name + EXTENSION_SUFFIX)
+    if extension.exists():
+        with extension.open("r", encoding="utf-8") as f:
+            for ligne in f:
+                if ligne.strip():
+                    info = json.loads(ligne)
+                    contenu["variantes"][info["Employe"]] = info
+                    contenu["all variantes"] += [info["hash email"], info["word hash"]]
+    return contenu
+
+
+def _reindexAll(conn: sqlite3.Connection) -> int:
+    total = 0
+    with conn:
+        conn.execute("DELETE FROM variantes")
+        conn.execute("DELETE FROM campagnes")
+    for fichier in sorted(logs_dir().glob("watermark_*.json")):
+        try:
+            contenu = loadArchive(fichier)
+        except (ValueError, KeyError) as e:
+            # Archive tronquée (écriture interrompue par une ancienne version) : ignorée, pas d'arrêt
+            logger.error("❌ Archive illisible ignorée : %s (%s)", fichier.name, e)
+            continue
+        total += indexArchive(fichier.name, contenu, conn)
+    return total
+
+
+def connectIndex() -> sqlite3.Connection:
+    """
+    Ouvre (et crée si besoin) l’index SQLite des empreintes, stocké dans `logs/index.sqlite`.
+
+    L’index contient une ligne par variante archivée et associe directement le hash de l’email
+    et le hash des mots porteurs au couple (archive, employé). Il garde aussi, par campagne,
+    la disposition des mots porteurs utilisée pour l’identification approchée.
+    Si l’index a été créé avec un ancien schéma, il est reconstruit depuis les archives.
+
+    La connexion peut être utilisée depuis un autre thread que celui qui l’a ouverte (réponses
+    en streaming de FastAPI), mais jamais par deux threads à la fois.
+
+    Returns:
+        sqlite3.Connection: Connexion ouverte sur l’index.
+    """
+    dossier_path = logs_dir()
+    dossier_path.mkdir(parents=True, exist_ok=True)
+
+    conn = sqlite3.connect(dossier_path / INDEX_FILENAME, check_same_thread=False)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version != SCHEMA_VERSION:
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS variantes")
+            conn.execute("DROP TABLE IF EXISTS campagnes")
+            createSchema(conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        _reindexAll(conn)
+    return conn
+
+
+@contextmanager
+def _connection(conn: sqlite3.Connection | None):
+    # Réutilise la connexion fournie, sinon ouvre (puis ferme) une connexion sur l'index
+    if conn is not None:
+        yield conn
+        return
+    conn = connectIndex()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def indexRows(rows: list[tuple], conn: sqlite3.Connection | None = None) -> int:
+    """
+    Insère des lignes (archive, employé, id binaire, id, hash email, word hash) dans l’index.
+
+    Args:
+        rows (list[tuple]): Lignes à insérer.
+        conn (sqlite3.Connection | None): Connexion existante (sinon une connexion est ouverte puis fermée).
+
+    Returns:
+        int: Nombre de lignes indexées.
+    """
+    with _connection(conn) as conn:
+        with conn:
+            insertRows(rows, conn)
+    return len(rows)
+
+
+def insertRows(rows: list[tuple], conn: sqlite3.Connection) -> None:
+    """
+    Insère des lignes dans la table `variantes`, dans la transaction en cours de `conn`.
+    """
+    conn.executemany(
+        "INSERT INTO variantes (archive, employe, id_binaire, id, hash_email, word_hash) VALUES (?, ?, ?, ?, ?, ?)",
+        [row if row[3] <= MAX_SQL_INT else (*row[:3], row[3].to_bytes((row[3].bit_length() + 7) // 8, "big"), *row[4:])
+         for row in rows],
+    )
+
+
+def indexCampaign(filename: str, original_email_hash: str, layout: list | None, conn: sqlite3.Connection,
+                  timestamp: str | None = None) -> None:
+    """
+    Enregistre (ou remplace) une campagne et la disposition de ses mots porteurs.
+    L’insertion est faite dans la transaction en cours de `conn` (validée par l’appelant).
+    """
+    conn.execute(
+        "INSERT OR REPLACE INTO campagnes (archive, original_email_hash, timestamp, mots_porteurs) VALUES (?, ?, ?, ?)",
+        (
+            filename, original_email_hash, timestamp,
+            json.dumps(layout, ensure_ascii=False) if layout is not None else None,
+        ),
+    )
+
+
+def archiveRows(filename: str, finalLogs: dict) -> list[tuple]:
+    """
+    Lignes de la table `variantes` pour une archive (format produit par `archive()`).
+
+    Les archives antérieures ne contiennent pas d’"id" entier : il est alors recalculé depuis l’id binaire.
+    """
+    return [
+        (
+            filename, info["Employe"], info["id binaire"], info["id"] if "id" in info else int(info["id binaire"] or "0", 2),
+            info["hash email"], info["word hash"],
+        )
+        for info in finalLogs["variantes"].values()
+    ]
+
+
+def indexArchive(filename: str, finalLogs: dict, conn: sqlite3.Connection | None = None) -> int:
+    """
+    Ajoute dans l’index toutes les variantes d’une archive, ainsi que la campagne elle-même.
+
+    Les archives antérieures ne contiennent pas de "mots porteurs" : la campagne est alors
+    indexée sans disposition (pas d’identification approchée).
+
+    Args:
+        filename (str): Nom du fichier d’archive (ex: "watermark_<hash>_<n>.json").
+        finalLogs (dict): Contenu de l’archive (format produit par `archive()`).
+        conn (sqlite3.Connection | None): Connexion existante (sinon une connexion est ouverte puis fermée).
+
+    Returns:
+        int: Nombre de variantes indexées.
+    """
+    with _connection(conn) as conn:
+        with conn:
+            indexCampaign(
+                filename, finalLogs["original_email_hash"], finalLogs.get("mots porteurs"), conn,
+                finalLogs.get("timestamp:"),
+            )
+        return indexRows(archiveRows(filename, finalLogs), conn)
+
+
+def extensionStart(filename: str, conn: sqlite3.Connection) -> tuple[list | None, int]:
+    """
+    Prépare l’extension d’une campagne : retourne sa disposition des mots porteurs et le numéro du
+    premier nouveau destinataire (nombre de variantes déjà archivées : en codage hamming, l’id archivé
+    est le mot de code et non le numéro). À appeler dans une transaction d’écriture (BEGIN IMMEDIATE)
+    pour que deux extensions simultanées n’attribuent pas les mêmes identifiants.
+
+    Raises:
+        LookupError: Si la campagne n’existe pas.
+    """
+    row = conn.execute("SELECT mots_porteurs FROM campagnes WHERE archive = ?", (filename,)).fetchone()
+    if row is None:
+        raise LookupError(f"Aucune campagne archivée sous le nom {filename}.")
+    (suivant,) = conn.execute("SELECT COUNT(*) FROM variantes WHERE archive = ?", (filename,)).fetchone()
+    return (json.loads(row[0]) if row[0] is not None else None), suivant
+
+
+def rebuildIndex() -> int:
+    """
+    Reconstruit entièrement l’index à partir des fichiers `watermark_*.json` présents dans `logs/`.
+
+    Returns:
+        int: Nombre total de variantes indexées.
+    """
+    with _connection(None) as conn:
+        return _reindexAll(conn)
+
+
+def findCampaigns(original_email_hash: str, conn: sqlite3.Connection | None = None) -> list[dict]:
+    """
+    Retourne les campagnes archivées pour un email original donné :
+    [{"archive": ..., "nb_variantes": ..., "nb_porteurs": ... | None}, ...]
+    """
+    with _connection(conn) as conn:
+        rows = conn.execute(
+            """
+            SELECT c.archive, c.mots_porteurs, COUNT(v.archive)
+            FROM campagnes c
+            LEFT JOIN variantes v ON v.archive = c.archive
+            WHERE c.original_email_hash = ?
+            GROUP BY c.archive
+            ORDER BY c.rowid
+            """,
+            (original_email_hash,),
+        ).fetchall()
+    return [
+        {
+            "archive": archive_name,
+            "nb_variantes": nb_variantes,
+            "nb_porteurs": len(json.loads(layout)) if layout is not None else None,
+        }
+        for archive_name, layout, nb_variantes in rows
+    ]
+
+
+# Dispositions déjà décodées (`loadCampaigns`) : archive → (JSON, disposition)
+_LAYOUTS = {}
+
+
+def loadCampaigns(conn: sqlite3.Connection | None = None) -> list[tuple[str, list[list[str]]]]:
+    """
+    Retourne toutes les campagnes indexées dont la disposition des mots porteurs est connue :
+    [(archive, [[mot, synonyme], ...]), ...]
+    """
+    with _connection(conn) as conn:
+        rows = conn.execute(
+            "SELECT archive, mots_porteurs FROM campagnes WHERE mots_porteurs IS NOT NULL ORDER BY rowid"
+        ).fetchall()
+    campagnes = []
+    for archive_name, texte in rows:
+        # Disposition décodée une seule fois par campagne (même objet renvoyé tant qu'elle ne change pas)
+        cache = _LAYOUTS.get(archive_name)
+        if cache is None or cache[0] != texte:
+            cache = _LAYOUTS[archive_name] = (texte, json.loads(texte))
+        campagnes.append((archive_name, cache[1]))
+    return campagnes
+
+
+def loadRecipients(filename: str, conn: sqlite3.Connection | None = None) -> list[tuple[str, str, int]]:
+    """
+    Retourne les destinataires d’une campagne : [(employé, id binaire, id), ...]
+    """
+    with _connection(conn) as conn:
+        rows = conn.execute(
+            "SELECT employe, id_binaire, id FROM variantes WHERE archive = ? ORDER BY rowid", (filename,)
+        ).fetchall()
+    # Ids de plus de 63 bits stockés en BLOB (voir `insertRows`)
+    return [row if isinstance(row[2], int) else (row[0], row[1], int.from_bytes(row[2], "big")) for row in rows]
+
+
+def _info(row: tuple) -> dict:
+    archive_name, employe, id_binaire, hash_mail, word_hash = row
+    return {
+        "Employe": employe,
+        "id binaire": id_binaire,
+        "hash email": hash_mail,
+        "word hash": word_hash,
+        "archive": archive_name,
+    }
+
+
+def lookupHashes(email_hash: str, wordHash: str, conn: sqlite3.Connection | None = None) -> tuple[dict | bool, bool]:
+    """
+    Recherche dans l’index une variante correspondant au hash de l’email ou au hash des mots porteurs.
+
+    Une correspondance sur le hash de l’email est toujours préférée à une correspondance
+    sur le hash des mots porteurs. Si plusieurs destinataires ont la meilleure empreinte trouvée
+    (même variante reçue par deux destinataires), aucun n’est désigné : (False, False).
+
+    Args:
+        email_hash (str): Hash SHA-256 de l’email complet.
+        wordHash (str): Hash SHA-256 des mots porteurs.
+        conn (sqlite3.Connection | None): Connexion existante (sinon l’index `logs/index.sqlite`).
+
+    Returns:
+        tuple[dict | bool, bool]: Même format que `logs_identify` :
+            - (info, True)  -> correspondance exacte sur le hash de l’email
+            - (info, False) -> correspondance sur le hash des mots porteurs
+            - (False, False) -> aucune correspondance
+    """
+    with _connection(conn) as conn:
+        rows = conn.execute(
+            """
+            SELECT archive, employe, id_binaire, hash_email, word_hash, hash_email = ?
+            FROM variantes
+            WHERE hash_email = ? OR word_hash = ?
+            ORDER BY hash_email = ? DESC, rowid
+            LIMIT 2
+            """,
+            (email_hash, email_hash, wordHash, email_hash),
+        ).fetchall()
+
+    if not rows or _ambiguous(rows[0], rows[1:], 5):
+        return False, False
+    return _info(rows[0][:5]), bool(rows[0][5])
+
+
+def _ambiguous(meilleure: tuple, suivantes: list[tuple], certitude: int) -> bool:
+    # Une autre ligne de même niveau (hash de l'email, ou hash des mots porteurs) pour un autre destinataire
+    return any(row[certitude] == meilleure[certitude] and row[:2] != meilleure[:2] for row in suivantes)
+
+
+def lookupMany(hashes: list[tuple[str, str]], conn: sqlite3.Connection | None = None) -> list[tuple[dict | bool, bool]]:
+    """
+    Version "batch" de `lookupHashes` : recherche toutes les empreintes en une seule requête.
+
+    Les couples (hash email, hash mots porteurs) sont chargés dans une table temporaire puis joints
+    à l’index : le coût dépend du nombre d’emails à identifier, pas du nombre d’archives.
+
+    Args:
+        hashes (list[tuple[str, str]]): Couples (hash email, hash mots porteurs), un par email.
+        conn (sqlite3.Connection | None): Connexion existante (sinon l’index `logs/index.sqlite`).
+
+    Returns:
+        list[tuple[dict | bool, bool]]: Un résultat par couple, dans le même ordre (format de `lookupHashes`).
+    """
+    resultats = [(False, False)] * len(hashes)
+    with _connection(conn) as conn:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS requetes (pos INTEGER PRIMARY KEY, hash_email TEXT, word_hash TEXT)")
+        try:
+            conn.executemany(
+                "INSERT INTO requetes (pos, hash_email, word_hash) VALUES (?, ?, ?)",
+                ((pos, email_hash, word_hash) for pos, (email_hash, word_hash) in enumerate(hashes)),
+            )
+            rows = conn.execute(
+                """
+                SELECT r.pos, v.archive, v.employe, v.id_binaire, v.hash_email, v.word_hash, v.hash_email = r.hash_email
+                FROM requetes r
+                JOIN variantes v ON v.hash_email = r.hash_email OR v.word_hash = r.word_hash
+                ORDER BY r.pos, v.hash_email = r.hash_email DESC, v.rowid
+                """
+            )
+            meilleures = {}
+            for row in rows:
+                pos = row[0]
+                # Seule la meilleure correspondance (première ligne) est conservée pour chaque email,
+                # sauf si un autre destinataire a la même (voir `lookupHashes`)
+                if pos not in meilleures:
+                    meilleures[pos] = row
+                    resultats[pos] = (_info(row[1:6]), bool(row[6]))
+                elif resultats[pos][0] is not False and _ambiguous(meilleures[pos][1:], [row[1:]], 5):
+                    resultats[pos] = (False, False)
+        finally:
+            conn.execute("DELETE FROM requetes")
+            conn.commit()
+    return resultats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index des empreintes Canary (logs/index.sqlite).")
+    parser.add_argument("commande", choices=["rebuild"], help="rebuild : recrée l’index depuis les archives JSON")
+    args = parser.parse_args()
+
+    if args.commande == "rebuild":
+        nb = rebuildIndex()
+        print(f"✅ Index reconstruit : {nb} variantes indexées.")
@@ -0,0 +1,114 @@
+from __future__ import annotations
+from text_watermarking import batch_identify
+from email import message_from_bytes, policy
+from pathlib import Path
+import argparse
+import json
+import csv
+import io
+import re
+import sys
+
+
+COLONNES = ["source", "employe", "id_binaire", "archive", "correspondance", "confiance"]
+
+# Séparateur de messages d'un fichier mbox (ligne "From <expéditeur> <date>")
+MBOX_SEPARATOR = re.compile(r"^From .*$\n?", re.MULTILINE)
+
+
+def _message_body(raw: str) -> str:
+    """
+    Extrait le corps texte (première partie text/plain) d’un message au format RFC 822.
+    Les retours à la ligne ajoutés en fin de message par le transport sont retirés.
+    """
+    message = message_from_bytes(raw.encode("utf-8"), policy=policy.default)
+    body = message.get_body(preferencelist=("plain",))
+    if body is None:
+        return ""
+    return body.get_content().rstrip("\r\n")
+
+
+def parse_leaks(name: str, data: bytes) -> dict[str, str]:
+    """
+    Transforme le contenu d’un fichier en emails à identifier.
+
+    - fichier mbox (commence par "From ") : un email par message, nommés "<fichier>#<n>"
+    - fichier .eml : le corps texte du message
+    - autre fichier : le texte brut de l’email
+
+    Args:
+        name (str): Nom du fichier (sert de source dans les résultats).
+        data (bytes): Contenu du fichier.
+
+    Returns:
+        dict[str, str]: {source: texte de l’email}
+    """
+    texte = data.decode("utf-8", errors="replace")
+
+    if texte.startswith("From "):
+        messages = [m for m in MBOX_SEPARATOR.split(texte) if m.strip()]
+        return {
+            f"{name}#{i + 1}": _message_body(re.sub(r"^>(>*From )", r"\1", message, flags=re.MULTILINE))
+            for i, message in enumerate(messages)
+        }
+    if name.lower().endswith(".eml"):
+        return {name: _message_body(texte)}
+    return {name: texte}
+
+
+def load_leaks(path: Path) -> dict[str, str]:
+    """
+    Charge les emails fuités depuis un fichier ou un dossier (tous les fichiers du dossier, triés).
+    """
+    fichiers = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    emails = {}
+    for fichier in fichiers:
+        name = str(fichier.relative_to(path)) if path.is_dir() else fichier.name
+        emails.update(parse_leaks(name, fichier.read_bytes()))
+    return emails
+
+
+def to_csv(resultats: list[dict]) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLONNES)
+    writer.writeheader()
+    writer.writerows(resultats)
+    return buffer.getvalue()
+
+
+def to_json(resultats: list[dict]) -> str:
+    return json.dumps(resultats, indent=2, ensure_ascii=False)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Identification en lot depuis la ligne de commande :
+
+        python identify_batch.py fuites/ --format csv --output resultats.csv
+
+    Retourne 0 si au moins un email a été attribué, 1 sinon.
+    """
+    parser = argparse.ArgumentParser(description="Canary — identification en lot d’emails fuités.")
+    parser.add_argument("chemin", type=Path, help="Fichier (email, .eml ou mbox) ou dossier d’emails fuités")
+    parser.add_argument("--format", choices=["json", "csv"], default="json", help="Format de sortie (json par défaut)")
+    parser.add_argument("--output", type=Path, help="Fichier de sortie (sortie standard par défaut)")
+    args = parser.parse_args(argv)
+
+    if not args.chemin.exists():
+        print(f"❌ — Chemin introuvable : {args.chemin}", file=sys.stderr)
+        return 1
+
+    resultats = batch_identify(load_leaks(args.chemin))
+    sortie = to_csv(resultats) if args.format == "csv" else to_json(resultats)
+
+    if args.output:
+        args.output.write_text(sortie, encoding="utf-8")
+        print(f"✅ {len(resultats)} emails analysés, résultats enregistrés dans {args.output}", file=sys.stderr)
+    else:
+        sys.stdout.write(sortie)
+
+    return 0 if any(r["correspondance"] for r in resultats) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
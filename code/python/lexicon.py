@@ -0,0 +1,138 @@
+from utils import *
+import hashlib
+import pickle
+import json
+import os
+
+
+CACHE_DIRNAME = "cache"
+# Format du cache pickle : à incrémenter quand la structure du lexique change
+CACHE_FORMAT = 2
+# Nombre maximal de formes par mot porteur (un chiffre par position, noté de 0 à z dans l'id)
+MAX_ALTERNATIVES = 36
+
+
+class Lexicon:
+    """
+    Dictionnaire de synonymes chargé une seule fois et optimisé pour les recherches.
+
+    Le lexique est construit à partir de groupes de synonymes : des paires ("mot", "synonyme") ou des
+    groupes plus larges ("mot", "synonyme 1", "synonyme 2", ...). Chaque mot porteur dispose ainsi d’une
+    ou plusieurs formes alternatives, et une position de l’email peut porter plus d’un bit
+    (encodage en base mixte, voir `text_watermarking.capacity`).
+
+    Attributes:
+        carriers (frozenset[str]): Ensemble de tous les mots porteurs (mots ayant au moins un synonyme).
+        alternatives (dict[str, tuple[str, ...]]): Formes possibles de chaque mot porteur, le mot lui-même
+            en premier (chiffre 0), puis ses synonymes : d’abord ceux des groupes où il est en première
+            position, puis les autres membres des groupes où il apparaît.
+        partners (dict[str, str]): Premier synonyme de chaque mot porteur (`alternatives[mot][1]`).
+        source (str): Nom du fichier source (ex: "synonymes_fr_dict.json").
+        version (str): Hash SHA-256 du fichier source, utile pour invalider les caches.
+    """
+
+    __slots__ = ("carriers", "alternatives", "partners", "source", "version")
+
+    def __init__(self, groups, source: str = "", version: str = ""):
+        directs = {}
+        inverses = {}
+        for group in groups:
+            group = list(dict.fromkeys(group))
+            if len(group) < 2:
+                continue
+            tete, *autres = group
+            directs.setdefault(tete, []).extend(autres)
+            # Sens inverse : chaque autre membre du groupe peut être remplacé par les autres
+            for mot in autres:
+                inverses.setdefault(mot, []).extend(autre for autre in group if autre != mot)
+
+        alternatives = {}
+        for mot in [*directs, *inverses]:
+            if mot not in alternatives:
+                formes = dict.fromkeys([mot, *directs.get(mot, ()), *inverses.get(mot, ())])
+                alternatives[mot] = tuple(formes)[:MAX_ALTERNATIVES]
+
+        self.alternatives = alternatives
+        self.partners = {mot: formes[1] for mot, formes in alternatives.items()}
+        self.carriers = frozenset(alternatives)
+        self.source = source
+        self.version = version
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.carriers
+
+    def __len__(self) -> int:
+        return len(self.carriers)
+
+    def partner(self, word: str) -> str:
+        """
+        Retourne le synonyme d’un mot porteur (KeyError si le mot n’est pas dans le lexique).
+        """
+        return self.partners[word]
+
+    def radix(self, word: str) -> int:
+        """
+        Nombre de formes possibles d’un mot porteur (2 pour une simple paire de synonymes).
+        """
+        return len(self.alternatives[word])
+
+    @classmethod
+    def from_json(cls, filename: str) -> "Lexicon":
+        """
+        Construit le lexique depuis un fichier JSON de `data/`.
+
+        Formats acceptés :
+        - dictionnaire {"mot": "synonyme", ...} (ex: synonymes_fr_dict.json)
+          ou {"mot": ["synonyme 1", "synonyme 2", ...], ...}
+        - liste de groupes [["mot", "synonyme"], ["mot", "synonyme 1", "synonyme 2"], ...]
+          (ex: synonymes_fr_large.json)
+        """
+        raw = (data_dir() / filename).read_bytes()
+        contenu = json.loads(raw)
+        if isinstance(contenu, dict):
+            groups = ([mot, *([valeur] if isinstance(valeur, str) else valeur)] for mot, valeur in contenu.items())
+        else:
+            groups = contenu
+        return cls(groups, source=filename, version=hashlib.sha256(raw).hexdigest())
+
+    @classmethod
+    def load(cls, filename: str = "synonymes_fr_dict.json") -> "Lexicon":
+        """
+        Charge le lexique en passant par un cache pickle précompilé (`data/cache/<nom>.pickle`).
+
+        Le cache est invalidé dès que la date de modification (ou la taille) du fichier source change.
+        S’il ne peut pas être écrit (dossier en lecture seule, etc.), le lexique est simplement
+        construit depuis le JSON.
+        """
+        source_path = data_dir() / filename
+        stat = source_path.stat()
+        cle = (CACHE_FORMAT, stat.st_mtime_ns, stat.st_size)
+        cache_path = data_dir() / CACHE_DIRNAME / f"{source_path.stem}.pickle"
+
+        try:
+            with cache_path.open("rb") as f:
+                cle_cache, lexique = pickle.load(f)
+            if cle_cache == cle and isinstance(lexique, cls):
+                return lexique
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError):
+            pass
+
+        lexique = cls.from_json(filename)
+        # Fichier temporaire propre à cet appel : plusieurs processus (workers) peuvent écrire le cache en même temps
+        tmp_path = tempPath(cache_path)
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open("xb") as f:
+                pickle.dump((cle, lexique), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return lexique
+
+    def __getstate__(self):
+        return self.carriers, self.alternatives, self.partners, self.source, self.version
+
+    def __setstate__(self, state):
+        self.carriers, self.alternatives, self.partners, self.source, self.version = state
@@ -0,0 +1,307 @@
+"""
+Test de charge du service FastAPI (latence, débit, erreurs), entièrement hors ligne.
+
+Deux modes :
+- en mémoire (par défaut) : l’application `apicode:app` est appelée directement via le transport ASGI
+  de httpx, sans serveur ni réseau ; les archives sont écrites dans un dossier temporaire,
+- serveur local (`--url http://127.0.0.1:8000`) : les requêtes sont envoyées à un serveur déjà lancé
+  (ex: `uvicorn apicode:app --workers 4`) ; `--logs` doit alors désigner son dossier d’archives.
+
+Un mélange de requêtes (`--mix generate=1,identify=8,fuzzy=1`) est rejoué à concurrence fixe :
+- generate : génération d’une campagne (emails synthétiques tirés d’un petit ensemble : certains
+  sont déjà en cache ou archivés, comme en production),
+- identify : identification exacte d’une variante archivée,
+- fuzzy : identification d’une variante tronquée (identification approchée).
+
+Avec `--archives N`, N campagnes synthétiques sont d’abord archivées, pour mesurer l’identification
+sur un nombre réaliste d’archives. Les résultats (p50/p95/p99, requêtes par seconde, taux d’erreur,
+par type de requête) sont écrits en JSON :
+    python loadtest.py --archives 1000 --concurrence 16 --requetes 2000
+    python loadtest.py --url http://127.0.0.1:8000 --logs ../../logs --archives 500 -o charge.json
+"""
+from contextlib import nullcontext
+from pathlib import Path
+from utils import *
+from benchmark import SEED, synthetic_email, git_commit
+from backends import get_backend
+import text_watermarking
+from text_watermarking import *
+from archive import *
+import argparse
+import platform
+import tempfile
+import asyncio
+import random
+import httpx
+import time
+import json
+import math
+import sys
+import os
+
+
+# Routes utilisées (API JSON v1 ou formulaires HTML avec --html)
+ROUTES = {
+    "v1": {"generate": "/api/v1/generate", "identify": "/api/v1/identify"},
+    "html": {"generate": "/generate", "identify": "/identify"},
+}
+# Nombre de mots porteurs des emails synthétiques (capacité 2^12 pour des paires de synonymes)
+NB_PORTEURS = 12
+# Nombre de fuites conservées pendant le pré-remplissage (tirées au hasard pendant le test)
+NB_FUITES = 500
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    """
+    "generate=1,identify=8,fuzzy=1" → {"generate": 1, "identify": 8, "fuzzy": 1}
+    """
+    poids = {}
+    for element in mix.split(","):
+        nom, _, valeur = element.partition("=")
+        nom = nom.strip()
+        if nom not in ("generate", "identify", "fuzzy"):
+            raise ValueError(f"Type de requête inconnu dans --mix : {nom!r}")
+        poids[nom] = int(valeur or 1)
+    if not any(poids.values()):
+        raise ValueError("--mix ne contient aucune requête.")
+    return poids
+
+
+def percentile(valeurs: list[float], p: float) -> float:
+    """
+    Percentile (rang le plus proche) d’une liste déjà triée.
+    """
+    if not valeurs:
+        return 0.0
+    rang = max(1, math.ceil(p / 100 * len(valeurs)))
+    return valeurs[rang - 1]
+
+
+def populate(nb_archives: int, nb_variantes: int, seed: int = SEED) -> list[str]:
+    """
+    Archive `nb_archives` campagnes synthétiques (emails différents) avec le backend configuré
+    (dossier `logs_dir()`), et retourne un échantillon de variantes à utiliser comme fuites.
+    """
+    rng = random.Random(seed)
+    backend = get_backend()
+    fuites = []
+    vues = 0
+    for k in range(nb_archives):
+        email = synthetic_email(text_watermarking.LEXICON, NB_PORTEURS, seed=seed + 10_000 + k)
+        INTER_LIST = inter_pair_list(email)
+        creds = watermark_words(genBits(nb_variantes, radices(INTER_LIST)), nb_variantes, INTER_LIST)
+        variantes, creds = watermark_emails(email, creds)
+        backend.save(archive(creds, email))
+        # Échantillon uniforme de fuites sur toutes les campagnes (réservoir)
+        for texte in rng.sample(list(variantes.values()), min(2, nb_variantes)):
+            vues += 1
+            if len(fuites) < NB_FUITES:
+                fuites.append(texte)
+            elif (j := rng.randrange(vues)) < NB_FUITES:
+                fuites[j] = texte
+    return fuites
+
+
+class LoadTest:
+    """
+    Rejoue `nb_requetes` requêtes (ou pendant `duree` secondes) avec `concurrence` clients simultanés
+    et accumule, par type de requête, les latences et les statuts.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, routes: dict, mix: dict[str, int], emails: list[str],
+                 fuites: list[str], nb_variantes: int, concurrence: int, nb_requetes: int,
+                 duree: float | None = None, seed: int = SEED):
+        self.client = client
+        self.routes = routes
+        self.html = routes is ROUTES["html"]
+        self.emails = emails
+        self.fuites = fuites
+        self.nb_variantes = nb_variantes
+        self.concurrence = concurrence
+        self.nb_requetes = nb_requetes
+        self.duree = duree
+        self.rng = random.Random(seed)
+        # Sans fuites archivées, seules les générations sont possibles
+        self.types = [t for t in mix for _ in range(mix[t]) if t == "generate" or fuites]
+        if not self.types:
+            raise ValueError("Aucune archive pour tester l’identification : utiliser --archives.")
+        self.latences = {t: [] for t in mix}
+        self.statuts = {t: {} for t in mix}
+        self._lancees = 0
+
+    def _requete(self, type_requete: str) -> tuple[str, dict]:
+        if type_requete == "generate":
+            email = self.rng.choice(self.emails)
+            if self.html:
+                return self.routes["generate"], {"data": {"email": email, "nb_variantes": self.nb_variantes}}
+            return self.routes["generate"], {"json": {"email": email, "nb_variantes": self.nb_variantes,
+                                                      "textes": True}}
+        fuite = self.rng.choice(self.fuites)
+        if type_requete == "fuzzy":
+            fuite = fuite[: len(fuite) * 2 // 3]
+        if self.html:
+            return self.routes["identify"], {"data": {"email_leak": fuite}}
+        return self.routes["identify"], {"json": {"email": fuite}}
+
+    def _suivante(self, fin: float | None) -> bool:
+        if fin is not None:
+            return time.perf_counter() < fin
+        if self._lancees >= self.nb_requetes:
+            return False
+        self._lancees += 1
+        return True
+
+    async def _client(self, fin: float | None) -> None:
+        while self._suivante(fin):
+            type_requete = self.rng.choice(self.types)
+            route, corps = self._requete(type_requete)
+            debut = time.perf_counter()
+            try:
+                reponse = await self.client.post(route, **corps)
+                statut = str(reponse.status_code)
+            except httpx.HTTPError as exc:
+                statut = type(exc).__name__
+            self.latences[type_requete].append(time.perf_counter() - debut)
+            self.statuts[type_requete][statut] = self.statuts[type_requete].get(statut, 0) + 1
+
+    async def run(self) -> float:
+        """
+        Lance les clients et retourne la durée totale (secondes).
+        """
+        debut = time.perf_counter()
+        fin = debut + self.duree if self.duree else None
+        await asyncio.gather(*(self._client(fin) for _ in range(self.concurrence)))
+        return time.perf_counter() - debut
+
+    def rapport(self, duree: float) -> dict:
+        def resume(latences: list[float], statuts: dict) -> dict:
+            latences = sorted(latences)
+            nb = len(latences)
+            erreurs = sum(n for statut, n in statuts.items() if not statut.startswith("2"))
+            return {
+                "requetes": nb,
+                "erreurs": erreurs,
+                "taux_erreur": round(erreurs / nb, 4) if nb else 0.0,
+                "rps": round(nb / duree, 2) if duree else 0.0,
+                "latence_ms": {
+                    "p50": round(percentile(latences, 50) * 1000, 3),
+                    "p95": round(percentile(latences, 95) * 1000, 3),
+                    "p99": round(percentile(latences, 99) * 1000, 3),
+                    "max": round(latences[-1] * 1000, 3) if latences else 0.0,
+                    "moyenne": round(sum(latences) / nb * 1000, 3) if nb else 0.0,
+                },
+                "statuts": dict(sorted(statuts.items())),
+            }
+
+        toutes = [l for latences in self.latences.values() for l in latences]
+        statuts = {}
+        for par_type in self.statuts.values():
+            for statut, n in par_type.items():
+                statuts[statut] = statuts.get(statut, 0) + n
+        return {
+            "duree_s": round(duree, 3),
+            "total": resume(toutes, statuts),
+            "par_type": {t: resume(self.latences[t], self.statuts[t]) for t in self.latences if self.latences[t]},
+        }
+
+
+async def _run(args, mix: dict[str, int], fuites: list[str]) -> dict:
+    routes = ROUTES["html" if args.html else "v1"]
+    rng = random.Random(args.seed)
+    emails = [synthetic_email(text_watermarking.LEXICON, NB_PORTEURS, seed=args.seed + rng.randrange(10**6))
+              for _ in range(args.emails)]
+    limites = httpx.Limits(max_connections=args.concurrence, max_keepalive_connections=args.concurrence)
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limites)
+        cycle = nullcontext()
+    else:
+        # Import différé : l'application n'est chargée qu'en mode en mémoire (logs par requête désactivés)
+        os.environ.setdefault("CANARY_LOG_LEVEL", "WARNING")
+        import apicode
+        transport = httpx.ASGITransport(app=apicode.app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout,
+                                   limits=limites)
+        # ASGITransport n'envoie pas les événements lifespan : arrêt de l'application (écriture des archives
+        # encore en file) avant la suppression du dossier temporaire
+        cycle = apicode.app.router.lifespan_context(apicode.app)
+
+    async with cycle, client:
+        if args.warmup:
+            await LoadTest(client, routes, mix, emails, fuites, args.variantes, args.concurrence, args.warmup,
+                           seed=args.seed + 1).run()
+        test = LoadTest(client, routes, mix, emails, fuites, args.variantes, args.concurrence, args.requetes,
+                        duree=args.duree, seed=args.seed)
+        duree = await test.run()
+    return test.rapport(duree)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Test de charge de l’application FastAPI (hors ligne).")
+    parser.add_argument("--url", default=None,
+                        help="Serveur déjà lancé (ex: http://127.0.0.1:8000) ; par défaut : appel en mémoire (ASGI)")
+    parser.add_argument("--logs", default=None,
+                        help="Dossier des archives (par défaut : dossier temporaire en mémoire, logs/ avec --url)")
+    parser.add_argument("--archives", type=int, default=0, help="Nombre de campagnes synthétiques à archiver avant le test")
+    parser.add_argument("--variantes-archive", type=int, default=50, help="Variantes par campagne pré-archivée")
+    parser.add_argument("--mix", default="generate=1,identify=8,fuzzy=1", help="Proportions des types de requêtes")
+    parser.add_argument("--concurrence", "-c", type=int, default=8, help="Nombre de clients simultanés")
+    parser.add_argument("--requetes", "-n", type=int, default=500, help="Nombre total de requêtes")
+    parser.add_argument("--duree", type=float, default=None, help="Durée du test en secondes (remplace --requetes)")
+    parser.add_argument("--warmup", type=int, default=20, help="Requêtes de chauffe, non comptées")
+    parser.add_argument("--variantes", type=int, default=20, help="Variantes demandées par requête generate")
+    parser.add_argument("--emails", type=int, default=20, help="Nombre d’emails différents pour generate")
+    parser.add_argument("--html", action="store_true", help="Routes HTML (/generate, /identify) au lieu de /api/v1")
+    parser.add_argument("--backend", choices=["json", "sqlite", "compact"], default=None,
+                        help="Backend d'archivage en mémoire (par défaut : CANARY_ARCHIVE_BACKEND ou json)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Délai maximal par requête (secondes)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", "-o", default=None, help="Fichier JSON de résultats (par défaut : sortie standard)")
+    args = parser.parse_args(argv)
+    mix = parse_mix(args.mix)
+
+    if args.backend:
+        os.environ["CANARY_ARCHIVE_BACKEND"] = args.backend
+    tmp = None
+    if args.logs:
+        os.environ["CANARY_LOGS_DIR"] = str(Path(args.logs).resolve())
+    elif not args.url:
+        tmp = tempfile.TemporaryDirectory(prefix="canary_loadtest_")
+        os.environ["CANARY_LOGS_DIR"] = tmp.name
+
+    try:
+        debut = time.perf_counter()
+        fuites = populate(args.archives, args.variantes_archive, args.seed) if args.archives else []
+        if args.archives:
+            print(f"✅ | {args.archives} campagnes archivées dans {logs_dir()} "
+                  f"({time.perf_counter() - debut:.1f} s)", file=sys.stderr)
+        resultats = asyncio.run(_run(args, mix, fuites))
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    rapport = {
+        "commit": git_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cible": args.url or "asgi",
+        "backend": os.environ.get("CANARY_ARCHIVE_BACKEND", "json"),
+        "archives": args.archives,
+        "mix": mix,
+        "concurrence": args.concurrence,
+        **resultats,
+    }
+    sortie = json.dumps(rapport, indent=4, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(sortie, encoding="utf-8")
+        print(f"✅ | Résultats écrits dans {args.output}", file=sys.stderr)
+    else:
+        print(sortie)
+    total = rapport["total"]
+    print(f"   {total['requetes']} requêtes, {total['rps']} req/s, p50 {total['latence_ms']['p50']} ms, "
+          f"p99 {total['latence_ms']['p99']} ms, erreurs {total['taux_erreur']:.2%}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
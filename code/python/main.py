@@ -1,6 +1,8 @@
 from __future__ import annotations
 from text_watermarking import *
 from archive import *
+from parallel import generate_parallel
+import logging
 import textwrap
 
 
@@ -21,10 +23,10 @@ def _pretty_email(email: str, width: int = 90) -> str:
     return textwrap.fill(email, width=width)
 
 
-def main(nb_variantes: int = 10, leaked_employee: str = "Employé 2") -> int:
+def main(nb_variantes: int = 10, leaked_employee: str = "Employé 2", workers: int = 1) -> int:
     """
     Main de démonstration (test manuel) :
-    - Génère des variantes watermarkées
+    - Génère des variantes watermarkées (sur `workers` processus si workers > 1)
     - Archive les empreintes
     - Simule une fuite et identifie le destinataire
 
@@ -46,19 +48,19 @@ def main(nb_variantes: int = 10, leaked_employee: str = "Employé 2") -> int:
     _print_section("⚙️ Préparation watermarking")
     inter_list = inter_pair_list(email)
     nb_bits = len(inter_list)
-    capacity = 2 ** nb_bits if nb_bits > 0 else 0
+    capacite = capacity(inter_list) if nb_bits > 0 else 0
 
     print(f"• Mots porteurs détectés : {nb_bits}")
-    print(f"• Capacité maximale théorique : {capacity} variantes")
+    print(f"• Capacité maximale théorique : {capacite} variantes")
 
     if nb_bits == 0:
         print("\n❌ Aucun mot porteur détecté : impossible de générer des variantes.")
         return 1
 
     # Si l'utilisateur demande trop de variantes, on ajuste proprement
-    if nb_variantes > capacity:
-        print(f"\n⚠️ Demande de {nb_variantes} variantes > capacité ({capacity}).")
-        nb_variantes = capacity
+    if nb_variantes > capacite:
+        print(f"\n⚠️ Demande de {nb_variantes} variantes > capacité ({capacite}).")
+        nb_variantes = capacite
         print(f"➡️ Ajustement automatique : nb_variantes = {nb_variantes}")
 
     if not verif(inter_list, nb_variantes):
@@ -68,14 +70,20 @@ def main(nb_variantes: int = 10, leaked_employee: str = "Employé 2") -> int:
         return 1
 
     try:
-        _print_section("🧬 Génération des identifiants binaires")
-        ids_list = genBits(nb_variantes, nb_bits)
+        if workers > 1:
+            _print_section(f"📩 Génération parallèle des {nb_variantes} variantes d’emails ({workers} processus)")
+            final_logs = generate_parallel(email, nb_variantes, workers)
+            email_variantes = final_logs.variantes()
+        else:
+            _print_section("🧬 Génération des identifiants des destinataires")
+            ids_list = genBits(nb_variantes, radices(inter_list))
 
-        _print_section("🔏 Application du watermark (mots porteurs)")
-        creds = watermark_words(ids_list, nb_variantes, inter_list)
+            _print_section("🔏 Application du watermark (mots porteurs)")
+            creds = watermark_words(ids_list, nb_variantes, inter_list)
 
-        _print_section(f"📩 Génération des {nb_variantes} variantes d’emails")
-        email_variantes, creds = watermark_emails(email, creds)
+            _print_section(f"📩 Génération des {nb_variantes} variantes d’emails")
+            email_variantes, creds = watermark_emails(email, creds)
+            final_logs = archive(creds, email)
 
         # Affichage propre des variantes
         for employee, variant_text in email_variantes.items():
@@ -83,7 +91,6 @@ def main(nb_variantes: int = 10, leaked_employee: str = "Employé 2") -> int:
             print(_pretty_email(variant_text))
 
         _print_section("📦 Archivage (hashs + metadata)")
-        final_logs = archive(creds, email)
         addArchive(final_logs)
         print("✅ Archivage terminé.")
 
@@ -113,5 +120,6 @@ def main(nb_variantes: int = 10, leaked_employee: str = "Employé 2") -> int:
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     raise SystemExit(main())
 
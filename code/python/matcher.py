@@ -0,0 +1,160 @@
+from pathlib import Path
+from utils import *
+from tokenizer import SEPARATEURS, words
+import hashlib
+import pickle
+import os
+
+
+CACHE_DIRNAME = "cache"
+# Format du cache pickle de l'automate : à incrémenter quand sa structure change
+MATCHER_FORMAT = 1
+
+
+class CarrierMatcher:
+    """
+    Automate d’Aho–Corasick construit sur les mots porteurs du lexique, mot par mot (et non caractère
+    par caractère) : un mot porteur peut être une expression de plusieurs mots ("mise à jour",
+    "compte-rendu", "dès demain").
+
+    Un seul passage sur la liste des mots de l’email (`tokenizer.words` / `tokenizer.tokenize`)
+    trouve toutes les occurrences, quel que soit le nombre d’expressions du lexique. Les occurrences
+    qui se chevauchent sont départagées de gauche à droite, la plus longue d’abord.
+
+    Attributes:
+        goto (list[dict[str, int]]): Transitions de chaque état (mot → état suivant).
+        fail (list[int]): Lien d’échec de chaque état (plus long suffixe qui est aussi un préfixe).
+        sortie (list[tuple[str, int] | None]): Mot porteur reconnu dans l’état (entrée du lexique,
+            nombre de mots), None si l’état n’est pas terminal.
+        suffixe (list[int]): État terminal suivant sur la chaîne des liens d’échec (0 s’il n’y en a pas).
+        longueur_max (int): Nombre de mots de la plus longue expression.
+        vocabulaire (frozenset[str]): Mots apparaissant dans au moins une expression.
+    """
+
+    __slots__ = ("goto", "fail", "sortie", "suffixe", "longueur_max", "vocabulaire")
+
+    def __init__(self, carriers):
+        self.goto = [{}]
+        self.sortie = [None]
+        self.longueur_max = 1
+
+        # Trie des expressions (découpées comme les emails)
+        for carrier in sorted(carriers):
+            mots = words(carrier)
+            if not mots:
+                continue
+            etat = 0
+            for mot in mots:
+                suivant = self.goto[etat].get(mot)
+                if suivant is None:
+                    suivant = len(self.goto)
+                    self.goto[etat][mot] = suivant
+                    self.goto.append({})
+                    self.sortie.append(None)
+                etat = suivant
+            # Deux entrées découpées de la même façon ("compte-rendu", "compte rendu") : la première est gardée
+            if self.sortie[etat] is None:
+                self.sortie[etat] = (carrier, len(mots))
+                self.longueur_max = max(self.longueur_max, len(mots))
+
+        # Liens d'échec et de sortie, en largeur d'abord
+        self.fail = [0] * len(self.goto)
+        self.suffixe = [0] * len(self.goto)
+        file = list(self.goto[0].values())
+        for etat in file:
+            for mot, suivant in self.goto[etat].items():
+                repli = self.fail[etat]
+                while repli and mot not in self.goto[repli]:
+                    repli = self.fail[repli]
+                cible = self.goto[repli].get(mot, 0)
+                self.fail[suivant] = cible
+                self.suffixe[suivant] = cible if self.sortie[cible] is not None else self.suffixe[cible]
+                file.append(suivant)
+        self.vocabulaire = frozenset(mot for transitions in self.goto for mot in transitions)
+
+    def find(self, mots: list[str]) -> list[tuple[int, int, str]]:
+        """
+        Occurrences des mots porteurs dans une liste de mots (en minuscules).
+
+        Returns:
+            list[tuple[int, int, str]]: (premier mot, dernier mot + 1, entrée du lexique) pour chaque
+                occurrence retenue, dans l’ordre du texte et sans chevauchement.
+        """
+        goto, fail, sortie, suffixe = self.goto, self.fail, self.sortie, self.suffixe
+        occurrences = []
+        expressions = False
+        etat = 0
+        precedent = -1
+        # Un mot absent de toutes les expressions ramène toujours l'automate à la racine : seuls les
+        # mots du vocabulaire sont parcourus (filtre par ensemble, l'essentiel des mots d'un email)
+        vocabulaire = self.vocabulaire
+        for j in [j for j, mot in enumerate(mots) if mot in vocabulaire]:
+            if j != precedent + 1:
+                etat = 0
+            precedent = j
+            mot = mots[j]
+            suivant = goto[etat].get(mot)
+            while suivant is None and etat:
+                etat = fail[etat]
+                suivant = goto[etat].get(mot)
+            etat = suivant or 0
+            terminal = etat if sortie[etat] is not None else suffixe[etat]
+            while terminal:
+                carrier, longueur = sortie[terminal]
+                occurrences.append((j + 1 - longueur, j + 1, carrier))
+                expressions = expressions or longueur > 1
+                terminal = suffixe[terminal]
+
+        if not expressions:
+            # Uniquement des mots simples : les occurrences sont déjà disjointes et dans l'ordre
+            return occurrences
+
+        # La plus à gauche d'abord, puis la plus longue
+        occurrences.sort(key=lambda o: (o[0], -o[1]))
+        retenues = []
+        fin = 0
+        for occurrence in occurrences:
+            if occurrence[0] >= fin:
+                retenues.append(occurrence)
+                fin = occurrence[1]
+        return retenues
+
+    @classmethod
+    def load(cls, lexicon) -> "CarrierMatcher":
+        """
+        Construit l’automate du lexique, en passant par un cache pickle (`data/cache/<nom>.matcher.pickle`)
+        pour les lexiques chargés depuis un fichier. Le cache est invalidé quand le lexique (sa version)
+        ou le découpage en mots changent ; s’il ne peut pas être écrit, l’automate est simplement construit.
+        """
+        if not lexicon.source or not lexicon.version:
+            return cls(lexicon.carriers)
+
+        cle = (MATCHER_FORMAT, lexicon.version, hashlib.sha256(SEPARATEURS.encode("utf-8")).hexdigest())
+        cache_path = data_dir() / CACHE_DIRNAME / f"{Path(lexicon.source).stem}.matcher.pickle"
+        try:
+            with cache_path.open("rb") as f:
+                cle_cache, matcher = pickle.load(f)
+            if cle_cache == cle and isinstance(matcher, cls):
+                return matcher
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError):
+            pass
+
+        matcher = cls(lexicon.carriers)
+        # Fichier temporaire propre à cet appel : deux threads qui écrivent le cache ne se mélangent pas
+        tmp_path = tempPath(cache_path)
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open("xb") as f:
+                pickle.dump((cle, matcher), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return matcher
+
+    def __getstate__(self):
+        return self.goto, self.fail, self.sortie, self.suffixe, self.longueur_max, self.vocabulaire
+
+    def __setstate__(self, state):
+        self.goto, self.fail, self.sortie, self.suffixe, self.longueur_max, self.vocabulaire = state
@@ -0,0 +1,185 @@
+"""
+Métriques internes (temps par étape, compteurs), exposées au format texte Prometheus sur `/metrics`.
+
+Les étapes instrumentées : découpage de l’email (tokenization), codage des identifiants (encoding),
+substitution des mots porteurs (substitution), hachage (hashing), écriture des archives
+(archive_write), identification (identify, fuzzy_identify, batch_identify, code_identify) et
+accusation (accuse).
+
+Désactivées avec CANARY_METRICS=0 : `timed` renvoie alors la fonction d’origine telle quelle et
+`timer` un gestionnaire de contexte vide, les compteurs ne font rien. Les variantes générées dans
+les processus de `parallel.py` ne sont pas comptées (chaque processus a ses propres métriques).
+"""
+from contextlib import nullcontext
+from functools import wraps
+import threading
+import time
+import math
+import os
+
+
+ENABLED = os.environ.get("CANARY_METRICS", "1").lower() not in ("0", "false", "non", "")
+
+# Bornes des histogrammes (secondes / nombre d'archives)
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SCAN_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1_000, 2_500, 5_000, 10_000)
+
+
+def _echappe(valeur) -> str:
+    return str(valeur).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(noms: tuple, valeurs: tuple, extra: str = "") -> str:
+    paires = [f'{nom}="{_echappe(valeur)}"' for nom, valeur in zip(noms, valeurs)]
+    if extra:
+        paires.append(extra)
+    return "{" + ",".join(paires) + "}" if paires else ""
+
+
+def _nombre(valeur: float) -> str:
+    if valeur == math.inf:
+        return "+Inf"
+    return repr(float(valeur)) if isinstance(valeur, float) else str(valeur)
+
+
+class Counter:
+    """
+    Compteur cumulatif, éventuellement ventilé par étiquettes (ex: backend="json").
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self._valeurs = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valeur: float = 1, *labels) -> None:
+        if not ENABLED:
+            return
+        with self._lock:
+            self._valeurs[labels] = self._valeurs.get(labels, 0) + valeur
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            valeurs = sorted(self._valeurs.items())
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_nombre(v)}" for labels, v in valeurs]
+
+
+class Histogram:
+    """
+    Histogramme à bornes fixes (`_bucket` cumulatifs, `_sum`, `_count`), ventilé par étiquettes.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: tuple = (), buckets: tuple = DURATION_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets) + (math.inf,)
+        # étiquettes → [compte par borne, somme, nombre]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, valeur: float, *labels) -> None:
+        if not ENABLED:
+            return
+        with self._lock:
+            serie = self._series.get(labels)
+            if serie is None:
+                serie = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, borne in enumerate(self.buckets):
+                if valeur <= borne:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valeur
+            serie[2] += 1
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            series = sorted((labels, (list(comptes), somme, nombre))
+                            for labels, (comptes, somme, nombre) in self._series.items())
+        lignes = []
+        for labels, (comptes, somme, nombre) in series:
+            cumul = 0
+            for borne, compte in zip(self.buckets, comptes):
+                cumul += compte
+                le = f'le="{_nombre(float(borne))}"'
+                lignes.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumul}")
+            lignes.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_nombre(float(somme))}")
+            lignes.append(f"{self.name}_count{_labels(self.labelnames, labels)} {nombre}")
+        return lignes
+
+
+STAGE_SECONDS = Histogram("canary_stage_duration_seconds", "Durée de chaque étape du traitement", ("stage",))
+ARCHIVES_SCANNED = Histogram("canary_identify_archives_scanned",
+                             "Archives parcourues par recherche (0 : recherche dans un index)", ("mode",),
+                             buckets=SCAN_BUCKETS)
+IDENTIFY_TOTAL = Counter("canary_identify_total", "Identifications par type de correspondance", ("correspondance",))
+VARIANTS_TOTAL = Counter("canary_variants_generated_total", "Variantes générées")
+ARCHIVES_WRITTEN = Counter("canary_archives_written_total", "Archives (ou extensions) écrites", ("backend",))
+ARCHIVE_BATCH = Histogram("canary_archive_batch_size", "Campagnes écrites par lot (file d’écriture des archives)",
+                          buckets=(1, 2, 4, 8, 16, 32, 64))
+
+REGISTRY = [STAGE_SECONDS, ARCHIVES_SCANNED, IDENTIFY_TOTAL, VARIANTS_TOTAL, ARCHIVES_WRITTEN, ARCHIVE_BATCH]
+
+
+class _Timer:
+    __slots__ = ("stage", "debut")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.debut = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        STAGE_SECONDS.observe(time.perf_counter() - self.debut, self.stage)
+        return False
+
+
+_NULL_TIMER = nullcontext()
+
+
+def timer(stage: str):
+    """
+    Mesure la durée d’un bloc :
+        with metrics.timer("hashing"):
+            ...
+    """
+    return _Timer(stage) if ENABLED else _NULL_TIMER
+
+
+def timed(stage: str):
+    """
+    Décorateur : mesure la durée de chaque appel de la fonction (fonction inchangée si les métriques sont désactivées).
+    """
+    def decorateur(fonction):
+        if not ENABLED:
+            return fonction
+
+        @wraps(fonction)
+        def mesuree(*args, **kwargs):
+            debut = time.perf_counter()
+            try:
+                return fonction(*args, **kwargs)
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - debut, stage)
+        return mesuree
+    return decorateur
+
+
+def render() -> str:
+    """
+    Toutes les métriques au format d’exposition texte Prometheus (version 0.0.4).
+    """
+    lignes = []
+    for metrique in REGISTRY:
+        lignes.append(f"# HELP {metrique.name} {metrique.description}")
+        lignes.append(f"# TYPE {metrique.name} {metrique.type}")
+        lignes.extend(metrique.samples())
+    return "\n".join(lignes) + "\n"
@@ -0,0 +1,150 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from text_watermarking import distinct_checker, inter_pair_list, iter_variants, verif
+from records import Campaign
+import threading
+import os
+
+
+# Configuration par défaut (surchargée par les variables d'environnement)
+WORKERS = int(os.environ.get("CANARY_WORKERS", "1"))
+CHUNK_SIZE = int(os.environ.get("CANARY_CHUNK_SIZE", "2000"))
+
+# Pool de processus partagé par toutes les générations du processus : (pool, nombre de processus)
+_POOL = (None, 0)
+_POOL_LOCK = threading.Lock()
+
+
+def process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Pool de processus du processus courant, créé au premier appel puis réutilisé : une génération ne paie
+    ni le démarrage des processus, ni le chargement du lexique et de l’automate dans chacun d’eux.
+    Le pool est recréé s’il a moins de `workers` processus. Fermé par `shutdown_pool` (arrêt de l’application).
+    """
+    global _POOL
+    with _POOL_LOCK:
+        pool, taille = _POOL
+        if pool is None or taille < workers:
+            if pool is not None:
+                # Les générations en cours sur l'ancien pool se terminent normalement
+                pool.shutdown(wait=False)
+            pool = ProcessPoolExecutor(max_workers=workers)
+            _POOL = (pool, workers)
+        return pool
+
+
+def shutdown_pool() -> None:
+    """
+    Ferme le pool de processus partagé (s’il a été créé), en attendant la fin des tâches en cours.
+    """
+    global _POOL
+    with _POOL_LOCK:
+        pool, _ = _POOL
+        _POOL = (None, 0)
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    # Pool cassé (processus tué) : le prochain appel à `process_pool` en crée un nouveau
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL[0] is pool:
+            _POOL = (None, 0)
+
+
+def _generate_chunk(args: tuple[str, int, int, bool]) -> list[tuple]:
+    """
+    Tâche exécutée dans un processus du pool : génère et hashe les variantes [start, stop).
+    Sans `textes`, le texte des variantes n’est pas renvoyé au processus principal (None).
+    """
+    email, start, stop, textes = args
+    if textes:
+        return list(iter_variants(email, stop, start))
+    return [(employe, id, None, emailHash, wordHash)
+            for employe, id, _, emailHash, wordHash in iter_variants(email, stop, start)]
+
+
+def _distincts(bloc: list[tuple], debut: int, distincts) -> list[tuple]:
+    if distincts is not None:
+        for numero, (_, id, _, _, _) in enumerate(bloc, debut):
+            distincts(numero, id)
+    return bloc
+
+
+def iter_variants_parallel(email: str, nb_variantes: int, workers: int | None = None, chunk_size: int = CHUNK_SIZE,
+                           start: int = 0, textes: bool = True):
+    """
+    Équivalent parallèle de `iter_variants` : la plage d’identifiants [start, nb_variantes) est découpée
+    en blocs de `chunk_size` répartis sur le pool de processus partagé (`process_pool`). Les variantes
+    sont renvoyées dans le même ordre (et avec le même contenu) que la version séquentielle.
+
+    Args:
+        email (str): Texte de l’email original (non watermarké).
+        nb_variantes (int): Nombre total de variantes à générer.
+        workers (int | None): Nombre de processus (par défaut : nombre de cœurs).
+        chunk_size (int): Nombre de variantes par tâche.
+        start (int): Premier identifiant à générer (0 par défaut).
+        textes (bool): Renvoyer le texte des variantes (sinon None : seuls les identifiants et les hash
+            transitent entre les processus).
+
+    Yields:
+        tuple[str, int, str | None, str, str]:
+            (employé, id, texte de la variante, hash email, hash des mots porteurs)
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size doit être supérieur ou égal à 1.")
+
+    # Vérifie la capacité avant de lancer les processus
+    inter_list = inter_pair_list(email)
+    if not verif(inter_list, nb_variantes):
+        raise ValueError(
+            f"Impossible de générer {nb_variantes} variantes avec seulement {len(inter_list)} mots porteurs."
+        )
+
+    taches = [(email, debut, min(debut + chunk_size, nb_variantes), textes)
+              for debut in range(start, nb_variantes, chunk_size)]
+    workers = workers or os.cpu_count() or 1
+
+    # Chaque bloc ne vérifie que ses propres mots de code tardos : la vérification entre blocs est faite ici
+    distincts = distinct_checker(inter_list)
+
+    if min(workers, len(taches)) <= 1:
+        for tache in taches:
+            yield from _distincts(_generate_chunk(tache), tache[1], distincts)
+        return
+
+    # Pool dimensionné sur `workers` (et non sur le nombre de blocs) : il sert tel quel aux appels suivants
+    executor = process_pool(workers)
+    try:
+        # map conserve l'ordre des blocs ; les blocs pas encore calculés sont annulés si le générateur est abandonné
+        for tache, bloc in zip(taches, executor.map(_generate_chunk, taches)):
+            yield from _distincts(bloc, tache[1], distincts)
+    except BrokenProcessPool:
+        _discard_pool(executor)
+        raise
+
+
+def generate_parallel(email: str, nb_variantes: int, workers: int | None = None,
+                      chunk_size: int = CHUNK_SIZE) -> Campaign:
+    """
+    Génère en parallèle les variantes d’une campagne.
+
+    Le résultat est identique à la génération séquentielle (`campaign.generate_campaign`, hors timestamp).
+    Seuls les identifiants et les hash reviennent des processus : les textes sont reconstruits à la
+    demande depuis la campagne (`records.Campaign`).
+
+    Args:
+        email (str): Texte de l’email original (non watermarké).
+        nb_variantes (int): Nombre de variantes à générer.
+        workers (int | None): Nombre de processus (par défaut : nombre de cœurs).
+        chunk_size (int): Nombre de variantes par tâche.
+
+    Returns:
+        Campaign: Campagne générée, prête à être archivée avec `addArchive`.
+    """
+    campagne = Campaign(email)
+    for _, id, _, emailHash, wordHash in iter_variants_parallel(email, nb_variantes, workers, chunk_size,
+                                                                textes=False):
+        campagne.add(id, emailHash, wordHash)
+    return campagne
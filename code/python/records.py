@@ -0,0 +1,179 @@
+from datetime import datetime
+from array import array
+from utils import *
+from text_watermarking import EmailTemplate, forms, layout_encoder
+from compact_archive import DIGEST_SIZE
+import sys
+
+
+class VariantRecord:
+    """
+    Vue sur un destinataire d’une `Campaign` : rien n’est stocké par destinataire en dehors des
+    tableaux de la campagne (identifiant, digests). Le nom, l’id binaire, les hash hexadécimaux et le
+    texte de la variante sont recalculés à la demande.
+
+    Attributes:
+        campaign (Campaign): Campagne du destinataire.
+        index (int): Position du destinataire dans la campagne (0 = premier destinataire de `campaign`).
+    """
+
+    __slots__ = ("campaign", "index")
+
+    def __init__(self, campaign: "Campaign", index: int):
+        self.campaign = campaign
+        self.index = index
+
+    @property
+    def employe(self) -> str:
+        return f"Employé {self.campaign.start + self.index + 1}"
+
+    @property
+    def id(self) -> int:
+        return self.campaign.ids[self.index]
+
+    @property
+    def id_binaire(self) -> str:
+        return formatId(self.id, self.campaign.bases)
+
+    @property
+    def email_hash(self) -> str:
+        return self.campaign.email_digest(self.index).hex()
+
+    @property
+    def word_hash(self) -> str:
+        return self.campaign.word_digest(self.index).hex()
+
+    @property
+    def mots_codes(self) -> list[str]:
+        return self.campaign.encode(self.id)
+
+    @property
+    def texte(self) -> str:
+        """
+        Texte de la variante, reconstruit depuis l’email compilé de la campagne.
+        """
+        return self.campaign.template.render(self.mots_codes)
+
+    def to_dict(self) -> dict:
+        """
+        Informations du destinataire au format des archives (`archive()`).
+        """
+        return {
+            "Employe": self.employe,
+            "id binaire": self.id_binaire,
+            "id": self.id,
+            "hash email": self.email_hash,
+            "word hash": self.word_hash,
+        }
+
+    def __repr__(self) -> str:
+        return f"VariantRecord({self.employe!r}, id={self.id})"
+
+
+class Campaign:
+    """
+    Campagne générée, gardée en mémoire sous forme compacte : l’email original (compilé, `EmailTemplate`)
+    et la disposition des mots porteurs ne sont stockés qu’une fois ; pour chaque destinataire, seuls
+    son identifiant et les deux digests SHA-256 bruts (hash de l’email, hash des mots porteurs) sont
+    gardés, dans des tableaux contigus (8 + 2 × 32 octets par destinataire).
+
+    Les mots porteurs codés et le texte d’une variante sont reconstruits à la demande (`VariantRecord`),
+    les logs complets (format des archives JSON) au moment de l’archivage (`logs`).
+
+    Attributes:
+        template (EmailTemplate): Email original compilé.
+        layout (list[list[str]]): Disposition des mots porteurs (`carrier_layout`).
+        bases (list[int]): Base de chaque position (nombre de formes).
+        original_email_hash (str): Hash de l’email original.
+        timestamp (str): Date de génération (ISO).
+        start (int): Numéro du premier destinataire (0, ou début d’une extension).
+        ids (array | list[int]): Identifiant de chaque destinataire (liste d’entiers Python si un
+            identifiant dépasse 64 bits : codages hamming et tardos sur beaucoup de positions).
+    """
+
+    __slots__ = ("template", "layout", "bases", "encode", "original_email_hash", "timestamp", "start", "ids",
+                 "_emails", "_words")
+
+    def __init__(self, email: str, start: int = 0, timestamp: str | None = None):
+        self.template = EmailTemplate(email)
+        self.layout = [list(forms(word)) for word in self.template.carriers]
+        self.bases = [len(formes) for formes in self.layout]
+        # Fonction id → mots porteurs codés
+        self.encode = layout_encoder(self.layout)
+        self.original_email_hash = hash_email(email)
+        self.timestamp = timestamp or datetime.now().isoformat()
+        self.start = start
+        self.ids = array("Q")
+        self._emails = bytearray()
+        self._words = bytearray()
+
+    def add(self, id: int, emailHash: str, wordHash: str) -> None:
+        """
+        Ajoute le destinataire suivant (hash en hexadécimal, tels que produits par `iter_variants`).
+        """
+        try:
+            self.ids.append(id)
+        except OverflowError:
+            self.ids = list(self.ids)
+            self.ids.append(id)
+        self._emails += bytes.fromhex(emailHash)
+        self._words += bytes.fromhex(wordHash)
+
+    def email_digest(self, index: int) -> bytes:
+        return bytes(self._emails[index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE])
+
+    def word_digest(self, index: int) -> bytes:
+        return bytes(self._words[index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [VariantRecord(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Destinataire {index} hors de la campagne ({len(self)} destinataires).")
+        return VariantRecord(self, index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield VariantRecord(self, i)
+
+    def variantes(self) -> dict[str, str]:
+        """
+        Texte de toutes les variantes : { "Employé X": "email_modifié", ... } (rendu à chaque appel).
+        """
+        return {record.employe: record.texte for record in self}
+
+    def logs(self) -> dict:
+        """
+        Logs complets de la campagne, au format d’`archive()` (construits pour l’archivage, non gardés).
+        """
+        variantes = {}
+        all_variantes = []
+        for record in self:
+            info = record.to_dict()
+            variantes[info["Employe"]] = info
+            all_variantes.append(info["hash email"])
+            all_variantes.append(info["word hash"])
+        return {
+            "timestamp:": self.timestamp,
+            "original_email_hash": self.original_email_hash,
+            "mots porteurs": self.layout,
+            "all variantes": all_variantes,
+            "variantes": variantes,
+        }
+
+    def taille(self) -> int:
+        """
+        Place occupée en mémoire (octets, estimation) : email compilé + tableaux des destinataires.
+        """
+        template = self.template
+        texte = sum(sys.getsizeof(s) for s in (*template.segments, *template.carriers, *template.surfaces))
+        ids = sys.getsizeof(self.ids) + (sum(sys.getsizeof(id) for id in self.ids) if isinstance(self.ids, list) else 0)
+        return texte + ids + sys.getsizeof(self._emails) + sys.getsizeof(self._words)
+
+    def __repr__(self) -> str:
+        return f"Campaign({self.original_email_hash[:12]}…, {len(self)} destinataires, début {self.start})"
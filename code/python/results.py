@@ -0,0 +1,170 @@
+from campaign import GENERATION_CACHE
+from archive_queue import ARCHIVE_QUEUE
+from backends import archiveKey, get_backend, parseArchiveKey
+from records import Campaign, VariantRecord
+from text_watermarking import carrier_layout, iter_variants
+from utils import *
+import text_watermarking
+import zipfile
+import json
+import io
+
+
+# Affichage paginé et export des variantes d'une campagne : la réponse de /generate ne contient que
+# le résumé de la campagne et sa clé ("watermark_<hash>_<n>", voir `backends.archiveKey`), les
+# variantes sont rendues page par page (ou par blocs pour les exports) à partir de cette clé.
+
+# Nombre de variantes par page (par défaut, et au maximum)
+PAR_PAGE = 20
+PAR_PAGE_MAX = 200
+# Nombre de variantes rendues à la fois pendant un export (NDJSON, ZIP)
+EXPORT_CHUNK = 500
+
+
+def campaign_summary(campagne: Campaign) -> dict:
+    """
+    Résumé d’une campagne générée, seul contenu de la réponse de /generate.
+    """
+    return {
+        "cle": archiveKey(campagne.original_email_hash, len(campagne)),
+        "archive": get_backend().archiveName(campagne.original_email_hash, len(campagne)),
+        "nb_variantes": len(campagne),
+        "nb_porteurs": len(campagne.layout),
+    }
+
+
+class CampaignResults:
+    """
+    Variantes d’une campagne, retrouvées à partir de sa clé :
+
+    - campagne en cache (`campaign.GENERATION_CACHE`, cas courant juste après /generate) : les textes
+      sont rendus depuis la campagne compacte (`records.Campaign`), sans rien regénérer — sauf si
+      l’archive a plus de destinataires que la campagne en cache (extension faite par un autre processus) ;
+    - sinon, avec l’email original : la campagne est lue dans l’archive (nombre de destinataires,
+      extensions comprises) et seules les variantes demandées sont regénérées (`iter_variants` sur la
+      plage [début, fin)) : le coût d’une page ne dépend pas de la taille de la campagne.
+
+    Attributes:
+        cle (str): Clé de la campagne (`archiveKey`).
+        total (int): Nombre de variantes.
+        nb_porteurs (int): Nombre de mots porteurs de l’email.
+
+    Raises:
+        ValueError: Si la clé est invalide, ou si les mots porteurs de l’email ne correspondent plus à
+            ceux de la campagne archivée (autre dictionnaire).
+        LookupError: Si la campagne n’est ni en cache ni archivée pour cet email.
+    """
+
+    __slots__ = ("cle", "total", "nb_porteurs", "_campagne", "_email")
+
+    def __init__(self, cle: str, email: str | None = None):
+        original_email_hash, nb_variantes = parseArchiveKey(cle)
+        self.cle = archiveKey(original_email_hash, nb_variantes)
+        self._email = None
+        backend = get_backend()
+        nom = backend.archiveName(original_email_hash, nb_variantes)
+        self._campagne = GENERATION_CACHE.get(
+            (original_email_hash, nb_variantes, text_watermarking.LEXICON.version)
+        )
+        if self._campagne is not None:
+            # Campagne pas encore archivée (file d'écriture) : le cache fait foi
+            archivee = self._archivee(backend, original_email_hash, nom)
+            if archivee is None or archivee["nb_variantes"] <= len(self._campagne):
+                self.total = len(self._campagne)
+                self.nb_porteurs = len(self._campagne.layout)
+                return
+            self._campagne = None
+
+        if email is None or hash_email(email) != original_email_hash:
+            raise LookupError("Campagne absente du cache : l’email original est nécessaire pour afficher ses variantes.")
+        # Campagne éventuellement encore dans la file d'écriture
+        ARCHIVE_QUEUE.flush()
+        archivee = self._archivee(backend, original_email_hash, nom)
+        if archivee is None:
+            raise LookupError(f"Aucune campagne archivée sous le nom {nom}.")
+        self.nb_porteurs = len(carrier_layout(email))
+        if archivee["nb_porteurs"] not in (None, self.nb_porteurs):
+            raise ValueError("Les mots porteurs de l’email ne correspondent pas à ceux de la campagne archivée.")
+        self.total = archivee["nb_variantes"]
+        self._email = email
+
+    @staticmethod
+    def _archivee(backend, original_email_hash: str, nom: str) -> dict | None:
+        return next((c for c in backend.find(original_email_hash) if c["archive"] == nom), None)
+
+    def page(self, debut: int, fin: int) -> list[VariantRecord]:
+        """
+        Variantes [debut, fin) de la campagne (bornées au nombre de variantes).
+        """
+        debut, fin = max(debut, 0), min(fin, self.total)
+        if self._campagne is not None:
+            return self._campagne[debut:fin]
+        if debut >= fin:
+            return []
+        extrait = Campaign(self._email, start=debut)
+        for _, id, _, emailHash, wordHash in iter_variants(self._email, fin, debut):
+            extrait.add(id, emailHash, wordHash)
+        return extrait[:]
+
+    def __iter__(self):
+        # Par blocs : une seule page d'enregistrements en mémoire à la fois
+        for debut in range(0, self.total, EXPORT_CHUNK):
+            yield from self.page(debut, debut + EXPORT_CHUNK)
+
+    def __len__(self) -> int:
+        return self.total
+
+
+def variant_out(record: VariantRecord) -> dict:
+    # Même format que les lignes de /generate/stream et les variantes de /api/v1/generate
+    return {
+        "nom": record.employe,
+        "id_binaire": record.id_binaire,
+        "texte": record.texte,
+        "hash_email": record.email_hash,
+        "word_hash": record.word_hash,
+    }
+
+
+def iter_ndjson(resultats: CampaignResults):
+    """
+    Export NDJSON (une variante par ligne), produit au fil de l’eau.
+    """
+    for record in resultats:
+        yield json.dumps(variant_out(record), ensure_ascii=False) + "\n"
+
+
+class _Flux(io.RawIOBase):
+    """
+    Sortie non "seekable" pour `zipfile` : les octets écrits sont gardés jusqu’au prochain `vider`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._morceaux = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._morceaux.append(bytes(data))
+        return len(data)
+
+    def vider(self) -> bytes:
+        data = b"".join(self._morceaux)
+        self._morceaux = []
+        return data
+
+
+def iter_zip(resultats: CampaignResults):
+    """
+    Export ZIP (un fichier texte par destinataire : "Employé X.txt"), produit au fil de l’eau : l’archive
+    est écrite en flux (descripteurs de données, sans retour en arrière), chaque fichier est envoyé dès
+    qu’il est compressé.
+    """
+    flux = _Flux()
+    with zipfile.ZipFile(flux, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for record in resultats:
+            zf.writestr(f"{record.employe}.txt", record.texte)
+            yield flux.vider()
+    yield flux.vider()
@@ -0,0 +1,29 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+
+# Les modules de code/python s'importent à plat ("from utils import *")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+@pytest.fixture(autouse=True)
+def logs(tmp_path, monkeypatch):
+    """
+    Dossier d’archives temporaire (CANARY_LOGS_DIR) pour chaque test.
+    """
+    monkeypatch.setenv("CANARY_LOGS_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture(autouse=True)
+def cache(logs):
+    """
+    Cache de génération vidé autour de chaque test : une campagne en cache n’a pas d’archive dans le
+    dossier temporaire du test suivant.
+    """
+    from campaign import GENERATION_CACHE
+    GENERATION_CACHE.clear()
+    yield GENERATION_CACHE
+    GENERATION_CACHE.clear()
@@ -0,0 +1,84 @@
+import pytest
+
+from backends import ArchiveBackend, CompactArchiveBackend, JsonArchiveBackend, SQLiteArchiveBackend, archiveKey
+from hash_index import loadArchive, rebuildIndex
+
+
+def _ecrire(writer, nb: int, marque: str) -> None:
+    for i in range(nb):
+        writer.add(f"Employé {i + 1}", i, f"{marque}e{i}", f"{marque}w{i}")
+
+
+def test_json_writers_simultanes(logs):
+    backend = JsonArchiveBackend()
+    premier = backend.writer("abc", 3, [["a", "b"], ["c", "d"]], "t")
+    second = backend.writer("abc", 3, [["a", "b"], ["c", "d"]], "t")
+    assert premier.archived and second.archived
+    # Écritures entrelacées : chaque writer a ses propres fichiers temporaires
+    _ecrire(premier, 3, "1")
+    _ecrire(second, 3, "2")
+
+    assert premier.close() is True
+    assert second.close() is False
+    contenu = loadArchive(logs / "watermark_abc_3.json")
+    assert contenu["all variantes"] == ["1e0", "1w0", "1e1", "1w1", "1e2", "1w2"]
+    assert [chemin.name for chemin in logs.iterdir() if chemin.suffix == ".part"] == []
+    assert backend.lookup("2e1", "x") == (False, False)
+    assert backend.lookup("1e1", "x")[0]["Employe"] == "Employé 2"
+
+
+def test_json_writer_abandon(logs):
+    backend = JsonArchiveBackend()
+    with backend.writer("abc", 2, [["a", "b"]], "t") as writer:
+        _ecrire(writer, 1, "1")
+        writer.abort()
+    assert not (logs / "watermark_abc_2.json").exists()
+    assert [chemin.name for chemin in logs.iterdir() if chemin.suffix == ".part"] == []
+    assert backend.find("abc") == []
+
+
+def _logs(hash_email: str, nb: int, marque: str = "") -> dict:
+    return {
+        "timestamp:": "t",
+        "original_email_hash": hash_email,
+        "mots porteurs": [["a", "b"]],
+        "all variantes": [h for i in range(nb) for h in (f"{marque}e{i}", f"{marque}w{i}")],
+        "variantes": {
+            f"Employé {i + 1}": {"Employe": f"Employé {i + 1}", "id binaire": str(i), "id": i,
+                                 "hash email": f"{marque}e{i}", "word hash": f"{marque}w{i}"}
+            for i in range(nb)
+        },
+    }
+
+
+def test_json_save_many(logs):
+    backend = JsonArchiveBackend()
+    lot = [_logs("abc", 2, "1"), _logs("abc", 2, "2"), _logs("def", 1, "3")]
+    assert backend.save_many(lot) == [True, False, True]
+    assert backend.save_many([_logs("def", 1, "4")]) == [False]
+    assert loadArchive(logs / "watermark_abc_2.json") == lot[0]
+    assert backend.lookup("1e1", "x")[0]["Employe"] == "Employé 2"
+    assert backend.lookup("2e1", "x") == (False, False)
+    assert [chemin.name for chemin in logs.iterdir() if chemin.suffix == ".part"] == []
+
+
+def test_reindex_archive_tronquee(logs):
+    backend = JsonArchiveBackend()
+    backend.save(_logs("abc", 2))
+    (logs / "watermark_def_2.json").write_text('{"timestamp:": "t", "original', encoding="utf-8")
+    assert rebuildIndex() == 2
+    assert backend.lookup("e1", "x")[0]["archive"] == "watermark_abc_2.json"
+
+
+def test_backend_incomplet():
+    class SansExtension(ArchiveBackend):
+        name = "incomplet"
+
+        def archiveName(self, original_email_hash, nb_variantes):
+            return archiveKey(original_email_hash, nb_variantes)
+
+    # Refusé dès l'instanciation, et non au milieu d'une requête
+    with pytest.raises(TypeError, match="abstract"):
+        SansExtension()
+    for backend in (JsonArchiveBackend, SQLiteArchiveBackend, CompactArchiveBackend):
+        assert isinstance(backend(), ArchiveBackend)
@@ -0,0 +1,75 @@
+import pytest
+
+from backends import get_backend
+from campaign import GenerationCache, extend_campaign, run_campaign
+from utils import hash_email
+
+
+def test_cache_eviction_par_taille():
+    cache = GenerationCache(100)
+    cache.put("a", "A", 40)
+    cache.put("b", "B", 40)
+    assert cache.get("a") == "A"
+    # 120 octets > 100 : l'entrée la moins récemment utilisée ("b") est évincée
+    cache.put("c", "C", 40)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("A", "C")
+    assert cache.taille == 80 and len(cache) == 2
+
+    # Une grosse entrée évince autant d'entrées que nécessaire
+    cache.put("d", "D", 90)
+    assert len(cache) == 1 and cache.get("d") == "D" and cache.taille == 90
+
+    # Plus grosse que le cache : jamais insérée (le cache n'est pas vidé pour elle)
+    cache.put("e", "E", 101)
+    assert cache.get("e") is None and cache.get("d") == "D"
+
+    # Remplacement d'une entrée : sa taille n'est comptée qu'une fois
+    cache.put("d", "D2", 60)
+    assert cache.get("d") == "D2" and cache.taille == 60
+    cache.discard("d")
+    assert len(cache) == 0 and cache.taille == 0
+
+
+def test_cache_desactive():
+    # CANARY_CACHE_MB=0
+    cache = GenerationCache(0)
+    cache.put("a", "A", 1)
+    assert cache.get("a") is None and len(cache) == 0
+
+
+EMAIL = ("Bonjour, il est important de vérifier rapidement le projet afin de commencer la réunion. "
+         "Nous devons aider l'équipe et envoyer le rapport final demain. Merci de répondre vite.")
+# Autres mots porteurs que EMAIL
+AUTRE = "Bonjour, merci de vérifier le projet et d'envoyer le rapport."
+
+
+def _nb_archives(backend, email):
+    return [campagne["nb_variantes"] for campagne in backend.find(hash_email(email))]
+
+
+def test_extension_capacite_depassee():
+    # 9 mots porteurs binaires : 512 destinataires au plus
+    run_campaign(EMAIL, 500)
+    nouvelles, extension = extend_campaign(EMAIL, 12)
+    assert (extension["debut"], extension["nb_variantes"], len(nouvelles)) == (500, 512, 12)
+    with pytest.raises(ValueError, match="capacité"):
+        extend_campaign(EMAIL, 1)
+    # Rien n'est ajouté à l'archive
+    assert _nb_archives(get_backend(), EMAIL) == [512]
+
+
+def test_extension_disposition_differente():
+    campagne, _ = run_campaign(EMAIL, 10)
+    archive_name = get_backend().archiveName(campagne.original_email_hash, 10)
+    with pytest.raises(ValueError, match="mots porteurs"):
+        extend_campaign(AUTRE, 2, archive_name)
+    assert _nb_archives(get_backend(), EMAIL) == [10]
+
+
+def test_extension_sans_campagne():
+    with pytest.raises(LookupError):
+        extend_campaign(EMAIL, 2)
+    run_campaign(EMAIL, 10)
+    with pytest.raises(ValueError):
+        extend_campaign(EMAIL, 0)
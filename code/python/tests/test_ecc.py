@@ -0,0 +1,94 @@
+import itertools
+import random
+
+import pytest
+
+import text_watermarking
+from backends import get_backend
+from campaign import run_campaign
+from ecc import MAX_EFFACEMENTS, dataBits, hammingCapacity, hammingDecode, hammingEncode
+from text_watermarking import EmailTemplate, code_identify, forms, inter_pair_list
+
+
+@pytest.mark.parametrize("n", [4, 8, 13, 16, 40])
+def test_aller_retour(n):
+    rng = random.Random(n)
+    assert hammingCapacity(n) == 2 ** dataBits(n)
+    for data in {0, hammingCapacity(n) - 1, *(rng.randrange(hammingCapacity(n)) for _ in range(50))}:
+        bits = hammingEncode(data, n)
+        assert len(bits) == n
+        assert hammingDecode(bits) == (data, 0)
+
+
+def test_trop_grand():
+    with pytest.raises(ValueError):
+        hammingEncode(hammingCapacity(16), 16)
+
+
+@pytest.mark.parametrize("n", [8, 16, 40])
+def test_erreur_simple_corrigee(n):
+    data = hammingCapacity(n) // 3
+    bits = hammingEncode(data, n)
+    for j in range(n):
+        mot = list(bits)
+        mot[j] ^= 1
+        assert hammingDecode(mot) == (data, 1)
+
+
+@pytest.mark.parametrize("n", [8, 16, 40])
+def test_erreur_double_rejetee(n):
+    data = hammingCapacity(n) // 3
+    bits = hammingEncode(data, n)
+    for i, j in itertools.combinations(range(n), 2):
+        mot = list(bits)
+        mot[i] ^= 1
+        mot[j] ^= 1
+        assert hammingDecode(mot) is None
+
+
+def test_effacements():
+    data = 1234
+    bits = hammingEncode(data, 24)
+    mot = list(bits)
+    mot[5] = None
+    assert hammingDecode(mot)[0] == data
+    mot = [None] * (MAX_EFFACEMENTS + 1) + bits[MAX_EFFACEMENTS + 1:]
+    assert hammingDecode(mot) is None
+
+
+EMAIL = ("Bonjour, il est important de vérifier rapidement le projet afin de commencer la réunion. "
+         "Nous devons aider l'équipe et envoyer le rapport final demain. Merci de répondre vite.")
+
+
+@pytest.fixture
+def hamming(monkeypatch):
+    monkeypatch.setattr(text_watermarking, "CODAGE", "hamming")
+
+
+def _email(numero):
+    # Email dont les mots porteurs portent le mot de code du numéro (même disposition qu'EMAIL)
+    mots = [forms(mot)[bit] for mot, bit in zip(inter_pair_list(EMAIL), hammingEncode(numero, 9))]
+    return EmailTemplate(EMAIL).render(mots)
+
+
+def test_code_identify_sans_campagne(hamming):
+    # Mot de code valide, mais aucune campagne n'a été générée
+    assert code_identify(_email(3)) is None
+
+
+def test_code_identify_campagne(hamming):
+    campagne, _ = run_campaign(EMAIL, 6)
+    variante = campagne[4]
+    # Un mot porteur remplacé par l'autre forme de sa paire : corrigé
+    mot = variante.mots_codes[2]
+    autre = [forme for forme in forms(mot) if forme != mot][0]
+    fuite = variante.texte.replace(mot, autre, 1)
+    decode = code_identify(fuite)
+    assert decode["Employe"] == "Employé 5"
+    assert decode["archive"] == get_backend().archiveName(campagne.original_email_hash, 6)
+    assert decode["corrections"] == 1
+    assert decode["confiance"] == 0.5
+
+    # Numéro décodable mais au-delà des destinataires de la campagne
+    assert code_identify(_email(3))["Employe"] == "Employé 4"
+    assert code_identify(_email(11)) is None
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+import text_watermarking
+from benchmark import synthetic_email
+from campaign import run_campaign
+from fingerprint import BLOCK, TardosCode, accuse, tardosBiases, tardosCapacity, tardosLength, tardosResistance
+from text_watermarking import iter_variants, logs_identify, tardos_identify
+
+
+EMAIL = ("Bonjour, il est important de vérifier rapidement le projet afin de commencer la réunion. "
+         "Nous devons aider l'équipe et envoyer le rapport final demain. Merci de répondre vite.")
+# Email de 150 mots porteurs (taille d'un email réel un peu long)
+LONG = synthetic_email(text_watermarking.LEXICON, 150)
+
+
+@pytest.fixture
+def tardos(monkeypatch):
+    monkeypatch.setattr(text_watermarking, "CODAGE", "tardos")
+
+
+def test_tardos_length():
+    # m = π²/2 × c² × ln(N / ε)
+    assert tardosLength(200, c=1) == 61
+    assert tardosLength(200, c=2) == 241
+    for m in (150, 250, 400):
+        n = tardosCapacity(m, c=2)
+        assert tardosLength(n, c=2) <= m < tardosLength(n + 1, c=2)
+    # Code plus court que la longueur prévue : garantie réduite
+    assert tardosResistance(250, 300) == 2
+    assert tardosResistance(150, 10) == 1
+    assert tardosResistance(40, 10) == 0
+
+
+def test_tardos_refuse_email_trop_court(tardos):
+    carriers = text_watermarking.inter_pair_list(EMAIL)
+    assert text_watermarking.capacity(carriers) == 0
+    assert not text_watermarking.verif(carriers, 2)
+    with pytest.raises(ValueError):
+        next(iter_variants(EMAIL, 2))
+
+
+def test_tardos_mots_de_code_distincts(tardos, monkeypatch):
+    # Code dégénéré : le destinataire n° 3 reçoit le mot de code du n° 0
+    monkeypatch.setattr(text_watermarking, "_identifiant", lambda carriers: lambda i: i % 3)
+    variantes = iter_variants(LONG, 5)
+    for _ in range(3):
+        next(variantes)
+    with pytest.raises(ValueError, match="Employé 4"):
+        next(variantes)
+
+    # Extension : les destinataires déjà archivés comptent
+    verifier = text_watermarking.distinct_checker(text_watermarking.inter_pair_list(LONG), 3)
+    with pytest.raises(ValueError):
+        verifier(3, 0)
+
+
+def test_tardos_campagne_parametres_par_defaut(tardos):
+    # Paramètres par défaut (c = 2, ε = 10⁻³) : 150 mots porteurs suffisent pour 10 destinataires
+    carriers = text_watermarking.inter_pair_list(LONG)
+    assert len(carriers) == 150
+    assert text_watermarking.capacity(carriers) >= 10
+    campagne, archived = run_campaign(LONG, 10)
+    assert archived
+
+    variantes = campagne.variantes()
+    info, certain = logs_identify(variantes["Employé 4"])
+    assert certain and info["Employe"] == "Employé 4"
+
+    # Fuite par un seul destinataire, une phrase supprimée : lui seul est accusé
+    fuite = "\n".join(ligne for k, ligne in enumerate(variantes["Employé 7"].split("\n")) if k != 5)
+    notes = tardos_identify(fuite)
+    assert [n["Employe"] for n in notes if n["accuse"]] == ["Employé 7"]
+    assert notes[0]["positions"] == 149
+    # 150 positions < tardosLength(10, c=2) : garantie réduite à un seul coupable
+    assert notes[0]["coupables max"] == 1
+
+
+def test_tardos_mots_de_code_deterministes():
+    code = TardosCode(42, tardosBiases(70, 42))
+    numeros = [0, 1, BLOCK - 1, BLOCK, 3 * BLOCK + 5, 2]
+    ids = [code(i) for i in numeros]
+    # Même graine : mêmes mots de code, quel que soit l'ordre des appels (blocs recalculés)
+    autre = TardosCode(42, tardosBiases(70, 42))
+    assert [autre(i) for i in reversed(numeros)] == ids[::-1]
+    assert code.codewords(0)[:2] == ids[:2]
+    assert all(0 <= id_ < 2 ** 70 for id_ in ids)
+    # Autre graine : autres mots de code
+    autre = TardosCode(43, tardosBiases(70, 43))
+    assert [autre(i) for i in range(4)] != [code(i) for i in range(4)]
+
+
+def test_accuse_reference():
+    rng = np.random.default_rng(0)
+    m = 75
+    code = TardosCode(7, tardosBiases(m, 7))
+    ids = [code(i) for i in range(300)]
+    chiffres = [None if rng.random() < 0.2 else int(rng.integers(2)) for _ in range(m)]
+    scores, positions = accuse(ids, chiffres, code.biases)
+
+    # Score symétrique calculé position par position
+    p = code.biases
+    attendu = []
+    for id_ in ids:
+        score = 0.0
+        for j, y in enumerate(chiffres):
+            if y is None:
+                continue
+            x = (id_ >> (m - 1 - j)) & 1
+            if y == 1:
+                score += np.sqrt((1 - p[j]) / p[j]) if x == 1 else -np.sqrt(p[j] / (1 - p[j]))
+            else:
+                score += np.sqrt(p[j] / (1 - p[j])) if x == 0 else -np.sqrt((1 - p[j]) / p[j])
+        attendu.append(score)
+    assert positions == sum(y is not None for y in chiffres)
+    np.testing.assert_allclose(scores, attendu, rtol=1e-9, atol=1e-9)
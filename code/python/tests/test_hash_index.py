@@ -0,0 +1,75 @@
+import sqlite3
+
+from campaign import extend_campaign, run_campaign
+from hash_index import (INDEX_FILENAME, SCHEMA_VERSION, connectIndex, createSchema, insertRows, loadCampaigns,
+                        lookupHashes, lookupMany, rebuildIndex)
+from text_watermarking import logs_identify
+
+
+def _index(rows):
+    conn = sqlite3.connect(":memory:")
+    createSchema(conn)
+    insertRows(rows, conn)
+    return conn
+
+
+def test_lookup_hash_partage_non_certain():
+    conn = _index([
+        ("a.json", "Employé 1", "01", 1, "e1", "w1"),
+        ("a.json", "Employé 2", "10", 2, "e1", "w1"),
+        ("a.json", "Employé 3", "11", 3, "e3", "w3"),
+    ])
+    assert lookupHashes("e1", "w1", conn=conn) == (False, False)
+    assert lookupHashes("x", "w1", conn=conn) == (False, False)
+    info, certain = lookupHashes("e3", "w3", conn=conn)
+    assert certain and info["Employe"] == "Employé 3"
+    # Hash de l'email unique : préféré à un hash des mots porteurs partagé
+    conn.execute("INSERT INTO variantes VALUES ('b.json', 'Employé 1', '1', 1, 'e4', 'w3')")
+    assert lookupHashes("e3", "w3", conn=conn)[0]["Employe"] == "Employé 3"
+
+    resultats = lookupMany([("e1", "w1"), ("e3", "w3"), ("x", "w1"), ("x", "y")], conn=conn)
+    assert resultats[0] == resultats[2] == resultats[3] == (False, False)
+    assert resultats[1][1] and resultats[1][0]["Employe"] == "Employé 3"
+
+
+EMAIL = ("Bonjour, il est important de vérifier rapidement le projet afin de commencer la réunion. "
+         "Nous devons aider l'équipe et envoyer le rapport final demain. Merci de répondre vite.")
+
+
+def _nb_variantes(conn):
+    return conn.execute("SELECT COUNT(*) FROM variantes").fetchone()[0]
+
+
+def test_reconstruction_depuis_les_archives(logs):
+    campagne, _ = run_campaign(EMAIL, 12)
+    extend_campaign(EMAIL, 3)
+    fuite = campagne.variantes()["Employé 7"]
+
+    # Index supprimé : recréé et rempli depuis les archives JSON (extensions comprises)
+    (logs / INDEX_FILENAME).unlink()
+    info, certain = logs_identify(fuite)
+    assert certain and info["Employe"] == "Employé 7"
+    conn = connectIndex()
+    assert _nb_variantes(conn) == 15
+    conn.close()
+
+    # Archive illisible : ignorée, les autres restent indexées
+    (logs / "watermark_illisible_3.json").write_text("{", encoding="utf-8")
+    assert rebuildIndex() == 15
+
+
+def test_reconstruction_version_du_schema(logs):
+    run_campaign(EMAIL, 12)
+    conn = connectIndex()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    # Index d'une ancienne version du schéma, dont les lignes ne sont plus valides
+    with conn:
+        conn.execute("DELETE FROM variantes")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION - 1}")
+    conn.close()
+
+    conn = connectIndex()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    assert _nb_variantes(conn) == 12
+    assert len(loadCampaigns(conn)) == 1
+    conn.close()
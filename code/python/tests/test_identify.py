@@ -0,0 +1,86 @@
+import math
+import random
+
+import pytest
+
+from api_v1 import IdentifyRequest, api_identify
+from campaign import run_campaign
+from text_watermarking import _distances, align_digits, fuzzy_identify, layout_index, logs_identify
+
+
+def _aligne(carriers, layout):
+    # Alignement de référence : parcours des positions une à une
+    chiffres = [None] * len(layout)
+    position = 0
+    for word in carriers:
+        k = position
+        while k < len(layout) and word not in layout[k]:
+            k += 1
+        if k == len(layout):
+            continue
+        chiffres[k] = layout[k].index(word)
+        position = k + 1
+    return chiffres
+
+
+def test_align_digits():
+    rng = random.Random(0)
+    mots = [f"m{i}" for i in range(12)]
+    for _ in range(200):
+        layout = [rng.sample(mots, rng.choice((1, 2, 3))) for _ in range(rng.randint(1, 20))]
+        carriers = [rng.choice(mots + ["autre"]) for _ in range(rng.randint(0, 30))]
+        attendu = _aligne(carriers, layout)
+        assert align_digits(carriers, layout) == attendu
+        assert align_digits(carriers, layout, layout_index(layout)) == attendu
+
+
+@pytest.mark.parametrize("bases", [[2] * 40, [2] * 120, [3] * 12 + [2] * 20, [5] * 40])
+def test_distances(bases):
+    rng = random.Random(1)
+    layout = [[f"f{chiffre}" for chiffre in range(base)] for base in bases]
+    ids = [rng.randrange(math.prod(bases)) for _ in range(500)]
+    chiffres = [rng.randrange(base) if rng.random() < 0.7 else None for base in bases]
+
+    poids = [math.prod(bases[k + 1:]) for k in range(len(bases))]
+    attendu = [sum(chiffre is not None and (id_ // poids[k]) % bases[k] != chiffre for k, chiffre in enumerate(chiffres))
+               for id_ in ids]
+    assert _distances(ids, layout, chiffres).tolist() == attendu
+
+
+EMAIL = ("Bonjour, il est important de vérifier rapidement le projet afin de commencer la réunion. "
+         "Nous devons aider l'équipe et envoyer le rapport final demain. Merci de répondre vite.")
+
+
+def test_fuzzy_identify_email_sans_rapport():
+    run_campaign(EMAIL, 20)
+    # Un seul mot porteur ("réunion") en commun avec la campagne
+    fuite = "Salut, il est important de penser à la réunion de vendredi."
+    assert fuzzy_identify(fuite) == []
+
+    reponse = api_identify(IdentifyRequest(email=fuite))
+    assert not reponse.trouve
+    assert reponse.employe is None
+
+
+def test_fuzzy_identify_mot_supprime():
+    campagne, _ = run_campaign(EMAIL, 20)
+    variante = campagne[12]
+    # Mot porteur supprimé : plus de correspondance exacte, les 8 autres positions désignent un seul destinataire
+    fuite = variante.texte.replace(variante.mots_codes[0] + " ", "", 1)
+    assert logs_identify(fuite) == (False, False)
+
+    proches = fuzzy_identify(fuite)
+    assert proches[0]["Employe"] == "Employé 13"
+    assert proches[0]["distance"] == 0
+    assert proches[0]["positions"] == 8
+    assert proches[1]["distance"] == 1
+    # Plusieurs destinataires ne diffèrent que d’un mot porteur : confiance réduite d’autant
+    assert 0.5 < proches[0]["confiance"] < 1
+    assert proches[1]["confiance"] == pytest.approx(proches[0]["confiance"] * 0.1, abs=1e-3)
+
+
+def test_fuzzy_identify_egalite():
+    run_campaign(EMAIL, 20)
+    # Seules les 5 premières positions sont observées : elles ne départagent pas les destinataires 1 à 16
+    fuite = EMAIL.split(". ")[0] + "."
+    assert fuzzy_identify(fuite) == []
@@ -0,0 +1,60 @@
+from matcher import CarrierMatcher
+from tokenizer import words
+
+
+def _trouve(matcher, texte):
+    mots = words(texte)
+    return [(" ".join(mots[debut:fin]), entree) for debut, fin, entree in matcher.find(mots)]
+
+
+def test_mots_simples():
+    matcher = CarrierMatcher(["projet", "réunion", "rapide"])
+    assert _trouve(matcher, "Le projet et la réunion, puis le projet.") == [
+        ("projet", "projet"), ("réunion", "réunion"), ("projet", "projet"),
+    ]
+    assert _trouve(matcher, "Rien à signaler.") == []
+
+
+def test_expressions():
+    matcher = CarrierMatcher(["mise à jour", "compte-rendu", "dès demain", "jour"])
+    # "compte-rendu" est découpé comme l'email : il reconnaît aussi "compte rendu"
+    assert _trouve(matcher, "Envoyez le compte rendu et la mise à jour dès demain.") == [
+        ("compte rendu", "compte-rendu"), ("mise à jour", "mise à jour"), ("dès demain", "dès demain"),
+    ]
+    # Début d'expression sans la suite : seul le mot simple est reconnu
+    assert _trouve(matcher, "La mise en place, ce jour.") == [("jour", "jour")]
+
+
+def test_chevauchements():
+    matcher = CarrierMatcher(["mise à jour", "à jour", "jour", "jour de paie", "mise"])
+    # La plus à gauche d'abord, puis la plus longue ; les occurrences retenues sont disjointes
+    assert _trouve(matcher, "La mise à jour de paie.") == [("mise à jour", "mise à jour")]
+    assert _trouve(matcher, "Un jour de paie, une mise à jour.") == [
+        ("jour de paie", "jour de paie"), ("mise à jour", "mise à jour"),
+    ]
+    assert _trouve(matcher, "Tout est à jour.") == [("à jour", "à jour")]
+    # Suffixe d'une expression interrompue (lien d'échec) : "mise à" puis "jour de paie"
+    matcher = CarrierMatcher(["mise à jour de paie", "jour de paie", "à jour"])
+    assert _trouve(matcher, "Une mise à jour de la paie, un jour de paie.") == [
+        ("à jour", "à jour"), ("jour de paie", "jour de paie"),
+    ]
+
+
+def test_references():
+    # Même résultat qu'une recherche naïve (plus longue expression à chaque position libre)
+    lexique = ["a b c", "b c", "c", "a", "b c d e", "d"]
+    matcher = CarrierMatcher(lexique)
+    expressions = sorted((words(entree) for entree in lexique), key=len, reverse=True)
+    for texte in ["a b c d e", "b c d e a", "a a b c", "c d b c d e d", "e a b d"]:
+        mots = texte.split()
+        attendu = []
+        i = 0
+        while i < len(mots):
+            for expression in expressions:
+                if mots[i:i + len(expression)] == expression:
+                    attendu.append((i, i + len(expression), " ".join(expression)))
+                    i += len(expression)
+                    break
+            else:
+                i += 1
+        assert matcher.find(mots) == attendu, texte
@@ -0,0 +1,51 @@
+import math
+
+from fastapi.testclient import TestClient
+
+import metrics
+from apicode import app
+
+
+def test_histogramme_format():
+    histogramme = metrics.Histogram("test_duree_seconds", "Durée", ("stage",), buckets=(0.1, 1.0))
+    for valeur in (0.05, 0.5, 0.7, 3.0):
+        histogramme.observe(valeur, 'a"b')
+    assert histogramme.samples() == [
+        'test_duree_seconds_bucket{stage="a\\"b",le="0.1"} 1',
+        'test_duree_seconds_bucket{stage="a\\"b",le="1.0"} 3',
+        'test_duree_seconds_bucket{stage="a\\"b",le="+Inf"} 4',
+        'test_duree_seconds_sum{stage="a\\"b"} 4.25',
+        'test_duree_seconds_count{stage="a\\"b"} 4',
+    ]
+    assert histogramme.buckets[-1] == math.inf
+
+
+def test_route_metrics():
+    client = TestClient(app)
+    reponse = client.post("/api/v1/identify", json={"email": "Email inconnu, aucune archive."})
+    assert reponse.status_code == 200 and not reponse.json()["trouve"]
+
+    reponse = client.get("/metrics")
+    assert reponse.status_code == 200
+    assert reponse.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lignes = reponse.text.splitlines()
+    assert "# TYPE canary_stage_duration_seconds histogram" in lignes
+    assert "# TYPE canary_identify_total counter" in lignes
+    assert any(ligne.startswith('canary_stage_duration_seconds_count{stage="identify"} ') for ligne in lignes)
+    assert any(ligne.startswith('canary_identify_total{correspondance="aucune"} ') for ligne in lignes)
+
+
+def test_metriques_desactivees(monkeypatch):
+    # CANARY_METRICS=0
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    assert TestClient(app).get("/metrics").status_code == 404
+
+    compteur = metrics.Counter("test_total", "Test")
+    compteur.inc(3)
+    assert compteur.samples() == []
+
+    def fonction():
+        return 42
+    # Fonction non instrumentée : renvoyée telle quelle
+    assert metrics.timed("test")(fonction) is fonction
+    assert metrics.timer("test") is metrics._NULL_TIMER
@@ -0,0 +1,35 @@
+import pytest
+
+import parallel
+from campaign import generate_campaign
+from parallel import generate_parallel, process_pool, shutdown_pool
+
+
+EMAIL = ("Bonjour, il est important de vérifier rapidement le projet afin de commencer la réunion. "
+         "Nous devons aider l'équipe et envoyer le rapport final demain. Merci de répondre vite.")
+
+
+@pytest.fixture(autouse=True)
+def pool():
+    yield
+    shutdown_pool()
+
+
+def _empreintes(campagne):
+    return [(record.id, record.email_hash, record.word_hash) for record in campagne]
+
+
+def test_pool_partage():
+    sequentielle = _empreintes(generate_campaign(EMAIL, 300))
+    assert _empreintes(generate_parallel(EMAIL, 300, workers=2, chunk_size=64)) == sequentielle
+
+    # Le même pool sert à la génération suivante
+    executor = process_pool(2)
+    assert _empreintes(generate_parallel(EMAIL, 300, workers=2, chunk_size=100)) == sequentielle
+    assert process_pool(2) is executor
+    # Pool plus petit que demandé : recréé
+    assert process_pool(3) is not executor
+
+    shutdown_pool()
+    assert parallel._POOL == (None, 0)
+    assert process_pool(2) is not executor
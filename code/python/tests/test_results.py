@@ -0,0 +1,31 @@
+import pytest
+
+import text_watermarking
+from backends import archiveKey
+from campaign import extend_campaign, run_campaign
+from results import CampaignResults
+
+
+EMAIL = ("Bonjour, il est important de vérifier rapidement le projet afin de commencer la réunion. "
+         "Nous devons aider l'équipe et envoyer le rapport final demain. Merci de répondre vite.")
+
+
+def test_resultats_apres_extension(cache):
+    campagne, archived = run_campaign(EMAIL, 20)
+    assert archived
+    cle = archiveKey(campagne.original_email_hash, 20)
+    assert len(CampaignResults(cle)) == 20
+
+    extend_campaign(EMAIL, 5)
+    # Entrée retirée du cache : l'email est nécessaire, toutes les variantes sont servies
+    with pytest.raises(LookupError):
+        CampaignResults(cle)
+    resultats = CampaignResults(cle, EMAIL)
+    assert len(resultats) == 25
+    assert [record.employe for record in resultats.page(20, 30)] == [f"Employé {i}" for i in range(21, 26)]
+
+    # Extension faite par un autre processus : la campagne en cache est plus courte que l'archive
+    cache.put((campagne.original_email_hash, 20, text_watermarking.LEXICON.version), campagne, campagne.taille())
+    with pytest.raises(LookupError):
+        CampaignResults(cle)
+    assert len(CampaignResults(cle, EMAIL)) == 25
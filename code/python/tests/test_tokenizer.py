@@ -0,0 +1,36 @@
+import unicodedata
+
+from text_watermarking import inter_pair_list
+from tokenizer import normalize, tokenize, words
+
+
+def test_apostrophes():
+    # Apostrophes droites et typographiques : le mot porteur n'est plus collé à l'article
+    for apostrophe in "'’‘ʼ":
+        assert words(f"C{apostrophe}est l{apostrophe}équipe") == ["c", "est", "l", "équipe"]
+    assert words("« Aujourd’hui » — rendez-vous… demain !") == ["aujourd", "hui", "rendez", "vous", "demain"]
+    # Mot porteur précédé d'une apostrophe : détecté quelle que soit l'apostrophe
+    assert inter_pair_list("Merci d’aider l’équipe.") == inter_pair_list("Merci d'aider l'équipe.") == ["aider", "équipe"]
+
+
+def test_nfc():
+    compose = "Réunion à l’hôtel"
+    decompose = unicodedata.normalize("NFD", compose)
+    assert decompose != compose
+    assert normalize(decompose) == compose
+    assert normalize(compose) is compose
+    assert words(decompose) == words(compose) == ["réunion", "à", "l", "hôtel"]
+
+
+def test_tokenize_positions():
+    texte = "Bonjour l’Équipe,\n  la RÉUNION—demain."
+    tokens = tokenize(texte)
+    assert [token.word for token in tokens] == words(texte)
+    for token in tokens:
+        assert texte[token.start:token.end] == token.surface
+        assert token.surface.lower() == token.word
+    assert tokens[2].surface == "Équipe"
+
+    # Positions rapportées au texte normalisé (NFC)
+    decompose = unicodedata.normalize("NFD", texte)
+    assert [(t.word, t.start, t.end) for t in tokenize(decompose)] == [(t.word, t.start, t.end) for t in tokens]
@@ -0,0 +1,43 @@
+import math
+import random
+
+import pytest
+
+from text_watermarking import align_digits, layout_encoder
+from utils import CHIFFRES, decimalToBinary, formatId, mixedRadixDigits
+
+
+@pytest.mark.parametrize("bases", [[2] * 10, [3, 2, 3, 3, 2, 2, 2], [5, 1, 4, 2, 36], [2] * 70 + [3] * 5])
+def test_base_mixte_aller_retour(bases):
+    rng = random.Random(len(bases))
+    capacite = math.prod(bases)
+    for n in {0, 1, capacite - 1, *(rng.randrange(capacite) for _ in range(200))}:
+        chiffres = mixedRadixDigits(n, bases)
+        assert all(0 <= chiffre < base for chiffre, base in zip(chiffres, bases))
+        # Position 0 = chiffre de poids fort
+        assert sum(chiffre * math.prod(bases[k + 1:]) for k, chiffre in enumerate(chiffres)) == n
+        texte = formatId(n, bases)
+        assert len(texte) == len(bases)
+        assert [CHIFFRES.index(caractere) for caractere in texte] == chiffres
+
+
+def test_base_mixte_binaire():
+    for n in range(64):
+        assert formatId(n, [2] * 6) == decimalToBinary(n, 6)
+        assert mixedRadixDigits(n, [2] * 6) == [int(bit) for bit in decimalToBinary(n, 6)]
+
+
+def test_base_mixte_hors_capacite():
+    with pytest.raises(ValueError):
+        mixedRadixDigits(432, [3, 2, 3, 3, 2, 2, 2])
+    with pytest.raises(ValueError):
+        mixedRadixDigits(-1, [2, 2])
+
+
+def test_disposition_aller_retour():
+    # Mots porteurs codés par `layout_encoder` puis relus par `align_digits`
+    layout = [["a", "b", "c"], ["d", "e"], ["f"], ["g", "h", "i", "j"], ["k", "l"]]
+    bases = [len(formes) for formes in layout]
+    encode = layout_encoder(layout)
+    for n in range(math.prod(bases)):
+        assert align_digits(encode(n), layout) == mixedRadixDigits(n, bases)
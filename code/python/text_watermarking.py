@@ -1,6 +1,18 @@
 from pathlib import Path
 from utils import *
+from backends import get_backend
+from lexicon import Lexicon
+from tokenizer import normalize, tokenize, words
+from matcher import CarrierMatcher
+from ecc import hammingCapacity, hammingDecode, hammingEncode
+from fingerprint import COLLUDERS, TardosCode, accuse, loadTardos, tardosCapacity, tardosResistance, threshold
+import metrics
+import numpy as np
+import logging
+import bisect
 import json
+import math
+import os
 
 
 def json_file(filename: str) -> dict:
@@ -21,14 +33,41 @@ def json_file(filename: str) -> dict:
         return json.load(f)
 
 
-# Exemple d’utilisation :
-PAIR_LIST = json_file("synonymes_fr_dict.json")
-PAIR_LIST_BRUT = json_file("synonymes_fr_words.json")
+logger = logging.getLogger("canary.watermarking")
+
+# Lexique des mots porteurs, chargé une seule fois (cache pickle dans data/cache/)
+# Autre dictionnaire possible via la variable d'environnement CANARY_LEXICON (ex: synonymes_fr_large.json)
+LEXICON = Lexicon.load(os.environ.get("CANARY_LEXICON", "synonymes_fr_dict.json"))
+# Codage des identifiants : "direct" (numéro du destinataire en base mixte), "hamming" (mot de code
+# correcteur d'erreurs, décodable malgré un mot modifié : voir `ecc.py` et `code_identify`) ou "tardos" (code de
+# traçage aléatoire résistant aux collusions : voir `fingerprint.py` et `tardos_identify`)
+CODAGE = os.environ.get("CANARY_CODAGE", "direct").lower()
+# Identification approchée (`fuzzy_identify`) : part minimale des positions de la campagne observées dans
+# l’email (CANARY_FUZZY_COUVERTURE), nombre minimal de positions observées, et rapport de vraisemblance
+# d’une position différente (mot modifié) utilisé pour la confiance
+FUZZY_COUVERTURE = float(os.environ.get("CANARY_FUZZY_COUVERTURE", "0.5"))
+FUZZY_MIN_POSITIONS = 4
+FUZZY_ERREUR = 0.1
+# Automate de recherche des mots porteurs (expressions de plusieurs mots comprises), reconstruit si LEXICON change
+_MATCHER = (None, None)
+
+
+def carrier_matcher() -> CarrierMatcher:
+    """
+    Automate d’Aho–Corasick du lexique courant (`matcher.py`), chargé depuis le cache disque au premier appel.
+    """
+    global _MATCHER
+    lexique, matcher = _MATCHER
+    if lexique is not LEXICON:
+        matcher = CarrierMatcher.load(LEXICON)
+        _MATCHER = (LEXICON, matcher)
+    return matcher
 
 
 def read_email(email: str) -> list[str]:
     """
-    Nettoie un email et le transforme en liste de mots (tokenisation simple).
+    Nettoie un email et le transforme en liste de mots en minuscules (voir `tokenizer.py` :
+    normalisation NFC, découpage en un seul passage, apostrophes droites et typographiques).
 
     Args:
         email (str): Texte brut de l’email à traiter.
@@ -36,18 +75,15 @@ def read_email(email: str) -> list[str]:
     Returns:
         list[str]: Liste des mots extraits de l’email après nettoyage.
     """
-
-    texte = email.lower()
-    ponctuation = ".,!?;:()\"«»-\n"
-    for word in ponctuation:
-        texte = texte.replace(word, " ")
-    email_list = texte.split()
-    return email_list
+    return words(email)
 
 
+@metrics.timed("tokenization")
 def inter_pair_list(text_email: str) -> list[str]:
     """
-    Extrait la liste des mots porteurs (mots pour lesquels on a un synonyme) présents dans un email.
+    Extrait la liste des mots porteurs (mots ou expressions pour lesquels on a un synonyme) présents
+    dans un email, en un seul passage sur ses mots (`carrier_matcher`). Une expression de plusieurs
+    mots ("mise à jour") est une seule position, notée par son entrée dans le lexique.
 
     Args:
         text_email (str): Contenu de l’email (texte brut).
@@ -56,41 +92,90 @@ def inter_pair_list(text_email: str) -> list[str]:
         list[str]: Liste ordonnée des mots porteurs présents dans l’email.
     """
 
-    EMAIL_LIST = read_email(text_email)
-    word_inter = []
-    for word in EMAIL_LIST:
-        if word in PAIR_LIST_BRUT:
-            word_inter.append(word)
-    return word_inter
+    return [carrier for _, _, carrier in carrier_matcher().find(read_email(text_email))]
+
+
+def forms(word: str) -> tuple[str, ...]:
+    """
+    Formes possibles d’un mot porteur, dans l’ordre des chiffres.
+
+    - codage direct : le mot lui-même puis ses synonymes (`LEXICON.alternatives`),
+    - codage tardos : le mot lui-même puis son premier synonyme (codes binaires),
+    - codage hamming : la paire {mot, premier synonyme} triée par ordre alphabétique, pour que le bit
+      porté se lise sans connaître l’email original (les deux formes donnent la même paire). Si le
+      synonyme a lui-même un autre premier synonyme, la position n’est pas codée : (mot,).
+    """
+    if CODAGE == "tardos":
+        return LEXICON.alternatives[word][:2]
+    if CODAGE != "hamming":
+        return LEXICON.alternatives[word]
+    partners = LEXICON.partners
+    partner = partners[word]
+    if partners.get(partner) != word:
+        return (word,)
+    return (word, partner) if word < partner else (partner, word)
+
+
+TARDOS_DUPLICATE = ("Le mot de code tardos de l’{employe} est identique à celui d’un autre destinataire : "
+                    "l’email n’a pas assez de mots porteurs pour cette campagne.")
+
+
+def radices(inter_list: list[str]) -> list[int]:
+    """
+    Base de chaque position : nombre de formes possibles du mot porteur (2 pour une paire de synonymes,
+    1 pour une position non codée en codage hamming).
+    """
+    return [len(forms(word)) for word in inter_list]
+
+
+def capacity(inter_list: list[str]) -> int:
+    """
+    Nombre maximal de variantes distinctes : produit des bases de chaque position
+    (2^k si les k mots porteurs n’ont qu’un seul synonyme). En codage hamming, nombre de mots de
+    code sur les positions binaires (2^(k - r - 1) avec r bits de contrôle, voir `ecc.py`). En codage
+    tardos, nombre de destinataires pour lequel les k positions suffisent à attribuer une fuite par un seul
+    destinataire (`fingerprint.tardosCapacity` avec c = 1) : au-delà de `fingerprint.tardosCapacity(k)`, la
+    campagne résiste à moins de CANARY_TARDOS_C coupables (`fingerprint.tardosResistance`).
+    """
+    bases = radices(inter_list)
+    if CODAGE == "hamming":
+        return hammingCapacity(bases.count(2))
+    if CODAGE == "tardos":
+        return tardosCapacity(bases.count(2), c=1)
+    return math.prod(bases)
 
 
 def verif(inter_list, nb_variantes):
-    return 2 ** len(inter_list) >= nb_variantes
+    return capacity(inter_list) >= nb_variantes
 
 
+@metrics.timed("encoding")
 def watermark_words(IDs_LIST : dict, nb_variantes : int, INTER_LIST : dict):
     """
-    Construit la "signature watermark" de chaque destinataire en appliquant un identifiant binaire
+    Construit la "signature watermark" de chaque destinataire en appliquant son identifiant
     sur une liste de mots porteurs (carrier words).
 
     Pour chaque employé, la fonction :
-    - associe un identifiant binaire (ex: "0101...") provenant de `IDs_LIST`,
-    - parcourt chaque bit et remplace le mot porteur correspondant par son synonyme si le bit vaut "1",
-    - conserve le mot original si le bit vaut "0",
+    - associe un identifiant (entier) provenant de `IDs_LIST` (en codage hamming, le mot de code
+      correcteur d’erreurs de ce numéro, voir `_identifiant`),
+    - le décompose en base mixte (`mixedRadixDigits`, un chiffre par mot porteur, du poids fort au poids faible),
+    - remplace chaque mot porteur par sa forme n° chiffre (`LEXICON.alternatives`) : le mot original
+      pour 0, son premier synonyme pour 1, etc. Avec des paires de synonymes, on retrouve le
+      codage binaire (bit à 1 → synonyme),
     - retourne un dictionnaire contenant, pour chaque employé :
         • la liste finale des mots porteurs codés (EDIT_LIST)
-        • l’identifiant en décimal associé à l’ID binaire
+        • l’identifiant du destinataire
 
     Args:
-        IDs_LIST (list[str]):
-            Liste des identifiants binaires à attribuer aux employés.
-            Exemple : ["0001", "0010", "0011", ...]
+        IDs_LIST (list[int]):
+            Liste des identifiants à attribuer aux employés (voir `genBits`).
+            Exemple : [0, 1, 2, 3, ...]
         nb_variantes (int):
             Nombre de variantes à générer.
             Doit être <= len(IDs_LIST).
         INTER_LIST (list[str]):
             Liste des mots porteurs détectés dans l’email original, dans l’ordre.
-            Chaque mot doit exister dans `PAIR_LIST` (en clé ou en valeur).
+            Chaque mot doit exister dans le lexique `LEXICON`.
 
     Returns:
         dict:
@@ -102,40 +187,141 @@ def watermark_words(IDs_LIST : dict, nb_variantes : int, INTER_LIST : dict):
             }
             où :
             - EDIT_LIST (list[str]) : liste des mots porteurs après watermarking (synonymes appliqués selon l'ID)
-            - id_decimal (int) : version décimale de l'ID binaire
+            - id_decimal (int) : identifiant du destinataire (entier)
     """
 
     CREDS = {}
-    nb_bits = len(INTER_LIST)
+    encode = _encoder(INTER_LIST)
+    identifiant = _identifiant(INTER_LIST)
     for i in range(0, nb_variantes):
-        CREDS[f"Employé {i + 1}"] = IDs_LIST[i]
-    for worker, id in CREDS.items():
-        EDIT_LIST = INTER_LIST.copy()
-        for i in range(0, nb_bits):
-            # Cas de figure où on doit remplacer le mot par un synonyme
-            if id[i] == "1":
-                try:
-                    # Si le synonyme est la value du dico
-                    EDIT_LIST[i] = PAIR_LIST[INTER_LIST[i]]
-                except:
-                    # Si le synonyme se trouve en key du dico
-                    EDIT_LIST[i] = PAIR_LIST[get_key_from_value(PAIR_LIST, INTER_LIST[i])]
-            else:
-                # Cas où on ne doit pas remplacer le mot par un synonyme
-                EDIT_LIST[i] = INTER_LIST[i]
-        # Mis à jour du dico creds qui contient toutes les infos (codes binaire etc...)
-        CREDS[worker] = [EDIT_LIST, binaryToDecimal(id)]
+        id = identifiant(IDs_LIST[i])
+        CREDS[f"Employé {i + 1}"] = [encode(id), id]
+    metrics.VARIANTS_TOTAL.inc(nb_variantes)
     return CREDS
 
 
+def _encoder(INTER_LIST: list[str]):
+    """
+    Retourne la fonction id → mots porteurs codés pour cette liste de mots porteurs.
+    """
+    return layout_encoder([forms(word) for word in INTER_LIST])
+
+
+def layout_encoder(formes: list):
+    """
+    Retourne la fonction id → mots porteurs codés pour une disposition (formes de chaque position,
+    voir `carrier_layout`) : indépendante du lexique et du codage courants, elle permet de reconstruire
+    les variantes d’une campagne archivée ou gardée en mémoire (`records.Campaign`).
+    Si toutes les positions sont binaires, les bits sont lus par décalage (cas le plus courant).
+    """
+    bases = [len(f) for f in formes]
+
+    if all(base == 2 for base in bases):
+        # Décalage du bit de chaque position (position 0 = bit de poids fort)
+        shifts = range(len(formes) - 1, -1, -1)
+        return lambda id: [f[(id >> shift) & 1] for f, shift in zip(formes, shifts)]
+
+    return lambda id: [f[chiffre] for f, chiffre in zip(formes, mixedRadixDigits(id, bases))]
+
+
+def _identifiant(INTER_LIST: list[str]):
+    """
+    Retourne la fonction numéro du destinataire → identifiant porté par ses mots porteurs.
+
+    En codage direct, l’identifiant est le numéro lui-même. En codage hamming, c’est le mot de code
+    (`ecc.hammingEncode`) écrit sur les positions binaires : lu en base mixte, une position non codée
+    (base 1) vaut toujours 0, l’entier est donc celui des seuls bits du mot de code. En codage tardos,
+    ce sont les bits tirés pour ce destinataire (`fingerprint.TardosCode`).
+    """
+    if CODAGE == "tardos":
+        return TardosCode.for_carriers(INTER_LIST)
+    if CODAGE != "hamming":
+        return lambda numero: numero
+    nb_bits = radices(INTER_LIST).count(2)
+    return lambda numero: int("".join(map(str, hammingEncode(numero, nb_bits))) or "0", 2)
+
+
+def _match_case(mot: str, modele: str) -> str:
+    """
+    Applique au mot de remplacement la casse du mot d’origine (ex: "Important" → "Primordial").
+    """
+    if modele.isupper() and len(modele) > 1:
+        return mot.upper()
+    if modele[:1].isupper():
+        return mot[:1].upper() + mot[1:]
+    return mot
+
+
+class EmailTemplate:
+    """
+    Email "compilé" une seule fois pour la génération de variantes.
+
+    L’email original (normalisé en NFC) est tokenisé en un seul passage (`tokenizer.tokenize`, même
+    découpage que `inter_pair_list`) : on garde les segments de texte situés entre les mots porteurs
+    et, pour chaque mot porteur (mot ou expression, voir `carrier_matcher`), son entrée dans le lexique
+    et sa forme d’origine.
+    Une variante se construit ensuite avec un unique `join` des segments précalculés, et seules les
+    occurrences réellement détectées comme mots porteurs sont remplacées (jamais une sous-chaîne
+    d’un autre mot, ex: "aider" dans "aiderons").
+    Les variantes sont construites à partir du texte normalisé (identique à l’original s’il est déjà en NFC).
+
+    Attributes:
+        segments (list[str]): Texte situé avant, entre et après les mots porteurs (len = nb porteurs + 1).
+        carriers (list[str]): Mots porteurs détectés (entrées du lexique), dans l’ordre — identique à `inter_pair_list`.
+        surfaces (list[str]): Mots porteurs tels qu’écrits dans l’email original.
+    """
+
+    __slots__ = ("segments", "carriers", "surfaces")
+
+    def __init__(self, email: str):
+        self.segments = []
+        self.carriers = []
+        self.surfaces = []
+        last = 0
+        with metrics.timer("tokenization"):
+            email = normalize(email)
+            tokens = tokenize(email)
+            for debut, fin, carrier in carrier_matcher().find([token.word for token in tokens]):
+                start, end = tokens[debut].start, tokens[fin - 1].end
+                self.segments.append(email[last:start])
+                self.carriers.append(carrier)
+                self.surfaces.append(email[start:end])
+                last = end
+            self.segments.append(email[last:])
+
+    def render(self, mots_codes: list[str]) -> str:
+        """
+        Construit la variante correspondant à la liste de mots porteurs codés (même ordre que `carriers`).
+        """
+        if len(mots_codes) != len(self.carriers):
+            raise ValueError(
+                f"{len(mots_codes)} mots codés fournis pour {len(self.carriers)} mots porteurs dans l’email."
+            )
+        parts = [self.segments[0]]
+        for carrier, surface, mot_code, segment in zip(self.carriers, self.surfaces, mots_codes, self.segments[1:]):
+            parts.append(surface if mot_code == carrier else _match_case(mot_code, surface))
+            parts.append(segment)
+        return "".join(parts)
+
+
+def carrier_layout(email: str) -> list[list[str]]:
+    """
+    Retourne la disposition des mots porteurs de l’email : pour chaque position, le mot d’origine
+    puis ses synonymes ([[mot, synonyme], [mot, synonyme 1, synonyme 2], ...]), dans l’ordre des chiffres.
+    Elle est archivée avec la campagne pour pouvoir décoder un email fuité (`fuzzy_identify`).
+    """
+    return [list(forms(word)) for word in EmailTemplate(email).carriers]
+
+
+@metrics.timed("substitution")
 def watermark_emails(email: str, creds: dict):
     """
     Génère des variantes watermarkées d’un email en appliquant les remplacements
     de mots porteurs calculés précédemment pour chaque destinataire.
 
     Cette fonction :
-    - détecte les mots porteurs présents dans l’email (`inter_pair_list`),
-    - applique, pour chaque employé, les substitutions prévues dans `creds`,
+    - compile une seule fois l’email (`EmailTemplate`) : détection des mots porteurs et de leurs positions,
+    - construit, pour chaque employé, sa variante en un seul `join` à partir des mots prévus dans `creds`,
     - construit un dictionnaire {Employé: email_modifié},
     - ajoute également le texte final de l’email modifié dans `creds`.
 
@@ -157,22 +343,84 @@ def watermark_emails(email: str, creds: dict):
             - creds (dict): Même structure que l’entrée, enrichie avec l’email final de chaque employé
               (ajout en fin de liste via `append()`).
     """
-    inter_list = inter_pair_list(email)
-    email_base = email
+    template = EmailTemplate(email)
     resultat = {}
 
     for employe, (mots_codes, _) in creds.items():
-        email_modifie = email_base
-        for mot_original, mot_code in zip(inter_list, mots_codes):
-            if mot_original != mot_code:
-                email_modifie = email_modifie.replace(mot_original, mot_code)
-        resultat[employe] = email_modifie
+        resultat[employe] = template.render(mots_codes)
         creds[employe].append(resultat[employe])
 
     return resultat, creds
 
 
+def distinct_checker(INTER_LIST: list[str], debut: int = 0):
+    """
+    Vérification des mots de code tardos : deux destinataires d’une campagne ne doivent jamais partager
+    un mot de code (même variante, même empreinte). Retourne une fonction (numéro, id) qui lève
+    ValueError si `id` a déjà été attribué, ou None hors codage tardos.
+
+    Seul le hash de chaque id est gardé (les ids font des milliers de bits) ; les numéros [0, debut)
+    (destinataires déjà archivés, extension d’une campagne) sont comptés comme déjà attribués.
+    """
+    if CODAGE != "tardos":
+        return None
+    identifiant = _identifiant(INTER_LIST)
+    vus = {}
+    for i in range(debut):
+        vus.setdefault(hash(identifiant(i)), i)
+
+    def verifier(numero: int, id: int) -> None:
+        j = vus.setdefault(hash(id), numero)
+        if j != numero and identifiant(j) == id:
+            raise ValueError(TARDOS_DUPLICATE.format(employe=f"Employé {numero + 1}"))
+
+    return verifier
+
+
+def iter_variants(email: str, nb_variantes: int, start: int = 0):
+    """
+    Générateur de variantes : produit les variantes watermarkées une par une, sans jamais
+    construire les dictionnaires complets `CREDS` / `resultat` en mémoire.
+
+    Chaque variante est construite à partir de l’email compilé (`EmailTemplate`), de l’identifiant
+    binaire du destinataire et du lexique, puis hashée immédiatement. La mémoire utilisée reste
+    donc constante quel que soit le nombre de destinataires.
 
+    Args:
+        email (str): Texte de l’email original (non watermarké).
+        nb_variantes (int): Nombre total de variantes à générer.
+        start (int): Premier destinataire à générer (numéro, 0 par défaut).
+
+    Yields:
+        tuple[str, int, str, str, str]:
+            (employé, id, texte de la variante, hash email, hash des mots porteurs).
+            L’id est un entier : sa forme texte s’obtient avec `formatId(id, radices(mots_porteurs))`.
+
+    Raises:
+        ValueError: Si l’email ne contient pas assez de mots porteurs pour `nb_variantes` (en codage
+            tardos : ou si deux destinataires reçoivent le même mot de code, voir `distinct_checker`).
+    """
+    template = EmailTemplate(email)
+    carriers = template.carriers
+    nb_bits = len(carriers)
+    if not verif(carriers, nb_variantes):
+        raise ValueError(f"Impossible de générer {nb_variantes} variantes avec seulement {nb_bits} mots porteurs.")
+
+    encode = _encoder(carriers)
+    identifiant = _identifiant(carriers)
+    distincts = distinct_checker(carriers)
+
+    for i in range(start, nb_variantes):
+        id = identifiant(i)
+        if distincts is not None:
+            distincts(i, id)
+        mots_codes = encode(id)
+        texte = template.render(mots_codes)
+        yield f"Employé {i + 1}", id, texte, hash_email(texte), hash_email(''.join(mots_codes))
+    metrics.VARIANTS_TOTAL.inc(nb_variantes - start)
+
+
+@metrics.timed("identify")
 def logs_identify(email: str):
     """
     Identifie le destinataire d’un email (potentiellement fuité) en comparant son empreinte aux archives disponibles dans le dossier `logs/`.
@@ -180,7 +428,9 @@ def logs_identify(email: str):
     La fonction calcule :
     - le hash SHA-256 de l’email complet,
     - le hash SHA-256 des mots porteurs (watermarked words),
-    puis parcourt les fichiers JSON archivés afin de retrouver une correspondance.
+    puis interroge le backend d’archivage (index `logs/index.sqlite` des archives JSON, ou base
+    `logs/archives.sqlite`) afin de retrouver une correspondance en une seule recherche, quel que
+    soit le nombre d’archives.
 
     Deux niveaux de certitude sont renvoyés :
     - ✅ Match sur le hash de l’email complet → identification certaine (100%)
@@ -192,7 +442,7 @@ def logs_identify(email: str):
     Returns:
         tuple[dict | bool, bool]:
             - info (dict | False): Dictionnaire contenant les informations du destinataire
-              (ex: identifiant binaire, hash, etc.), ou False si aucune correspondance trouvée.
+              (ex: identifiant binaire, hash, archive, etc.), ou False si aucune correspondance trouvée.
             - bool (bool): Indicateur de fiabilité :
                 * True  -> correspondance exacte sur l'email hash (100%)
                 * False -> correspondance sur le hash des mots porteurs uniquement (certitude partielle)
@@ -206,37 +456,418 @@ def logs_identify(email: str):
     importantWord = inter_pair_list(email)
     wordHash = hash_email(''.join(importantWord))
     # Aller directement au fichier logs
-    base_dir = Path(__file__).resolve().parents[2]  # Canary/
-    dossier_path = base_dir / "logs"
+    dossier_path = logs_dir()
 
     # Cas error
     if not dossier_path.exists():
-        print(f"❌ — Erreur, impossible d'accéder aux logs.")
+        logger.error("❌ — Erreur, impossible d'accéder aux logs.")
+        return False, False
+
+    info, certain = get_backend().lookup(email_hash, wordHash)
+    if info is False:
+        # Cas où rien a été trouvé
+        metrics.IDENTIFY_TOTAL.inc(1, "aucune")
         return False, False
+    metrics.IDENTIFY_TOTAL.inc(1, "email" if certain else "mots porteurs")
 
-    # Lecture de tout les fichiers
-    for fichier in dossier_path.glob("*.json"):
-        print(f"📂 Lecture du fichier : {fichier.name}")
-
-        with open(fichier, "r", encoding="utf-8") as f:
-            contenu = json.load(f)
-
-            # Si l'on trouve le hash de l'email ou le hash des mots porteurs, on arrête la recherche
-            if (email_hash in contenu["all variantes"]) or (wordHash in contenu["all variantes"]):
-                print("✅ — Fichier logs trouvé !")
-                break
-
-    cible = contenu["variantes"]
-    for employee, info in cible.items():
-        # Si l'on a trouvé le hash de l'email, on stop et renvoie les infos sur l'employé + True pour dire qu'on est
-        # sûr à 100 %
-        if info["hash email"] == email_hash:
-            print("✅ — Employé trouvé ! Test email succès")
-            return info, True
-        else:
-            # Idem, mais pour les mots porteurs, donc potentiellement sûr
-            if info["word hash"] == wordHash:
-                print("✅ — Employé trouvé ! Test mots porteur succès")
-                return info, False
-    # Cas où rien a été trouvé
-    return False, False
\ No newline at end of file
+    if certain:
+        logger.info("✅ — Employé trouvé ! Test email succès (%s)", info["archive"])
+    else:
+        logger.info("✅ — Employé trouvé ! Test mots porteur succès (%s)", info["archive"])
+    return info, certain
+
+
+
+# Niveau de confiance associé à chaque type de correspondance
+CONFIANCE = {"email": 1.0, "mots porteurs": 0.9, None: 0.0}
+
+
+@metrics.timed("batch_identify")
+def batch_identify(emails: dict[str, str]) -> list[dict]:
+    """
+    Identifie en une seule fois les destinataires d’un lot d’emails fuités.
+
+    Tous les emails sont hashés (email complet + mots porteurs), puis recherchés ensemble
+    dans le backend d’archivage (`lookup_many`) : la base n’est ouverte qu’une fois et le coût
+    ne dépend pas du nombre d’archives.
+
+    Args:
+        emails (dict[str, str]): {source (nom de fichier, id du message...): texte de l’email}.
+
+    Returns:
+        list[dict]: Un résultat par email, dans l’ordre d’entrée :
+            {
+                "source": ..., "employe": ..., "id_binaire": ..., "archive": ...,
+                "correspondance": "email" | "mots porteurs" | "code correcteur" | None,
+                "confiance": 1.0 | 0.9 | 0.0 (code correcteur : voir `code_identify`)
+            }
+    """
+    dossier_path = logs_dir()
+    hashes = [(hash_email(texte), hash_email(''.join(inter_pair_list(texte)))) for texte in emails.values()]
+    trouves = get_backend().lookup_many(hashes) if dossier_path.exists() else [(False, False)] * len(hashes)
+
+    resultats = []
+    for (source, texte), (info, certain) in zip(emails.items(), trouves):
+        correspondance = None if info is False else ("email" if certain else "mots porteurs")
+        confiance = CONFIANCE[correspondance]
+        if info is False and CODAGE == "hamming":
+            # Pas de correspondance dans les archives : décodage direct des mots porteurs
+            info = code_identify(texte) or False
+            if info:
+                correspondance, confiance = "code correcteur", info["confiance"]
+        resultats.append({
+            "source": source,
+            "employe": info["Employe"] if info else None,
+            "id_binaire": info["id binaire"] if info else None,
+            "archive": info["archive"] if info else None,
+            "correspondance": correspondance,
+            "confiance": confiance,
+        })
+    return resultats
+
+
+def decode_digits(email: str, layout: list[list[str]]) -> list[int | None]:
+    """
+    Lit les chiffres portés par un email (potentiellement modifié ou tronqué) à partir de la
+    disposition des mots porteurs d’une campagne.
+
+    Les mots porteurs de l’email sont alignés dans l’ordre sur les positions de la disposition :
+    le chiffre lu est le rang du mot parmi les formes de la position (mot d’origine → 0,
+    premier synonyme → 1, ...). Les positions absentes de l’email (phrase supprimée,
+    email tronqué, mot réécrit) ne sont pas observées.
+
+    Args:
+        email (str): Email à analyser.
+        layout (list[list[str]]): Disposition [[mot, synonyme, ...], ...] archivée avec la campagne.
+
+    Returns:
+        list[int | None]: Chiffre lu pour chaque position (position 0 = chiffre de poids fort),
+            None si la position n’est pas observée.
+    """
+    return align_digits(inter_pair_list(email), layout)
+
+
+def layout_index(layout: list[list[str]]) -> dict[str, tuple[list[int], list[int]]]:
+    """
+    Index d’une disposition : pour chaque forme, les positions qui la portent (croissantes) et le
+    chiffre correspondant à chaque position.
+    """
+    index = {}
+    for k, formes in enumerate(layout):
+        for chiffre, forme in enumerate(formes):
+            positions, chiffres = index.setdefault(forme, ([], []))
+            if not positions or positions[-1] != k:
+                positions.append(k)
+                chiffres.append(chiffre)
+    return index
+
+
+def align_digits(carriers: list[str], layout: list[list[str]], index: dict | None = None) -> list[int | None]:
+    """
+    `decode_digits` à partir des mots porteurs déjà extraits de l’email (`inter_pair_list`) : l’email
+    n’est découpé qu’une fois pour toutes les campagnes comparées. `index` (`layout_index`) évite de
+    réindexer la disposition à chaque email.
+    """
+    if index is None:
+        index = layout_index(layout)
+    chiffres = [None] * len(layout)
+    position = 0
+    for word in carriers:
+        # Prochaine position de la disposition portant ce mot (sinon le mot est ignoré)
+        entree = index.get(word)
+        if entree is None:
+            continue
+        i = bisect.bisect_left(entree[0], position)
+        if i == len(entree[0]):
+            continue
+        k = entree[0][i]
+        chiffres[k] = entree[1][i]
+        position = k + 1
+    return chiffres
+
+
+# Index des dispositions des campagnes archivées (`layout_index`) : archive → (disposition, index)
+_LAYOUT_INDEX = {}
+
+
+def _campaign_index(archive_name: str, layout: list[list[str]]) -> dict:
+    cache = _LAYOUT_INDEX.get(archive_name)
+    if cache is None or (cache[0] is not layout and cache[0] != layout):
+        cache = _LAYOUT_INDEX[archive_name] = (layout, layout_index(layout))
+    return cache[1]
+
+
+def decode_bits(email: str, layout: list[list[str]]) -> tuple[int, int]:
+    """
+    Version binaire de `decode_digits`, pour les dispositions où chaque position a deux formes.
+
+    Returns:
+        tuple[int, int]:
+            - observed (int): Bits lus (même ordre de poids que l’id binaire : position 0 = bit de poids fort).
+            - mask (int): Positions effectivement observées (bit à 1).
+    """
+    return _bits(decode_digits(email, layout))
+
+
+def _bits(chiffres: list[int | None]) -> tuple[int, int]:
+    observed = 0
+    mask = 0
+    for chiffre in chiffres:
+        observed <<= 1
+        mask <<= 1
+        if chiffre is not None:
+            mask |= 1
+            observed |= chiffre
+    return observed, mask
+
+
+def _distances(ids: list[int], layout: list[list[str]], chiffres: list[int | None]) -> np.ndarray:
+    """
+    Distance de Hamming (sur les seules positions observées) entre l’id de chaque destinataire et
+    les chiffres lus, calculée pour tous les destinataires à la fois (NumPy). Pour une disposition
+    binaire : XOR + popcount (`np.bitwise_count`) sur des entiers de 64 bits (au-delà, XOR + popcount
+    sur les entiers Python) ; sinon, chaque chiffre observé est extrait des ids par division par le
+    poids de sa position.
+    """
+    bases = [len(formes) for formes in layout]
+    if all(base == 2 for base in bases):
+        observed, mask = _bits(chiffres)
+        if len(bases) > 64:
+            return np.fromiter((((id_ ^ observed) & mask).bit_count() for id_ in ids), dtype=np.int64, count=len(ids))
+        valeurs = np.fromiter(ids, dtype=np.uint64, count=len(ids))
+        return np.bitwise_count((valeurs ^ np.uint64(observed)) & np.uint64(mask)).astype(np.int64)
+
+    poids = [math.prod(bases[k + 1:]) for k in range(len(bases))]
+    # Entiers NumPy si la capacité tient sur 63 bits, entiers Python (tableau d'objets) sinon
+    if math.prod(bases) <= 2**63:
+        valeurs = np.fromiter(ids, dtype=np.int64, count=len(ids))
+    else:
+        valeurs = np.array(ids, dtype=object)
+    distances = np.zeros(len(ids), dtype=np.int64)
+    for k, chiffre in enumerate(chiffres):
+        if chiffre is not None:
+            distances += (valeurs // poids[k]) % bases[k] != chiffre
+    return distances
+
+
+@metrics.timed("fuzzy_identify")
+def fuzzy_identify(email: str, top: int = 5) -> list[dict]:
+    """
+    Identification approchée (plus proches voisins) lorsque `logs_identify` ne trouve pas de
+    correspondance exacte (un mot modifié, email tronqué...).
+
+    Pour chaque campagne archivée, les chiffres portés par l’email sont décodés (`decode_digits`) et
+    la campagne la mieux couverte (le plus de positions observées) est retenue, à condition qu’au moins
+    `FUZZY_MIN_POSITIONS` positions et une part `FUZZY_COUVERTURE` de ses positions soient observées : un
+    email sans rapport qui partage quelques mots porteurs avec une campagne n’est attribué à personne.
+    Les destinataires sont ensuite classés par distance de Hamming entre les chiffres de leur id et les
+    chiffres observés, calculée sur les seules positions observées, pour tous les destinataires à la fois
+    (`_distances`, NumPy). Si plusieurs destinataires sont à la distance minimale, l’email ne les
+    départage pas : aucun résultat n’est renvoyé.
+
+    La confiance d’un destinataire est sa part de vraisemblance parmi tous les destinataires de la campagne :
+    chaque position différente divise sa vraisemblance par 1 / `FUZZY_ERREUR`. Elle baisse donc avec le
+    nombre de destinataires compatibles avec l’observation, et non avec la seule distance.
+
+    Args:
+        email (str): Email à analyser.
+        top (int): Nombre maximal de destinataires renvoyés.
+
+    Returns:
+        list[dict]: Destinataires les plus proches, du plus probable au moins probable :
+            {
+                "Employe": ..., "id binaire": ..., "archive": ...,
+                "distance": nb de positions différentes, "positions": nb de positions observées,
+                "confiance": part de vraisemblance du destinataire
+            }
+            Liste vide si aucune campagne n’est assez couverte ou si le plus proche n’est pas unique.
+    """
+    if not logs_dir().exists():
+        return []
+
+    meilleure = None
+    # Email découpé une seule fois pour toutes les campagnes
+    carriers = inter_pair_list(email)
+    campagnes = get_backend().campaigns()
+    for archive_name, layout in campagnes:
+        chiffres = align_digits(carriers, layout, _campaign_index(archive_name, layout))
+        positions = len(chiffres) - chiffres.count(None)
+        if positions < max(FUZZY_MIN_POSITIONS, FUZZY_COUVERTURE * len(layout)):
+            continue
+        if meilleure is None or positions > meilleure[3]:
+            meilleure = (archive_name, layout, chiffres, positions)
+    metrics.ARCHIVES_SCANNED.observe(len(campagnes), "fuzzy")
+    if meilleure is None:
+        metrics.IDENTIFY_TOTAL.inc(1, "aucune (approchée)")
+        return []
+
+    archive_name, layout, chiffres, positions = meilleure
+    recipients = get_backend().recipients(archive_name)
+    if not recipients:
+        metrics.IDENTIFY_TOTAL.inc(1, "aucune (approchée)")
+        return []
+    distances = _distances([id_ for _, _, id_ in recipients], layout, chiffres)
+    minimum = int(distances.min())
+    if int((distances == minimum).sum()) > 1:
+        logger.info("⚠️ — Identification approchée ambiguë : %s destinataires à distance %s sur %s position(s) (%s)",
+                    int((distances == minimum).sum()), minimum, positions, archive_name)
+        metrics.IDENTIFY_TOTAL.inc(1, "ambiguë (approchée)")
+        return []
+    metrics.IDENTIFY_TOTAL.inc(1, "approchée")
+
+    vraisemblances = FUZZY_ERREUR ** (distances - minimum).astype(np.float64)
+    confiances = vraisemblances / vraisemblances.sum()
+    # Tri stable : à distance égale, ordre des destinataires
+    ordre = np.argsort(distances, kind="stable")[:top]
+
+    return [
+        {
+            "Employe": recipients[i][0],
+            "id binaire": recipients[i][1],
+            "archive": archive_name,
+            "distance": int(distances[i]),
+            "positions": positions,
+            "confiance": round(float(confiances[i]), 3),
+        }
+        for i in ordre
+    ]
+
+
+@metrics.timed("code_identify")
+def code_identify(email: str) -> dict | None:
+    """
+    Identification par code correcteur (codage hamming uniquement, CANARY_CODAGE=hamming).
+
+    Les mots porteurs de l’email sont lus dans l’ordre : chaque position binaire donne un bit (rang
+    du mot dans sa paire triée, voir `forms`), puis le mot de code est décodé par syndrome
+    (`ecc.hammingDecode`) : un mot porteur remplacé par son synonyme est corrigé, deux sont détectés.
+
+    Plus de la moitié des suites de bits sont à une position d’un mot de code : un email qui n’est pas
+    une variante se décode donc souvent. Le numéro décodé n’est retenu que si une campagne archivée a la
+    même disposition des mots porteurs et un destinataire de ce numéro portant ce mot de code ; sinon,
+    None (les appelants passent alors à `fuzzy_identify`). Une correction laisse un doute : la confiance
+    est divisée par deux par position corrigée.
+
+    Une phrase supprimée ou un mot porteur réécrit décale les positions suivantes (on ne sait pas
+    lesquelles manquent sans la disposition archivée) : c’est alors le rôle de `fuzzy_identify`.
+
+    Args:
+        email (str): Email à analyser.
+
+    Returns:
+        dict | None: {"Employe", "id binaire", "id", "archive",
+            "corrections": nb de positions corrigées, "positions": nb de positions binaires lues,
+            "confiance": 0.5 ** corrections}, ou None si le mot lu n’est pas décodable ou ne correspond
+            à aucun destinataire archivé.
+    """
+    carriers = inter_pair_list(email)
+    bits = []
+    for word in carriers:
+        formes = forms(word)
+        if len(formes) == 2:
+            bits.append(formes.index(word))
+
+    decode = hammingDecode(bits) if CODAGE == "hamming" else None
+    archive_name = None
+    if decode is not None:
+        numero, corrections = decode
+        id_ = _identifiant(carriers)(numero)
+        archive_name = _code_campaign([list(forms(word)) for word in carriers], numero, id_)
+    if archive_name is None:
+        metrics.IDENTIFY_TOTAL.inc(1, "aucune (code correcteur)")
+        return None
+    metrics.IDENTIFY_TOTAL.inc(1, "code correcteur")
+
+    logger.info("✅ — Employé décodé par code correcteur (%s position(s) corrigée(s), %s)", corrections, archive_name)
+    return {
+        "Employe": f"Employé {numero + 1}",
+        "id binaire": formatId(id_, radices(carriers)),
+        "id": id_,
+        "archive": archive_name,
+        "corrections": corrections,
+        "positions": len(bits),
+        "confiance": 0.5 ** corrections,
+    }
+
+
+def _code_campaign(layout: list[list[str]], numero: int, id_: int) -> str | None:
+    # Campagne archivée de même disposition dont le destinataire n° `numero` porte bien le mot de code `id_`
+    backend = get_backend()
+    for archive_name, disposition in backend.campaigns():
+        if disposition != layout:
+            continue
+        recipients = backend.recipients(archive_name)
+        if numero < len(recipients) and recipients[numero][2] == id_:
+            return archive_name
+    logger.info("⚠️ — Mot de code décodé (n° %s) sans destinataire archivé correspondant", numero + 1)
+    return None
+
+
+@metrics.timed("accuse")
+def tardos_identify(email: str, top: int = 5) -> list[dict]:
+    """
+    Accusation des destinataires d’une campagne générée en codage tardos, pour un email fuité
+    éventuellement composé à partir de plusieurs variantes (collusion).
+
+    Comme pour `fuzzy_identify`, la campagne la mieux couverte par l’email est retenue (parmi celles qui
+    ont des paramètres tardos, `fingerprint.loadTardos`), puis tous ses destinataires sont notés en une
+    seule opération vectorisée (`fingerprint.accuse`). Un destinataire est accusé si son score dépasse le
+    seuil (`fingerprint.threshold`) : probabilité d’accuser un innocent inférieure à `fingerprint.EPSILON`.
+    Une campagne dont l’email a moins de mots porteurs que `fingerprint.tardosLength` ne protège que contre
+    moins de CANARY_TARDOS_C coupables : les coupables d’une collusion plus large peuvent rester sous le seuil.
+
+    Args:
+        email (str): Email à analyser.
+        top (int): Nombre de destinataires renvoyés (au moins tous les accusés).
+
+    Returns:
+        list[dict]: Destinataires du score le plus élevé au plus faible :
+            {"Employe", "id binaire", "archive", "score", "seuil", "positions", "accuse": score >= seuil,
+             "coupables max": nombre de coupables contre lequel la campagne est dimensionnée (`fingerprint.tardosResistance`)}.
+            Liste vide si aucune campagne tardos ne correspond.
+    """
+    if not logs_dir().exists():
+        return []
+
+    meilleure = None
+    carriers = inter_pair_list(email)
+    campagnes = get_backend().campaigns()
+    for archive_name, layout in campagnes:
+        code = loadTardos(archive_name)
+        if code is None or len(code.biases) != len(layout):
+            continue
+        chiffres = align_digits(carriers, layout, _campaign_index(archive_name, layout))
+        positions = len(chiffres) - chiffres.count(None)
+        if positions and (meilleure is None or positions > meilleure[3]):
+            meilleure = (archive_name, code, chiffres, positions)
+    metrics.ARCHIVES_SCANNED.observe(len(campagnes), "accuse")
+    if meilleure is None:
+        return []
+
+    archive_name, code, chiffres, _ = meilleure
+    recipients = get_backend().recipients(archive_name)
+    if not recipients:
+        return []
+    scores, positions = accuse([id_ for _, _, id_ in recipients], chiffres, code.biases)
+    seuil = threshold(len(recipients), positions)
+    resistance = tardosResistance(len(code.biases), len(recipients))
+    if resistance < COLLUDERS:
+        logger.warning("⚠️ — Code tardos de %s positions pour %s destinataires : fiable contre %s coupable(s) "
+                       "seulement (CANARY_TARDOS_C=%s)", len(code.biases), len(recipients), resistance, COLLUDERS)
+    nb = max(top, int((scores >= seuil).sum()))
+    candidats = np.argpartition(-scores, nb - 1)[:nb] if nb < len(scores) else np.arange(len(scores))
+    ordre = candidats[np.argsort(-scores[candidats], kind="stable")]
+
+    return [
+        {
+            "Employe": recipients[i][0],
+            "id binaire": recipients[i][1],
+            "archive": archive_name,
+            "score": round(float(scores[i]), 3),
+            "seuil": round(seuil, 3),
+            "positions": positions,
+            "accuse": bool(scores[i] >= seuil),
+            "coupables max": resistance,
+        }
+        for i in ordre
+    ]
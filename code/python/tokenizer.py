@@ -0,0 +1,56 @@
+from typing import NamedTuple
+import unicodedata
+import re
+
+
+# Séparateurs de mots (en plus des espaces, y compris insécables) : ponctuation, tirets, points de suspension,
+# guillemets et apostrophes droites ou typographiques ("C’est" → "c", "est" ; "l'équipe" → "l", "équipe")
+SEPARATEURS = ".,!?;:()[]\"«»“”-–—…'’‘ʼ"
+TOKEN_RE = re.compile(f"[^\\s{re.escape(SEPARATEURS)}]+")
+
+
+class Token(NamedTuple):
+    """
+    Mot de l’email : forme minuscule (comparée au lexique), forme écrite et position
+    [start, end[ dans le texte normalisé (`normalize`).
+    """
+    word: str
+    surface: str
+    start: int
+    end: int
+
+
+def normalize(text: str) -> str:
+    """
+    Normalisation Unicode NFC (un "é" saisi en deux caractères "e" + accent devient un seul caractère).
+    Le texte est renvoyé tel quel s’il est déjà normalisé (cas courant, vérification rapide).
+    """
+    if unicodedata.is_normalized("NFC", text):
+        return text
+    return unicodedata.normalize("NFC", text)
+
+
+def words(text: str) -> list[str]:
+    """
+    Mots de l’email en minuscules, dans l’ordre (même découpage que `tokenize`, sans les positions).
+
+    Sous CPython, `str.replace` est plus rapide qu’une expression régulière (≈ 3x) ou que
+    `str.translate` (≈ 10x sur du texte accentué) : il renvoie le texte tel quel quand le séparateur
+    est absent et remplace sinon à la vitesse de `memchr`.
+    """
+    texte = normalize(text)
+    for separateur in SEPARATEURS:
+        texte = texte.replace(separateur, " ")
+    # Minuscules après le découpage : même résultat que mot par mot (ex: sigma final grec)
+    return texte.lower().split()
+
+
+def tokenize(text: str) -> list[Token]:
+    """
+    Découpe l’email en mots en un seul passage (expression régulière compilée), avec leur position.
+
+    Les positions se rapportent à `normalize(text)` : identiques à celles du texte d’origine
+    lorsqu’il est déjà en NFC.
+    """
+    return [Token(match.group().lower(), match.group(), match.start(), match.end())
+            for match in TOKEN_RE.finditer(normalize(text))]
@@ -1,4 +1,60 @@
+from pathlib import Path
 import hashlib
+import math
+import uuid
+import os
+
+
+### Dossier des archives
+def logs_dir() -> Path:
+    """
+    Retourne le chemin du dossier `logs/` du projet (Canary/logs), ou celui de la variable
+    d'environnement CANARY_LOGS_DIR si elle est définie (benchmarks, tests de charge...).
+    """
+    if os.environ.get("CANARY_LOGS_DIR"):
+        return Path(os.environ["CANARY_LOGS_DIR"])
+    # Aller au dossier parent de "code" → "Canary"
+    base_dir = Path(__file__).resolve().parents[2]  # Canary/
+    return base_dir / "logs"
+
+
+### Écriture des fichiers sans jamais écraser un fichier existant
+def tempPath(path) -> Path:
+    """
+    Nom temporaire unique à côté de `path` ("<nom>.<pid>.<aléa>.part") : deux écritures simultanées du
+    même fichier (processus ou threads) n’ont jamais le même fichier temporaire.
+    """
+    path = Path(path)
+    return path.with_name(f"{path.name}.{os.getpid()}.{uuid.uuid4().hex[:12]}.part")
+
+def publishFile(tmp_path, path) -> bool:
+    """
+    Publie un fichier temporaire complet sous son nom définitif : `os.link` échoue si le fichier existe
+    déjà, il n’est donc jamais écrasé. Le fichier temporaire reste à supprimer par l’appelant.
+
+    Returns:
+        bool: True si le fichier a été publié, False s’il existait déjà.
+    """
+    try:
+        os.link(tmp_path, path)
+        return True
+    except FileExistsError:
+        return False
+    except OSError:
+        # Système de fichiers sans liens physiques
+        if Path(path).exists():
+            return False
+        os.replace(tmp_path, path)
+        return True
+
+
+### Dossier des dictionnaires
+def data_dir() -> Path:
+    """
+    Retourne le chemin du dossier `data/` du projet (Canary/data).
+    """
+    base_dir = Path(__file__).resolve().parents[2]  # Canary/
+    return base_dir / "data"
 
 
 ### Fonction de hash (email)
@@ -10,34 +66,55 @@ def hash_email(email_text: str) -> str:
 
 
 ### Fonction de conversion binaire
+# Les identifiants des destinataires circulent sous forme d'entiers (génération, archivage,
+# identification) : la forme texte ("0101...") n'est produite que pour l'affichage et les archives.
 def decimalToBinary(n, bits):
     if n < 0 or n >= 2**bits:
         raise ValueError(f"Le nombre {n} ne peut pas être représenté sur {bits} bits.")
-    binaire = ""
-    while n > 0:
-        binaire = str(n % 2) + binaire
-        n = n // 2
-    return binaire.zfill(bits)
+    return f"{n:0{bits}b}" if bits else ""
 
 def genBits(nb_variantes, nb_bits):
-    list_id = []
-    for i in range(0,nb_variantes):
-        list_id.append(decimalToBinary(i,nb_bits))
-    return list_id
+    """
+    Retourne les identifiants (entiers) des `nb_variantes` destinataires : 0, 1, ..., nb_variantes - 1.
+    `nb_bits` est un nombre de bits, ou la liste des bases de chaque position (encodage en base mixte).
+    """
+    capacite = 2**nb_bits if isinstance(nb_bits, int) else math.prod(nb_bits)
+    if nb_variantes > capacite:
+        raise ValueError(f"Le nombre {nb_variantes - 1} ne peut pas être représenté avec une capacité de {capacite}.")
+    return list(range(nb_variantes))
 
 def binaryToDecimal(binaire):
     # Vérifie que l'entrée est bien une chaîne de 0 et 1
     if not all(bit in '01' for bit in binaire):
         raise ValueError("La chaîne doit contenir uniquement des 0 et des 1.")
+    return int(binaire, 2) if binaire else 0
 
-    decimal = 0
-    puissance = len(binaire) - 1
 
-    for bit in binaire:
-        decimal += int(bit) * (2 ** puissance)
-        puissance -= 1
+### Encodage en base mixte (mots porteurs à plusieurs formes)
+CHIFFRES = "0123456789abcdefghijklmnopqrstuvwxyz"
 
-    return decimal
+def mixedRadixDigits(n, bases):
+    """
+    Décompose `n` en base mixte : un chiffre par position (position 0 = chiffre de poids fort),
+    le chiffre de la position k étant compris entre 0 et bases[k] - 1.
+    Avec uniquement des bases 2, on retrouve les bits de `decimalToBinary`.
+    """
+    chiffres = [0] * len(bases)
+    reste = n
+    for k in range(len(bases) - 1, -1, -1):
+        reste, chiffres[k] = divmod(reste, bases[k])
+    if n < 0 or reste:
+        raise ValueError(f"Le nombre {n} ne peut pas être représenté avec une capacité de {math.prod(bases)}.")
+    return chiffres
+
+def formatId(n, bases):
+    """
+    Forme texte d’un identifiant : un caractère (0-9, a-z) par position. Identique à
+    `decimalToBinary` lorsque toutes les positions sont binaires.
+    """
+    if all(base == 2 for base in bases):
+        return decimalToBinary(n, len(bases))
+    return "".join(CHIFFRES[chiffre] for chiffre in mixedRadixDigits(n, bases))
 
 
 def get_key_from_value(dico, valeur_recherchee):